@@ -1,19 +1,31 @@
 import os
 import re
-import json
-from utils.agents import (
-    CTO, ProductManager, EngineeringManager, 
-    RobustCTO, RobustProductManager, RobustEngineeringManager,
-    TaskGenerator, AgentResponse,
-    save_to_markdown
+import sys
+import argparse
+from utils.agents import get_parse_stats, get_triage_stats
+from utils.workflow import (
+    PROTOTYPE_WORKFLOW, CTO_WORKFLOW, WORKFLOWS, WorkflowRunner, NeedsInput,
+    detect_workflow, sanitize_project_name, gather_enabled, CURRENT, CHANGED, STALE
 )
+from utils.claude_client import close_clients, get_usage_totals
+from utils.response_cache import get_response_cache
+from utils.retry import get_retry_totals
+from utils.hedging import get_hedge_stats
+from utils.catalog import get_catalog
+from utils.artifact_store import ArtifactStore
+from utils.fake_server import FakeAnthropicServer, FakeServerConfig
+from utils.metrics import print_stats
+from utils.tracing import profiling
+from utils.ledger import get_ledger, print_costs, BudgetExceeded
+from utils.benchmark import run_benchmarks, DEFAULT_SIZES, DEFAULT_SPEEDUP
+from utils.batch import run_batch, ANSWER_POLICIES, DEFAULT_BATCH_CONCURRENCY, DEFAULT_MAX_FOLLOWUPS
 
 def get_valid_project_name(prompt):
     """Get a valid project name that can be used as a directory name."""
     while True:
         project_name = input(prompt)
         # Replace spaces with underscores and remove special characters
-        project_name = re.sub(r'[^\w\s-]', '', project_name).strip().replace(' ', '_')
+        project_name = sanitize_project_name(project_name)
         if project_name:
             return project_name
         print("Please enter a valid project name.")
@@ -22,216 +34,122 @@ def display_questions(response):
     """Display questions from an agent response more clearly."""
     if response.is_truncated:
         print("\n⚠️ INCOMPLETE RESPONSE DETECTED")
-        print("The agent's response appears to have been cut off unexpectedly.")
-        print("Options:")
-        print("1. Try regenerating the response")
-        print("2. Continue from where it left off")
-        print("3. Provide more information and retry")
+        print("The agent's response was cut off at the token limit even after being continued automatically.")
     
     for i, question in enumerate(response.questions, 1):
             print(f"{i}. {question}")
 
-def run_prototype_workflow(project_name, project_description):
-    """Run the rapid prototype workflow."""
-    print("\n--- RAPID PROTOTYPE WORKFLOW ---")
-    print("This workflow focuses on quick implementation and minimal viable features.")
-    
-    # Initialize agents
-    prototype_planner = ProductManager()
-    technical_advisor = CTO()
-    prototype_developer = EngineeringManager()
-    task_generator = TaskGenerator()
-    
-    # Save project description to a file
-    os.makedirs(os.path.join("outputs", project_name), exist_ok=True)
-    with open(os.path.join("outputs", project_name, "project_description.md"), "w") as f:
-        f.write(f"# {project_name}\n\n{project_description}")
-    
-    # Prototype Planner evaluation (first)
-    print("\nPrototype Planner is defining core features...")
-    planner_response = prototype_planner.evaluate_project(project_description)
-    planner_file = save_to_markdown(planner_response, "prototype_requirements", project_name)
-    print(f"\nPrototype requirements saved to: {planner_file}")
-    
-    # Loop through Planner follow-up questions if needed
-    while planner_response.needs_followup:
-        print("\nPrototype Planner has some questions about core functionality:")
-        display_questions(planner_response)
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Feature Information:\n" + additional_info
-        planner_response = prototype_planner.evaluate_project(project_description)
-        planner_file = save_to_markdown(planner_response, "prototype_requirements", project_name)
-        print(f"\nUpdated prototype requirements saved to: {planner_file}")
-    
-    # Technical Advisor evaluation (second)
-    print("\nTechnical Advisor is suggesting practical technologies for your prototype...")
-    tech_response = technical_advisor.evaluate_project(planner_response)
-    tech_file = save_to_markdown(tech_response, "technical_approach", project_name)
-    print(f"\nTechnical approach saved to: {tech_file}")
-    
-    # Loop through Technical Advisor follow-up questions if needed
-    while tech_response.needs_followup:
-        print("\nTechnical Advisor needs some clarification about your prototype:")
-        display_questions(tech_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Information:\n" + additional_info
-        tech_response = technical_advisor.evaluate_project(project_description)
-        tech_file = save_to_markdown(tech_response, "technical_approach", project_name)
-        print(f"\nUpdated technical approach saved to: {tech_file}")
-    
-    # Prototype Developer implementation plan
-    print("\nPrototype Developer is creating a practical implementation plan...")
-    developer_response = prototype_developer.create_task_list(planner_response, tech_response)
-    developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-    print(f"\nImplementation plan saved to: {developer_file}")
-    
-    # Loop through Developer follow-up questions if needed
-    while developer_response.needs_followup:
-        print("\nPrototype Developer has some implementation questions:")
-        display_questions(developer_response)
-            
-        if developer_response.is_truncated:
-            action = input("\nHow would you like to proceed? (1/2/3): ")
-            if action == "1":
-                # Regenerate response
-                print("\nRegenerating the implementation plan...")
-                developer_response = prototype_developer.create_task_list(planner_response, tech_response)
-                developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-                print(f"\nUpdated implementation plan saved to: {developer_file}")
-                continue
-            elif action == "2":
-                # Continue from where it left off
-                print("\nContinuing from where the response left off...")
-                # We'll use the same prompt but ask to continue
-                additional_prompt = "\n\nYour previous response was cut off. Please continue from where you left off."
-                developer_response = prototype_developer.continue_from_truncated(planner_response, tech_response, developer_response.raw_response)
-                developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-                print(f"\nUpdated implementation plan saved to: {developer_file}")
-                continue
-        
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Implementation Information:\n" + additional_info
-        developer_response = prototype_developer.create_task_list(planner_response, tech_response)
-        developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-        print(f"\nUpdated implementation plan saved to: {developer_file}")
-    
-    # Generate detailed task list
-    print("\nTask Generator is creating a detailed task list for engineers...")
-    task_response = task_generator.generate_tasks(developer_response, tech_response)
-    task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-    print(f"\nDetailed engineering tasks saved to: {task_file}")
-    
-    # Loop through Task Generator follow-up questions if needed
-    while task_response.needs_followup:
-        print("\nTask Generator has some questions about task breakdown:")
-        display_questions(task_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Task Information:\n" + additional_info
-        task_response = task_generator.generate_tasks(developer_response, tech_response)
-        task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-        print(f"\nUpdated engineering tasks saved to: {task_file}")
-    
-    print(f"\nPrototype plan for '{project_name}' completed!")
-    print(f"All outputs saved to: outputs/{project_name}/")
-    print(f"\nYour prototype development plan includes:")
-    print(f"1. Technical Approach: {tech_file}")
-    print(f"2. Prototype Requirements: {planner_file}")
-    print(f"3. Implementation Plan: {developer_file}")
-    print(f"4. Engineering Tasks: {task_file}")
+def print_run_stats():
+    """Show token usage, provider prompt-cache activity, local response cache hits, parse failures, retries and hedges."""
+    usage = get_usage_totals()
+    if usage["input_tokens"] or usage["output_tokens"]:
+        print(f"\nToken usage: {usage['input_tokens']} input, {usage['output_tokens']} output, "
+              f"{usage['cache_read_input_tokens']} cache read, {usage['cache_creation_input_tokens']} cache write")
+    stats = get_response_cache().stats()
+    if stats["hits"] or stats["misses"]:
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    parses = get_parse_stats()
+    if any(parses.values()):
+        print(f"Agent replies: {parses['structured']} structured, {parses['parsed']} parsed from text, "
+              f"{parses['failed']} parse failures")
+    triage = get_triage_stats()
+    if any(triage.values()):
+        print(f"Triage: {triage['questions']} rounds answered with questions only, "
+              f"{triage['pass_on']} passed on to the full generation")
+    retries = get_retry_totals()
+    if any(retries.values()):
+        print(f"Retried API calls: {retries['rate_limit']} rate limited, {retries['overloaded']} overloaded, "
+              f"{retries['connection']} connection errors")
+    hedges = get_hedge_stats()
+    if hedges["hedged"]:
+        print(f"Hedged requests: {hedges['hedged']} of {hedges['calls']} eligible calls, "
+              f"{hedges['hedge_wins']} won by the hedge")
+    ledger = get_ledger()
+    if ledger.run_cost:
+        print(f"Cost: ${ledger.run_cost:.4f} this run" + (f" of a ${ledger.run_budget:.2f} budget" if ledger.run_budget else ""))
 
-def run_cto_workflow(project_name, project_description):
-    """Run the CTO workflow for robust, scalable software."""
-    print("\n--- CTO WORKFLOW FOR ROBUST SOFTWARE ---")
-    print("This workflow focuses on scalability, maintainability, and long-term architecture.")
-    
-    # Initialize agents
-    technical_advisor = RobustCTO()
-    product_manager = RobustProductManager()
-    engineering_manager = RobustEngineeringManager()
-    task_generator = TaskGenerator()
-    
-    # Save project description to a file
-    os.makedirs(os.path.join("outputs", project_name), exist_ok=True)
-    with open(os.path.join("outputs", project_name, "project_description.md"), "w") as f:
-        f.write(f"# {project_name}\n\n{project_description}")
-    
-    # CTO evaluation
-    print("\nCTO is designing a robust technical architecture...")
-    tech_response = technical_advisor.evaluate_project(project_description)
-    tech_file = save_to_markdown(tech_response, "technical_architecture", project_name)
-    print(f"\nTechnical architecture saved to: {tech_file}")
-    
-    # Loop through CTO follow-up questions if needed
-    while tech_response.needs_followup:
-        print("\nCTO needs more information about your long-term vision:")
-        display_questions(tech_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Information:\n" + additional_info
-        tech_response = technical_advisor.evaluate_project(project_description)
-        tech_file = save_to_markdown(tech_response, "technical_architecture", project_name)
-        print(f"\nUpdated technical architecture saved to: {tech_file}")
-    
-    # Product Strategy evaluation
-    print("\nProduct Strategy Manager is defining comprehensive requirements...")
-    product_response = product_manager.evaluate_project(project_description, tech_response)
-    product_file = save_to_markdown(product_response, "product_requirements", project_name)
-    print(f"\nProduct requirements saved to: {product_file}")
-    
-    # Loop through Product Manager follow-up questions if needed
-    while product_response.needs_followup:
-        print("\nProduct Strategy Manager has questions about product vision:")
-        display_questions(product_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Product Information:\n" + additional_info
-        product_response = product_manager.evaluate_project(project_description, tech_response)
-        product_file = save_to_markdown(product_response, "product_requirements", project_name)
-        print(f"\nUpdated product requirements saved to: {product_file}")
-    
-    # Engineering Lead implementation plan
-    print("\nEngineering Lead is creating a robust implementation plan...")
-    engineering_response = engineering_manager.create_task_list(product_response, tech_response)
-    engineering_file = save_to_markdown(engineering_response, "engineering_plan", project_name)
-    print(f"\nEngineering plan saved to: {engineering_file}")
-    
-    # Loop through Engineering Lead follow-up questions if needed
-    while engineering_response.needs_followup:
-        print("\nEngineering Lead has some implementation questions:")
-        display_questions(engineering_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Technical Information:\n" + additional_info
-        engineering_response = engineering_manager.create_task_list(product_response, tech_response)
-        engineering_file = save_to_markdown(engineering_response, "engineering_plan", project_name)
-        print(f"\nUpdated engineering plan saved to: {engineering_file}")
-    
-    # Generate detailed task list
-    print("\nTask Generator is creating a detailed task list for engineers...")
-    task_response = task_generator.generate_tasks(engineering_response, tech_response)
-    task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-    print(f"\nDetailed engineering tasks saved to: {task_file}")
-    
-    # Loop through Task Generator follow-up questions if needed
-    while task_response.needs_followup:
-        print("\nTask Generator has some questions about task breakdown:")
-        display_questions(task_response)
-            
-        additional_info = input("\nPlease provide additional information: ")
-        project_description += "\n\nAdditional Task Information:\n" + additional_info
-        task_response = task_generator.generate_tasks(engineering_response, tech_response)
-        task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-        print(f"\nUpdated engineering tasks saved to: {task_file}")
-    
-    print(f"\nRobust software plan for '{project_name}' completed!")
+def ask_user(stage, response):
+    """Show a stage's follow-up questions and read the answer from the terminal."""
+    print(f"\n{stage.question_message}")
+    display_questions(response)
+    return input("\nPlease provide additional information: ")
+
+def ask_form(questions):
+    """Put every agent's questions to the user as one form; an empty answer skips a question."""
+    print("\nBefore the agents start, please answer their questions (press Enter to skip one):")
+    answers = []
+    for i, (question, _) in enumerate(questions, 1):
+        answers.append(input(f"\n{i}. {question}\n> "))
+    return answers
+
+def run_workflow(workflow, project_name, project_description, resume=False, rerun=()):
+    """Run a workflow for a project and print where its outputs were saved."""
+    print(f"\n--- {workflow.title} ---")
+    print(workflow.focus)
+
+    runner = WorkflowRunner(workflow, project_name, project_description, ask_user, resume=resume, rerun=rerun,
+                            gather=ask_form if gather_enabled() else None)
+    try:
+        results = runner.run()
+    except BudgetExceeded as e:
+        print(f"\n{e}")
+        print("Finished stages are saved; raise the budget and reopen the project to resume.")
+        print_run_stats()
+        return
+    except NeedsInput as e:
+        print(f"\n{e}")
+        print("Finished stages are saved; add the missing details to the description and reopen the project to resume.")
+        print_run_stats()
+        return
+
+    print("\n" + workflow.completion_message.format(project_name=project_name))
     print(f"All outputs saved to: outputs/{project_name}/")
-    print(f"\nYour comprehensive development plan includes:")
-    print(f"1. Technical Architecture: {tech_file}")
-    print(f"2. Product Requirements: {product_file}")
-    print(f"3. Engineering Plan: {engineering_file}")
-    print(f"4. Engineering Tasks: {task_file}")
+    print(f"\n{workflow.summary_heading}")
+    for i, stage in enumerate(workflow.stages, 1):
+        print(f"{i}. {stage.title}: {results[stage.name][1]}")
+    print_run_stats()
+
+def view_project_files(project_name, project_dir):
+    # Skip the artifact store and other directories
+    files = sorted(f for f in os.listdir(project_dir) if os.path.isfile(os.path.join(project_dir, f)))
+    if not files:
+        print(f"No files found in project {project_name}.")
+        return
+
+    print(f"\nFiles in project '{project_name}':")
+    for i, file in enumerate(files, 1):
+        print(f"{i}. {file}")
+
+    file_choice = int(input("\nSelect a file to view (enter number): ")) - 1
+    if 0 <= file_choice < len(files):
+        file_path = os.path.join(project_dir, files[file_choice])
+        with open(file_path, "r") as f:
+            content = f.read()
+            print(f"\nContent of {files[file_choice]}:")
+            print(content)
+    else:
+        print("Invalid file selection.")
+
+def show_artifact(project_name, stage_name, version=None):
+    """Print one version of a stage's artifact (the latest by default), rebuilt from the artifact store."""
+    catalog = get_catalog()
+    rows = catalog.artifacts(project_name, stage_name)
+    if version is not None:
+        rows = [row for row in rows if row["version"] == version]
+    if not rows:
+        print(f"No {stage_name} artifact found for project '{project_name}'" + (f" at version {version}." if version else "."))
+        for row in catalog.artifacts(project_name):
+            print(f"  {row['stage']} v{row['version']} ({row['status']}, {row['created_at']})")
+        return
+    row = rows[-1]
+    project_dir = os.path.join("outputs", project_name)
+    store = ArtifactStore(project_dir)
+    if row["content_hash"] and store.contains(row["content_hash"]):
+        content = store.get(row["content_hash"])
+    else:
+        with open(os.path.join(project_dir, row["file"]), "r") as f:
+            content = f.read()
+    print(content)
 
 def main():
     print("\nWelcome to the Software Development Assistant!")
@@ -253,10 +171,8 @@ def main():
         project_name = get_valid_project_name("\nEnter a name for your project: ")
         project_description = input("\nPlease describe your idea in detail: ")
         
-        if workflow_choice == "1":
-            run_prototype_workflow(project_name, project_description)
-        else:
-            run_cto_workflow(project_name, project_description)
+        workflow = PROTOTYPE_WORKFLOW if workflow_choice == "1" else CTO_WORKFLOW
+        run_workflow(workflow, project_name, project_description)
             
     elif choice == "2":
         # List existing projects
@@ -264,394 +180,175 @@ def main():
             print("No existing projects found.")
             return
             
-        # Get list of project directories
-        projects = [d for d in os.listdir("outputs") if os.path.isdir(os.path.join("outputs", d))]
+        # Projects come from the catalog index rather than a directory scan
+        projects = get_catalog().projects()
         if not projects:
             print("No existing projects found.")
             return
             
         print("\nExisting projects:")
         for i, project in enumerate(projects, 1):
-            print(f"{i}. {project}")
+            details = ", ".join(value for value in (project["workflow"], project["status"]) if value)
+            print(f"{i}. {project['name']}" + (f" ({details})" if details else ""))
             
         project_choice = int(input("\nSelect a project to reopen (enter number): ")) - 1
-        if 0 <= project_choice < len(projects):
-            project_name = projects[project_choice]
-            project_dir = os.path.join("outputs", project_name)
+        if not 0 <= project_choice < len(projects):
+            print("Invalid project selection.")
+            return
+
+        project_name = projects[project_choice]["name"]
+        project_dir = os.path.join("outputs", project_name)
+        
+        # Get project description
+        description_path = os.path.join(project_dir, "project_description.md")
+        if os.path.exists(description_path):
+            with open(description_path, "r") as f:
+                project_description = f.read()
+                # Strip the project name heading if present
+                project_description = re.sub(f"^# {re.escape(project_name)}\n\n", "", project_description)
+        else:
+            project_description = input("\nProject description not found. Please describe your project: ")
             
-            # Get project description
-            description_path = os.path.join(project_dir, "project_description.md")
-            if os.path.exists(description_path):
-                with open(description_path, "r") as f:
-                    project_description = f.read()
-                    # Strip the project name heading if present
-                    project_description = re.sub(f"^# {project_name}\n\n", "", project_description)
+        # Check for incomplete workflow
+        print("\nChecking project status...")
+        workflow = detect_workflow(project_name)
+        
+        # Compare each stage's recorded inputs hash with what it would be sent now
+        runner = WorkflowRunner(workflow, project_name, project_description, ask_user, resume=True)
+        statuses = runner.plan()
+        for stage in workflow.stages:
+            status = statuses[stage.name]
+            if status == CURRENT:
+                artifact = runner.current_artifact(stage.name)
+                # A deleted view is rewritten from the artifact store when the workflow runs
+                print(f"✓ {stage.title}: {os.path.basename(artifact) if artifact else 'stored version'}")
+            elif status == CHANGED:
+                print(f"↻ {stage.title}: Inputs changed")
+            elif status == STALE:
+                print(f"↻ {stage.title}: Upstream step will be regenerated")
             else:
-                project_description = input("\nProject description not found. Please describe your project: ")
-                
-            # Check for incomplete workflow
-            print("\nChecking project status...")
-            
-            # Define the sequence of files expected for each workflow
-            prototype_files = [
-                ("technical_approach", "Technical Approach"),
-                ("prototype_requirements", "Prototype Requirements"),
-                ("implementation_plan", "Implementation Plan"),
-                ("engineering_tasks", "Engineering Tasks")
-            ]
-            
-            cto_files = [
-                ("technical_architecture", "Technical Architecture"),
-                ("product_requirements", "Product Requirements"),
-                ("engineering_plan", "Engineering Plan"),
-                ("engineering_tasks", "Engineering Tasks")
-            ]
-            
-            # Determine which workflow was used
-            workflow_files = prototype_files
-            workflow_type = "prototype"
-            
-            # Check for CTO workflow files
-            if any(os.path.exists(os.path.join(project_dir, f"*{file_prefix}*.md")) for file_prefix, _ in cto_files):
-                workflow_files = cto_files
-                workflow_type = "cto"
+                print(f"✗ {stage.title}: Missing")
+        
+        if any(status != CURRENT for status in statuses.values()):
+            print("\nThis project has missing or out-of-date steps that can be resumed.")
+            print("Options:")
+            print("1. View existing files")
+            print("2. Resume workflow (regenerate only missing and out-of-date steps)")
+            resume_choice = input("\nEnter your choice (1 or 2): ")
             
-            # Find the most recent version of each file type
-            existing_files = {}
-            missing_files = []
+            if resume_choice == "1":
+                view_project_files(project_name, project_dir)
+            elif resume_choice == "2":
+                # Up-to-date stages are loaded from disk, the rest are generated
+                print("\nResuming workflow from incomplete step...")
+                run_workflow(workflow, project_name, project_description, resume=True)
+            else:
+                print("Invalid choice.")
+        else:
+            # All files exist, just show files as in original behavior
+            last_stage = workflow.stages[-1]
+            print("\nAll workflow steps are complete for this project.")
+            print("Options:")
+            print("1. View existing files")
+            print(f"2. Regenerate the last step ({last_stage.title})")
             
-            for file_prefix, file_desc in workflow_files:
-                # Find files matching the pattern
-                matching_files = [f for f in os.listdir(project_dir) 
-                                 if f.startswith(file_prefix) and f.endswith(".md")]
-                
-                if matching_files:
-                    # Sort by timestamp (newest first)
-                    matching_files.sort(reverse=True)
-                    existing_files[file_prefix] = os.path.join(project_dir, matching_files[0])
-                    print(f"✓ {file_desc}: {matching_files[0]}")
-                else:
-                    missing_files.append((file_prefix, file_desc))
-                    print(f"✗ {file_desc}: Missing")
+            view_choice = input("\nEnter your choice (1 or 2): ")
             
-            if missing_files:
-                print("\nThis project has incomplete steps that can be resumed.")
-                print("Options:")
-                print("1. View existing files")
-                print("2. Resume workflow from incomplete step")
-                resume_choice = input("\nEnter your choice (1 or 2): ")
-                
-                if resume_choice == "1":
-                    # Show existing files (original behavior)
-                    files = os.listdir(project_dir)
-                    if not files:
-                        print(f"No files found in project {project_name}.")
-                        return
-                        
-                    print(f"\nFiles in project '{project_name}':")
-                    for i, file in enumerate(files, 1):
-                        print(f"{i}. {file}")
-                        
-                    file_choice = int(input("\nSelect a file to view (enter number): ")) - 1
-                    if 0 <= file_choice < len(files):
-                        file_path = os.path.join(project_dir, files[file_choice])
-                        with open(file_path, "r") as f:
-                            content = f.read()
-                            print(f"\nContent of {files[file_choice]}:")
-                            print(content)
-                    else:
-                        print("Invalid file selection.")
-                elif resume_choice == "2":
-                    # Resume workflow
-                    print("\nResuming workflow from incomplete step...")
-                    
-                    # Load existing outputs for the resume
-                    tech_response = None
-                    planner_response = None
-                    developer_response = None
-                    
-                    # For prototype workflow
-                    if workflow_type == "prototype":
-                        # Initialize agents
-                        prototype_planner = ProductManager()
-                        technical_advisor = CTO()
-                        prototype_developer = EngineeringManager()
-                        task_generator = TaskGenerator()
-                        
-                        # Load existing outputs
-                        if "prototype_requirements" in existing_files:
-                            with open(existing_files["prototype_requirements"], "r") as f:
-                                req_content = f.read()
-                            planner_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(req_content) + '}')
-                            
-                        if "technical_approach" in existing_files:
-                            with open(existing_files["technical_approach"], "r") as f:
-                                tech_content = f.read()
-                            tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                            
-                        if "implementation_plan" in existing_files:
-                            with open(existing_files["implementation_plan"], "r") as f:
-                                impl_content = f.read()
-                            developer_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(impl_content) + '}')
-                        
-                        # Resume from the earliest missing step, in the correct order
-                        # 1. Prototype Requirements
-                        if "prototype_requirements" not in existing_files:
-                            print("\nResuming from Prototype Requirements step...")
-                            print("\nPrototype Planner is defining core features...")
-                            planner_response = prototype_planner.evaluate_project(project_description)
-                            planner_file = save_to_markdown(planner_response, "prototype_requirements", project_name)
-                            print(f"\nPrototype requirements saved to: {planner_file}")
-                            while planner_response.needs_followup:
-                                print("\nPrototype Planner has some questions about core functionality:")
-                                display_questions(planner_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Feature Information:\n" + additional_info
-                                planner_response = prototype_planner.evaluate_project(project_description)
-                                planner_file = save_to_markdown(planner_response, "prototype_requirements", project_name)
-                                print(f"\nUpdated prototype requirements saved to: {planner_file}")
-                            # After this, update existing_files so next steps can use the new file
-                            existing_files["prototype_requirements"] = planner_file
-
-                        # 2. Technical Approach
-                        if "technical_approach" not in existing_files:
-                            print("\nResuming from Technical Approach step...")
-                            print("\nTechnical Advisor is suggesting practical technologies for your prototype...")
-                            # Always load the latest requirements
-                            with open(existing_files["prototype_requirements"], "r") as f:
-                                req_content = f.read()
-                            planner_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(req_content) + '}')
-                            tech_response = technical_advisor.evaluate_project(planner_response)
-                            tech_file = save_to_markdown(tech_response, "technical_approach", project_name)
-                            print(f"\nTechnical approach saved to: {tech_file}")
-                            while tech_response.needs_followup:
-                                print("\nTechnical Advisor needs some clarification about your prototype:")
-                                display_questions(tech_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Information:\n" + additional_info
-                                tech_response = technical_advisor.evaluate_project(planner_response)
-                                tech_file = save_to_markdown(tech_response, "technical_approach", project_name)
-                                print(f"\nUpdated technical approach saved to: {tech_file}")
-                            existing_files["technical_approach"] = tech_file
-
-                        # 3. Implementation Plan
-                        if "implementation_plan" not in existing_files:
-                            print("\nResuming from Implementation Plan step...")
-                            print("\nPrototype Developer is creating a practical implementation plan...")
-                            # Always load the latest requirements and tech approach
-                            with open(existing_files["prototype_requirements"], "r") as f:
-                                req_content = f.read()
-                            planner_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(req_content) + '}')
-                            with open(existing_files["technical_approach"], "r") as f:
-                                tech_content = f.read()
-                            tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                            developer_response = prototype_developer.create_task_list(planner_response, tech_response)
-                            developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-                            print(f"\nImplementation plan saved to: {developer_file}")
-                            while developer_response.needs_followup:
-                                print("\nPrototype Developer has some implementation questions:")
-                                display_questions(developer_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Implementation Information:\n" + additional_info
-                                developer_response = prototype_developer.create_task_list(planner_response, tech_response)
-                                developer_file = save_to_markdown(developer_response, "implementation_plan", project_name)
-                                print(f"\nUpdated implementation plan saved to: {developer_file}")
-                            existing_files["implementation_plan"] = developer_file
-
-                        # 4. Engineering Tasks
-                        if "engineering_tasks" not in existing_files:
-                            print("\nResuming from Engineering Tasks step...")
-                            print("\nTask Generator is creating a detailed task list for engineers...")
-                            # Always load the latest implementation plan and tech approach
-                            with open(existing_files["implementation_plan"], "r") as f:
-                                impl_content = f.read()
-                            developer_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(impl_content) + '}')
-                            with open(existing_files["technical_approach"], "r") as f:
-                                tech_content = f.read()
-                            tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                            task_response = task_generator.generate_tasks(developer_response, tech_response)
-                            task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                            print(f"\nDetailed engineering tasks saved to: {task_file}")
-                            while task_response.needs_followup:
-                                print("\nTask Generator has some questions about task breakdown:")
-                                display_questions(task_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                task_response = task_generator.generate_tasks(developer_response, tech_response)
-                                task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                                print(f"\nUpdated engineering tasks saved to: {task_file}")
-                            existing_files["engineering_tasks"] = task_file
-                            
-                        print(f"\nPrototype plan for '{project_name}' completed!")
-                        print(f"All outputs saved to: outputs/{project_name}/")
-                    
-                    # For CTO workflow
-                    else:
-                        # Similar structure to resume CTO workflow
-                        # Initialize agents
-                        technical_advisor = RobustCTO()
-                        product_manager = RobustProductManager()
-                        engineering_manager = RobustEngineeringManager()
-                        task_generator = TaskGenerator()
-                        
-                        # Load existing outputs
-                        if "technical_architecture" in existing_files:
-                            with open(existing_files["technical_architecture"], "r") as f:
-                                tech_content = f.read()
-                            tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                            
-                        if "product_requirements" in existing_files:
-                            with open(existing_files["product_requirements"], "r") as f:
-                                req_content = f.read()
-                            product_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(req_content) + '}')
-                            
-                        if "engineering_plan" in existing_files:
-                            with open(existing_files["engineering_plan"], "r") as f:
-                                eng_content = f.read()
-                            engineering_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(eng_content) + '}')
-                        
-                        # Resume from the earliest missing step
-                        if "technical_architecture" not in existing_files:
-                            print("\nResuming from Technical Architecture step...")
-                            # CTO evaluation
-                            print("\nCTO is designing a robust technical architecture...")
-                            tech_response = technical_advisor.evaluate_project(project_description)
-                            tech_file = save_to_markdown(tech_response, "technical_architecture", project_name)
-                            print(f"\nTechnical architecture saved to: {tech_file}")
-                            
-                            # Handle follow-up questions if needed
-                            while tech_response.needs_followup:
-                                print("\nCTO needs more information about your long-term vision:")
-                                display_questions(tech_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Information:\n" + additional_info
-                                tech_response = technical_advisor.evaluate_project(project_description)
-                                tech_file = save_to_markdown(tech_response, "technical_architecture", project_name)
-                                print(f"\nUpdated technical architecture saved to: {tech_file}")
-                        
-                        if "product_requirements" not in existing_files:
-                            print("\nResuming from Product Requirements step...")
-                            # Product Strategy evaluation
-                            print("\nProduct Strategy Manager is defining comprehensive requirements...")
-                            product_response = product_manager.evaluate_project(project_description, tech_response)
-                            product_file = save_to_markdown(product_response, "product_requirements", project_name)
-                            print(f"\nProduct requirements saved to: {product_file}")
-                            
-                            # Handle follow-up questions if needed
-                            while product_response.needs_followup:
-                                print("\nProduct Strategy Manager has questions about product vision:")
-                                display_questions(product_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Product Information:\n" + additional_info
-                                product_response = product_manager.evaluate_project(project_description, tech_response)
-                                product_file = save_to_markdown(product_response, "product_requirements", project_name)
-                                print(f"\nUpdated product requirements saved to: {product_file}")
-                        
-                        if "engineering_plan" not in existing_files:
-                            print("\nResuming from Engineering Plan step...")
-                            # Engineering Lead implementation plan
-                            print("\nEngineering Lead is creating a robust implementation plan...")
-                            engineering_response = engineering_manager.create_task_list(product_response, tech_response)
-                            engineering_file = save_to_markdown(engineering_response, "engineering_plan", project_name)
-                            print(f"\nEngineering plan saved to: {engineering_file}")
-                            
-                            # Handle follow-up questions if needed
-                            while engineering_response.needs_followup:
-                                print("\nEngineering Lead has some implementation questions:")
-                                display_questions(engineering_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Technical Information:\n" + additional_info
-                                engineering_response = engineering_manager.create_task_list(product_response, tech_response)
-                                engineering_file = save_to_markdown(engineering_response, "engineering_plan", project_name)
-                                print(f"\nUpdated engineering plan saved to: {engineering_file}")
-                        
-                        if "engineering_tasks" not in existing_files:
-                            print("\nResuming from Engineering Tasks step...")
-                            # Generate detailed task list
-                            print("\nTask Generator is creating a detailed task list for engineers...")
-                            task_response = task_generator.generate_tasks(engineering_response, tech_response)
-                            task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                            print(f"\nDetailed engineering tasks saved to: {task_file}")
-                            
-                            # Handle follow-up questions if needed
-                            while task_response.needs_followup:
-                                print("\nTask Generator has some questions about task breakdown:")
-                                display_questions(task_response)
-                                additional_info = input("\nPlease provide additional information: ")
-                                project_description += "\n\nAdditional Task Information:\n" + additional_info
-                                task_response = task_generator.generate_tasks(engineering_response, tech_response)
-                                task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                                print(f"\nUpdated engineering tasks saved to: {task_file}")
-                            
-                        print(f"\nRobust software plan for '{project_name}' completed!")
-                        print(f"All outputs saved to: outputs/{project_name}/")
-                    
-                else:
-                    print("Invalid choice.")
+            if view_choice == "1":
+                view_project_files(project_name, project_dir)
+            elif view_choice == "2":
+                print(f"\nRegenerating {last_stage.title.lower()}...")
+                run_workflow(workflow, project_name, project_description, resume=True, rerun=[last_stage.name])
             else:
-                # All files exist, just show files as in original behavior
-                print("\nAll workflow steps are complete for this project.")
-                print("Options:")
-                print("1. View existing files")
-                print("2. Regenerate the last step (Engineering Tasks)")
-                
-                view_choice = input("\nEnter your choice (1 or 2): ")
-                
-                if view_choice == "1":
-                    # Show existing files (original behavior)
-                    files = os.listdir(project_dir)
-                    print(f"\nFiles in project '{project_name}':")
-                    for i, file in enumerate(files, 1):
-                        print(f"{i}. {file}")
-                        
-                    file_choice = int(input("\nSelect a file to view (enter number): ")) - 1
-                    if 0 <= file_choice < len(files):
-                        file_path = os.path.join(project_dir, files[file_choice])
-                        with open(file_path, "r") as f:
-                            content = f.read()
-                            print(f"\nContent of {files[file_choice]}:")
-                            print(content)
-                    else:
-                        print("Invalid file selection.")
-                elif view_choice == "2":
-                    # Regenerate the task list using either workflow
-                    if workflow_type == "prototype":
-                        # Load dependencies
-                        with open(existing_files["implementation_plan"], "r") as f:
-                            impl_content = f.read()
-                        developer_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(impl_content) + '}')
-                        
-                        with open(existing_files["technical_approach"], "r") as f:
-                            tech_content = f.read()
-                        tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                        
-                        # Generate task list
-                        task_generator = TaskGenerator()
-                        print("\nRegenerating task list...")
-                        task_response = task_generator.generate_tasks(developer_response, tech_response)
-                        task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                        print(f"\nUpdated engineering tasks saved to: {task_file}")
-                    else:
-                        # Load dependencies
-                        with open(existing_files["engineering_plan"], "r") as f:
-                            eng_content = f.read()
-                        engineering_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(eng_content) + '}')
-                        
-                        with open(existing_files["technical_architecture"], "r") as f:
-                            tech_content = f.read()
-                        tech_response = AgentResponse('{"command": "pass-on", "content": ' + json.dumps(tech_content) + '}')
-                        
-                        # Generate task list
-                        task_generator = TaskGenerator()
-                        print("\nRegenerating task list...")
-                        task_response = task_generator.generate_tasks(engineering_response, tech_response)
-                        task_file = save_to_markdown(task_response, "engineering_tasks", project_name)
-                        print(f"\nUpdated engineering tasks saved to: {task_file}")
-                else:
-                    print("Invalid choice.")
-        else:
-            print("Invalid project selection.")
+                print("Invalid choice.")
     else:
         print("Invalid choice. Please select 1 or 2.")
 
+def serve_fake_api(args):
+    """Run the fake messages API in the foreground until interrupted."""
+    config = FakeServerConfig(ttft=args.ttft, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+                              followup_rate=args.followup_rate, rate_limit_rate=args.rate_limit_rate,
+                              overload_rate=args.overload_rate, stream_error_rate=args.stream_error_rate,
+                              retry_after=args.retry_after, seed=args.seed)
+    server = FakeAnthropicServer(config, port=args.port)
+    print(f"Fake Anthropic API listening on {server.base_url}")
+    print(f"Run the assistant against it with ANTHROPIC_BASE_URL={server.base_url} ANTHROPIC_API_KEY=fake", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed: {server.get_stats()}")
+    finally:
+        server.httpd.server_close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Software Development Assistant")
+    commands = parser.add_subparsers(dest="command")
+    show = commands.add_parser("show", help="print a stored version of a project artifact")
+    show.add_argument("project")
+    show.add_argument("stage")
+    show.add_argument("version", nargs="?", type=int, help="version number (default: latest)")
+    batch = commands.add_parser("batch", help="run every project in a JSONL file of ideas unattended")
+    batch.add_argument("ideas", help="JSONL file of {name, description, workflow, answers} records")
+    batch.add_argument("--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                       help=f"projects to run at once (default: {DEFAULT_BATCH_CONCURRENCY})")
+    batch.add_argument("--answer-policy", choices=ANSWER_POLICIES, default="assume",
+                       help="what to do with follow-up questions the file has no answers for (default: assume)")
+    batch.add_argument("--max-followups", type=int, default=DEFAULT_MAX_FOLLOWUPS,
+                       help=f"follow-up rounds allowed per stage (default: {DEFAULT_MAX_FOLLOWUPS})")
+    batch.add_argument("--status-file", help="status log to append to (default: <ideas>.status.jsonl)")
+    fake = commands.add_parser("fake-server", help="serve a local fake of the messages API for offline runs")
+    fake.add_argument("--port", type=int, default=8765)
+    fake.add_argument("--ttft", type=float, default=0.3, help="median seconds to first token")
+    fake.add_argument("--tokens-per-second", type=float, default=200.0, help="median output tokens per second")
+    fake.add_argument("--output-tokens", type=int, default=1200, help="median reply size in tokens")
+    fake.add_argument("--followup-rate", type=float, default=0.0, help="fraction of unanswered prompts that get follow-up questions")
+    fake.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    fake.add_argument("--overload-rate", type=float, default=0.0, help="fraction of requests answered with 529")
+    fake.add_argument("--stream-error-rate", type=float, default=0.0, help="fraction of requests failing halfway through")
+    fake.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s")
+    fake.add_argument("--seed", type=int, default=0)
+    stats = commands.add_parser("stats", help="summarize call latency and token usage from the metrics log")
+    stats.add_argument("--project", help="only calls made for this project")
+    stats.add_argument("--workflow", choices=list(WORKFLOWS), help="only calls made by this workflow")
+    stats.add_argument("--log", help="metrics log to read (default: LLM_METRICS_PATH or .cache/metrics.jsonl)")
+    costs = commands.add_parser("costs", help="summarize spend per run, project, stage and model from the cost ledger")
+    costs.add_argument("--project", help="only calls made for this project")
+    costs.add_argument("--ledger", help="ledger to read (default: LEDGER_PATH or .cache/ledger.jsonl)")
+    bench = commands.add_parser("bench", help="benchmark both workflows and resume against the fake API")
+    bench.add_argument("--projects", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                       help=f"concurrent project counts to run (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    bench.add_argument("--speedup", type=float, default=DEFAULT_SPEEDUP,
+                       help=f"how much faster than realistic the fake API answers (default: {DEFAULT_SPEEDUP})")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--baseline", help="JSON baseline to check for regressions")
+    bench.add_argument("--save", help="write the results (and thresholds) to this JSON file")
+    bench.add_argument("--threshold", action="append", default=[], metavar="METRIC=FRACTION",
+                       help="allowed growth of a metric over the baseline, e.g. wall_seconds=0.3")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    args = parse_args()
+    try:
+        with profiling():
+            if args.command == "show":
+                show_artifact(args.project, args.stage, args.version)
+            elif args.command == "stats":
+                print_stats(args.log, args.project, args.workflow)
+            elif args.command == "costs":
+                print_costs(args.ledger, args.project)
+            elif args.command == "bench":
+                overrides = {}
+                for item in args.threshold:
+                    metric, _, fraction = item.partition("=")
+                    overrides[metric] = float(fraction)
+                regressions = run_benchmarks(args.projects, args.speedup, args.seed, args.baseline, args.save, overrides)
+                sys.exit(1 if regressions else 0)
+            elif args.command == "fake-server":
+                serve_fake_api(args)
+            elif args.command == "batch":
+                run_batch(args.ideas, args.concurrency, args.answer_policy, args.max_followups, args.status_file)
+                print_run_stats()
+            else:
+                main()
+    finally:
+        close_clients()
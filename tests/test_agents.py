@@ -0,0 +1,53 @@
+import json
+import asyncio
+import pytest
+from utils import agents
+from utils.claude_client import ClaudeResponse, EARLY_STOP
+from utils.ledger import Ledger
+
+ENVELOPE = json.dumps({
+    "command": "follow-up",
+    "questions": ["Who are the users?", "Which platforms matter?"],
+    "content": "Draft requirements. " * 50
+})
+
+class StreamingClient:
+    """Streams ENVELOPE to on_text in small chunks, noting how much was sent before each question arrived."""
+
+    def __init__(self, chunk_size=8):
+        self.chunk_size = chunk_size
+        self.sent = 0
+
+    async def generate_async(self, prompt, system_prompt=None, on_text=None, **kwargs):
+        for start in range(0, len(ENVELOPE), self.chunk_size):
+            self.sent = start + self.chunk_size
+            if on_text(ENVELOPE[start:self.sent]):
+                return ClaudeResponse(ENVELOPE[:self.sent], EARLY_STOP)
+            await asyncio.sleep(0)
+        return ClaudeResponse(ENVELOPE, "end_turn")
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STRUCTURED_OUTPUT", "off")
+    client = StreamingClient()
+    monkeypatch.setattr(agents, "get_client", lambda: client)
+    monkeypatch.setattr(agents, "get_ledger", lambda: Ledger(str(tmp_path / "ledger.jsonl")))
+    monkeypatch.setattr(agents, "log_call", lambda *args, **kwargs: None)
+    return client
+
+@pytest.mark.parametrize("stop_on_followup", ["on", "off"])
+def test_questions_arrive_before_the_stream_ends(client, monkeypatch, stop_on_followup):
+    monkeypatch.setenv("STOP_ON_FOLLOWUP", stop_on_followup)
+    arrived = []
+
+    def on_question(question):
+        arrived.append((question, client.sent))
+
+    response = asyncio.run(agents.ProductManager().evaluate_project_async("A todo app", on_question=on_question))
+
+    assert [question for question, _ in arrived] == response.questions == ["Who are the users?", "Which platforms matter?"]
+    # Each question was delivered while the reply was still streaming, right after it closed
+    for question, sent in arrived:
+        assert sent < len(ENVELOPE)
+        assert sent <= ENVELOPE.index(question) + len(question) + client.chunk_size
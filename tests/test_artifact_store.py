@@ -0,0 +1,38 @@
+import pytest
+from utils.artifact_store import ArtifactStore, MAX_DELTA_DEPTH
+from utils.manifest import content_hash
+
+BASE = "".join(f"- Task {i}: implement feature {i}\n" for i in range(200))
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path))
+
+def test_versions_round_trip_through_deltas(store):
+    versions = [BASE, BASE.replace("Task 5:", "Task 5 (blocked):"), BASE + "- Task 200: ship it\n",
+                "# Rewritten\n" + BASE[:2000], ""]
+    keys = [store.save("tasks", text) for text in versions]
+
+    assert [store.get(key) for key in keys] == versions
+    assert keys == [content_hash(text) for text in versions]
+    assert store.head("tasks") == keys[-1]
+    # A small edit is stored as a delta against the previous version
+    assert store._load(keys[1])["base"] == keys[0]
+
+def test_identical_content_is_stored_once(store):
+    first = store.save("tasks", BASE)
+    assert store.save("plan", BASE) == first
+    assert store.head("plan") == store.head("tasks") == first
+    assert "text" in store._load(first)
+
+def test_delta_chains_are_bounded(store):
+    keys = [store.save("tasks", BASE + f"- Revision {i}\n") for i in range(MAX_DELTA_DEPTH + 2)]
+
+    depths = [store._load(key).get("depth", 0) for key in keys]
+    assert max(depths) == MAX_DELTA_DEPTH
+    assert depths[MAX_DELTA_DEPTH + 1] == 0
+    assert store.get(keys[-1]) == BASE + f"- Revision {MAX_DELTA_DEPTH + 1}\n"
+
+def test_unknown_name_has_no_head(store):
+    assert store.head("tasks") is None
+    assert not store.contains(content_hash("never saved"))
@@ -0,0 +1,68 @@
+import json
+import asyncio
+import pytest
+from utils import batch, workflow
+from utils.agents import AgentResponse
+from utils.batch import BatchRun
+from utils.catalog import Catalog
+from utils.ledger import Ledger
+from utils.manifest import stable_hash
+from utils.workflow import Workflow, Stage, DESCRIPTION
+
+class StubAgent:
+    def __init__(self, workflow=None):
+        self.cache_policy = None
+
+    def request_hash(self, *args, **kwargs):
+        return stable_hash([getattr(arg, "content", arg) for arg in args])
+
+class Planner(StubAgent):
+    """Asks once, then writes the answer it got into its requirements."""
+
+    async def evaluate_project_async(self, description, on_text=None, on_question=None):
+        if "Additional Information" not in description:
+            return AgentResponse(json.dumps({"command": "follow-up", "questions": ["Who uses it?"], "content": ""}))
+        return AgentResponse(json.dumps({"command": "pass-on", "content": description.split(":\n")[-1]}))
+
+class Developer(StubAgent):
+    """Crashes while crashing is set; otherwise asks once and echoes its answer."""
+    crashing = True
+
+    async def evaluate_project_async(self, requirements, additional_info=None, on_text=None, on_question=None):
+        if Developer.crashing:
+            raise RuntimeError("connection lost")
+        if not additional_info:
+            return AgentResponse(json.dumps({"command": "follow-up", "questions": ["Which stack?"], "content": ""}))
+        return AgentResponse(json.dumps({"command": "pass-on", "content": additional_info.strip()}))
+
+STUB_WORKFLOW = Workflow("stub", "STUB WORKFLOW", "", [
+    Stage("requirements", "Requirements", Planner, "evaluate_project", inputs=[DESCRIPTION],
+          start_message="", question_message=""),
+    Stage("plan", "Plan", Developer, "evaluate_project", inputs=["requirements"],
+          start_message="", question_message=""),
+], completion_message="", summary_heading="")
+
+@pytest.fixture(autouse=True)
+def outputs(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STREAM_RESPONSES", "off")
+    monkeypatch.setitem(batch.WORKFLOWS, "stub", STUB_WORKFLOW)
+    catalog = Catalog(str(tmp_path / "outputs"))
+    monkeypatch.setattr(workflow, "get_catalog", lambda: catalog)
+    ledger = Ledger(str(tmp_path / "ledger.jsonl"))
+    monkeypatch.setattr(workflow, "get_ledger", lambda: ledger)
+
+def run_batch(answers):
+    record = {"name": "demo", "description": "A todo app", "workflow": "stub", "answers": answers}
+    return asyncio.run(BatchRun([record], policy="fail").run_async())["demo"]
+
+def test_resume_gives_list_answers_to_the_stages_still_to_run(monkeypatch):
+    monkeypatch.setattr(Developer, "crashing", True)
+    assert run_batch(["Small teams", "Python"])["status"] == "failed"
+
+    # The rerun reads the file again; requirements is reused and must not leave its answer to plan
+    monkeypatch.setattr(Developer, "crashing", False)
+    entry = run_batch(["Small teams", "Python"])
+    assert entry["status"] == "complete"
+    with open(entry["artifacts"]["plan"]) as f:
+        assert f.read() == "Python"
@@ -0,0 +1,75 @@
+import os
+import json
+import asyncio
+import pytest
+from utils.batch_client import BatchClaudeClient, FakeBatchService, PendingBatches, BatchRequestError
+from utils.response_cache import ResponseCache, make_cache_key
+
+def request(prompt):
+    return {"model": "claude-3-7-sonnet-20250219", "max_tokens": 100, "messages": [{"role": "user", "content": prompt}]}
+
+@pytest.fixture
+def batch_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv("BATCH_WINDOW", "0.05")
+    monkeypatch.setenv("BATCH_POLL_INTERVAL", "0.05")
+    monkeypatch.setenv("BATCH_PENDING_PATH", str(tmp_path / "pending.json"))
+    monkeypatch.delenv("BATCH_MAX_REQUESTS", raising=False)
+    return str(tmp_path / "batches")
+
+def make_client(batch_dir, tmp_path, latency=0, service_class=FakeBatchService):
+    client = BatchClaudeClient(api_key="test-key", service=service_class(batch_dir, latency=latency))
+    client.cache = ResponseCache(directory=str(tmp_path / "cache"), mode="on")
+    return client
+
+def submitted(batch_dir):
+    return sorted(os.listdir(batch_dir)) if os.path.isdir(batch_dir) else []
+
+def test_requests_on_one_loop_share_a_batch(batch_dir, tmp_path):
+    client = make_client(batch_dir, tmp_path)
+    streamed = []
+
+    async def send_all():
+        return await asyncio.gather(client._send_async(request("Plan A"), streamed.append),
+                                    client._send_async(request("Plan B in detail")),
+                                    client._send_async(request("Plan A")))
+
+    first, second, again = asyncio.run(send_all())
+
+    assert len(submitted(batch_dir)) == 1
+    with open(os.path.join(batch_dir, submitted(batch_dir)[0], "requests.jsonl")) as f:
+        assert len(f.readlines()) == 2
+    assert json.loads(first.text)["command"] == "pass-on"
+    assert first.text == again.text != second.text
+    # Results arrive in one piece, and are cached under their custom id
+    assert streamed == [first.text]
+    assert client.cache.get(make_cache_key(request("Plan B in detail")))["text"] == second.text
+    assert PendingBatches().batches("fake") == {}
+
+def test_rerun_reattaches_to_a_batch_still_in_flight(batch_dir, tmp_path):
+    crashed = make_client(batch_dir, tmp_path, latency=60)
+
+    async def crash():
+        await asyncio.wait_for(crashed._send_async(request("Plan A")), timeout=0.3)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(crash())
+    [batch_id] = submitted(batch_dir)
+    assert PendingBatches().batches("fake") == {batch_id: [make_cache_key(request("Plan A"))]}
+
+    rerun = make_client(batch_dir, tmp_path)
+    result = asyncio.run(rerun._send_async(request("Plan A")))
+
+    assert json.loads(result.text)["command"] == "pass-on"
+    assert submitted(batch_dir) == [batch_id]
+    assert PendingBatches().batches("fake") == {}
+
+class ErroringBatchService(FakeBatchService):
+    def results(self, batch_id):
+        for custom_id, _, _ in super().results(batch_id):
+            yield custom_id, "errored", '{"type": "overloaded_error"}'
+
+def test_failed_batch_requests_raise(batch_dir, tmp_path):
+    client = make_client(batch_dir, tmp_path, service_class=ErroringBatchService)
+    with pytest.raises(BatchRequestError, match="errored"):
+        asyncio.run(client._send_async(request("Plan A")))
+    assert client.cache.get(make_cache_key(request("Plan A"))) is None
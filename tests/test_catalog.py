@@ -0,0 +1,52 @@
+import os
+import pytest
+from utils.artifact_store import ArtifactStore, write_atomic
+from utils.catalog import Catalog, CATALOG_FILENAME
+from utils.manifest import ProjectManifest
+
+@pytest.fixture
+def outputs(tmp_path):
+    return str(tmp_path / "outputs")
+
+def run_stage(catalog, project_dir, stage, rounds):
+    """Save and index rounds the way WorkflowRunner does, recording the last one in the manifest."""
+    store = ArtifactStore(project_dir)
+    manifest = ProjectManifest(project_dir)
+    for i, text in enumerate(rounds):
+        key = store.save(stage, text)
+        status = "complete" if i == len(rounds) - 1 else "questions"
+        version = catalog.record_artifact("demo", stage, f"{stage}.md", "inputs", key, status)
+    write_atomic(os.path.join(project_dir, f"{stage}.md"), rounds[-1])
+    manifest.record_stage(stage, f"{stage}.md", version, "inputs", key, ["answer"] * (len(rounds) - 1))
+    manifest.set_project("prototype", "complete")
+    return version
+
+def rows(catalog):
+    return [(row["stage"], row["version"], row["file"], row["status"]) for row in catalog.artifacts("demo")]
+
+def test_rebuild_keeps_the_versions_written_during_runs(outputs):
+    catalog = Catalog(outputs)
+    project_dir = os.path.join(outputs, "demo")
+    assert run_stage(catalog, project_dir, "prototype_requirements", ["# Questions", "# Questions again", "# Requirements"]) == 3
+    run_stage(catalog, project_dir, "technical_approach", ["# Approach"])
+
+    os.remove(os.path.join(outputs, CATALOG_FILENAME))
+    rebuilt = Catalog(outputs)
+
+    assert rebuilt.project("demo")["workflow"] == "prototype"
+    assert rebuilt.project("demo")["status"] == "complete"
+    assert rows(rebuilt) == [("prototype_requirements", 3, "prototype_requirements.md", "complete"),
+                             ("technical_approach", 1, "technical_approach.md", "complete")]
+    # The next round continues the numbering instead of reusing a version
+    assert rebuilt.record_artifact("demo", "prototype_requirements", "prototype_requirements.md") == 4
+
+def test_rebuild_indexes_timestamped_artifacts_from_before_the_store(outputs):
+    project_dir = os.path.join(outputs, "demo")
+    for filename in ("technical_approach_20240101_120000.md", "technical_approach_20240102_120000.md", "notes.md"):
+        write_atomic(os.path.join(project_dir, filename), "# Approach")
+
+    catalog = Catalog(outputs)
+
+    assert rows(catalog) == [("technical_approach", 1, "technical_approach_20240101_120000.md", "unknown"),
+                             ("technical_approach", 2, "technical_approach_20240102_120000.md", "unknown")]
+    assert catalog.latest_artifact("demo", "technical_approach")["created_at"] == "2024-01-02T12:00:00"
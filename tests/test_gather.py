@@ -0,0 +1,38 @@
+from utils.gather import dedupe_questions, format_answers, question_words, jaccard
+
+def test_question_words_drop_stopwords_and_suffixes():
+    assert question_words("Who are the users of the app?") == {"who", "user", "app"}
+    assert question_words("Which platforms should it support?") == question_words("Which platform is supported?")
+
+def test_jaccard():
+    assert jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+    assert jaccard(set(), set()) == 1.0
+
+def test_near_duplicates_merge_under_the_first_wording():
+    asked = [
+        ("prototype_requirements", "Who are the target users?"),
+        ("technical_approach", "Which platforms should it support?"),
+        ("technical_approach", "Who are the target users of the app?"),
+        ("implementation_plan", "Which platforms are supported?"),
+        ("implementation_plan", "What is the deadline?"),
+        ("engineering_tasks", "Who is the target user?"),
+    ]
+    assert dedupe_questions(asked) == [
+        ("Who are the target users?", ["prototype_requirements", "technical_approach", "engineering_tasks"]),
+        ("Which platforms should it support?", ["technical_approach", "implementation_plan"]),
+        ("What is the deadline?", ["implementation_plan"]),
+    ]
+
+def test_threshold_decides_what_counts_as_the_same_question():
+    asked = [("a", "Which database do you prefer?"), ("b", "Which database hosting do you prefer?")]
+    assert len(dedupe_questions(asked)) == 1
+    assert len(dedupe_questions(asked, threshold=0.9)) == 2
+
+def test_same_stage_is_listed_once():
+    assert dedupe_questions([("a", "Who are the users?"), ("a", "Who will the users be?")]) == [
+        ("Who are the users?", ["a"])
+    ]
+
+def test_unanswered_questions_are_left_out():
+    pairs = [("Who are the users?", " Small teams \n"), ("What is the deadline?", ""), ("Budget?", None)]
+    assert format_answers(pairs) == "Q: Who are the users?\nA: Small teams"
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from utils.claude_client import ClaudeClient, ClaudeResponse
+from utils.hedging import LatencyHistory, HedgePolicy, percentile, MIN_SAMPLES, HISTORY_WINDOW, MIN_PROGRESS_WINDOW
+
+MODEL = "claude-test"
+REQUEST = {"model": MODEL, "max_tokens": 16000, "messages": [{"role": "user", "content": "Plan it."}]}
+
+@pytest.fixture
+def history(tmp_path):
+    history = LatencyHistory(str(tmp_path / "latency.json"))
+    for i in range(MIN_SAMPLES):
+        history.record(MODEL, 0.01 * (i + 1), 1000.0 + i)
+    return history
+
+def test_percentile_is_nearest_rank():
+    assert percentile([], 95) is None
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([3, 1, 2], 50) == 2
+
+def test_history_is_persisted_and_windowed(tmp_path):
+    history = LatencyHistory(str(tmp_path / "latency.json"))
+    for i in range(HISTORY_WINDOW + 5):
+        history.record(MODEL, float(i), None if i % 2 else 10.0)
+    reloaded = LatencyHistory(str(tmp_path / "latency.json"))
+    assert reloaded.samples[MODEL]["ttft"] == [float(i) for i in range(5, HISTORY_WINDOW + 5)]
+    # Calls cancelled before streaming add a time to first token but no rate
+    assert len(reloaded.samples[MODEL]["rate"]) == (HISTORY_WINDOW + 5 + 1) // 2
+
+def test_only_long_calls_with_enough_history_are_watched(history):
+    policy = HedgePolicy(history, p=95, budget=0.05, min_max_tokens=8000)
+    assert policy.thresholds(dict(REQUEST, max_tokens=4000)) is None
+    assert policy.thresholds(dict(REQUEST, model="unseen")) is None
+    assert policy.thresholds(REQUEST) == (0.19, 1000.0)
+    assert policy.stats["calls"] == 1
+
+def test_is_behind(history):
+    policy = HedgePolicy(history)
+    assert policy.is_behind((0.2, 1000.0), 0.3, None, 0)
+    assert not policy.is_behind((0.2, 1000.0), 0.1, None, 0)
+    assert policy.is_behind((0.2, 1000.0), 5, MIN_PROGRESS_WINDOW + 1, 100)
+    # The rate is only judged after a few seconds of streaming, and not at all without rate samples
+    assert not policy.is_behind((0.2, 1000.0), 5, MIN_PROGRESS_WINDOW / 2, 0)
+    assert not policy.is_behind((0.2, None), 5, MIN_PROGRESS_WINDOW + 1, 0)
+
+def test_hedges_stay_within_budget(history):
+    policy = HedgePolicy(history, budget=0.1, min_max_tokens=1)
+    for _ in range(20):
+        policy.thresholds(REQUEST)
+    assert [policy.try_hedge() for _ in range(3)] == [True, True, False]
+
+class SlowPrimaryClient(ClaudeClient):
+    """The first call never produces a token; the hedge answers at once."""
+
+    def __init__(self, policy):
+        super().__init__(api_key="test-key")
+        self.hedge_policy = policy
+        self.rate_limiter = None
+        self.requests = []
+
+    async def _send_async(self, request_params, on_text=None, timeout=None, usage=None):
+        self.requests.append(request_params)
+        usage.update({"input_tokens": 100, "cache_read_input_tokens": 50})
+        if len(self.requests) == 1:
+            await asyncio.sleep(30)
+        on_text("Hedged reply.")
+        return ClaudeResponse("Hedged reply.", "end_turn",
+                              {"input_tokens": 100, "cache_read_input_tokens": 50, "output_tokens": 20})
+
+def test_hedged_reply_carries_the_usage_of_both_calls(history):
+    policy = HedgePolicy(history, budget=1.0, min_max_tokens=1)
+    client = SlowPrimaryClient(policy)
+    streamed = []
+
+    result = asyncio.run(client._send_hedged_async(REQUEST, streamed.append))
+
+    assert result.text == "Hedged reply."
+    assert streamed == ["Hedged reply."]
+    assert result.usage == {"input_tokens": 200, "output_tokens": 20,
+                            "cache_creation_input_tokens": 0, "cache_read_input_tokens": 100}
+    assert policy.stats == {"calls": 1, "hedged": 1, "hedge_wins": 1}
+    # The cancelled primary still counts in the history, with the time it waited
+    assert len(history.samples[MODEL]["ttft"]) == MIN_SAMPLES + 1
+    assert history.samples[MODEL]["ttft"][-1] > 0.19
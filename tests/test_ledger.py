@@ -0,0 +1,82 @@
+import pytest
+from utils.claude_client import ClaudeResponse
+from utils.ledger import Ledger, BudgetExceeded, model_pricing, call_cost, load_entries, PRICING
+from utils.metrics import metrics_context
+
+SONNET = "claude-3-7-sonnet-20250219"
+HAIKU = "claude-3-5-haiku-20241022"
+# $3 + $15 = $18 on Sonnet
+MILLION_EACH = {"input_tokens": 1_000_000, "output_tokens": 1_000_000}
+
+@pytest.fixture
+def budgets(monkeypatch):
+    for name in ("BUDGET_PROJECT_USD", "BUDGET_RUN_USD", "BUDGET_SOFT_LIMIT", "BUDGET_FALLBACK_MODEL",
+                 "BUDGET_MAX_FOLLOWUPS", "LLM_BACKEND"):
+        monkeypatch.delenv(name, raising=False)
+
+    def set_budgets(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(name, str(value))
+    return set_budgets
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "ledger.jsonl")
+
+def test_models_are_priced_by_prefix_or_family():
+    assert model_pricing(SONNET) is PRICING["claude-3-7-sonnet"]
+    assert model_pricing("claude-opus-4-1-20250805") is PRICING["claude-opus-4"]
+    assert model_pricing("claude-haiku-9") is PRICING["claude-3-5-haiku"]
+    with pytest.raises(ValueError):
+        model_pricing("gpt-4o")
+
+def test_call_cost(budgets):
+    usage = dict(MILLION_EACH, cache_read_input_tokens=1_000_000, cache_creation_input_tokens=1_000_000)
+    assert call_cost(SONNET, usage) == pytest.approx(3 + 15 + 0.30 + 3.75)
+    budgets(LLM_BACKEND="batch")
+    assert call_cost(SONNET, usage) == pytest.approx((3 + 15 + 0.30 + 3.75) / 2)
+
+def test_spend_is_totalled_per_project_across_runs(budgets, path):
+    ledger = Ledger(path)
+    with metrics_context(project="alpha", stage="requirements"):
+        assert ledger.record(ClaudeResponse("", usage=MILLION_EACH), SONNET, "CTO") == pytest.approx(18)
+        assert ledger.record(ClaudeResponse("", usage=MILLION_EACH, cached=True), SONNET) == 0
+    with metrics_context(project="beta"):
+        ledger.record(ClaudeResponse("", usage={"output_tokens": 1_000_000}), HAIKU)
+
+    assert ledger.run_cost == pytest.approx(22)
+    reopened = Ledger(path)
+    assert reopened.run_cost == 0
+    assert reopened.project_cost("alpha") == pytest.approx(18)
+    assert reopened.project_cost("beta") == pytest.approx(4)
+    assert [(entry["project"], entry["stage"], entry["agent"]) for entry in load_entries(path)] == [
+        ("alpha", "requirements", "CTO"), ("beta", None, None)
+    ]
+
+def test_soft_limit_switches_to_the_fallback_model_and_caps_followups(budgets, path):
+    budgets(BUDGET_PROJECT_USD=20, BUDGET_MAX_FOLLOWUPS=2)
+    ledger = Ledger(path)
+    with metrics_context(project="alpha"):
+        assert ledger.model_for(SONNET) == SONNET
+        assert ledger.followup_cap("alpha") is None
+        ledger.record(ClaudeResponse("", usage=MILLION_EACH), SONNET)
+        # $18 of $20 is past the 80% soft limit
+        assert ledger.model_for(SONNET) == HAIKU
+        # A model already cheaper than the fallback is kept
+        assert ledger.model_for("claude-3-haiku-20240307") == "claude-3-haiku-20240307"
+        assert ledger.followup_cap("alpha") == 2
+    assert ledger.followup_cap("beta") is None
+
+def test_spent_budget_refuses_the_next_call(budgets, path):
+    budgets(BUDGET_RUN_USD=10)
+    ledger = Ledger(path)
+    ledger.record(ClaudeResponse("", usage=MILLION_EACH), SONNET)
+    with pytest.raises(BudgetExceeded, match=r"\$18.00 spent this run"):
+        ledger.model_for(SONNET)
+    # A new run has its own run budget
+    assert Ledger(path).model_for(SONNET) == SONNET
+
+def test_unpriced_fallback_model_is_rejected(budgets, path):
+    budgets(BUDGET_FALLBACK_MODEL="mystery-model")
+    with pytest.raises(ValueError):
+        Ledger(path)
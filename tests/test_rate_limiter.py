@@ -0,0 +1,65 @@
+import pytest
+from utils import rate_limiter
+from utils.rate_limiter import RateLimiter, get_rate_limiter, estimate_input_tokens
+
+REQUEST = {"model": "m", "max_tokens": 1000, "system": "Be brief.", "messages": [{"role": "user", "content": "x" * 400}]}
+LIMITS = {"requests": 60, "input_tokens": 6000, "output_tokens": 6000}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, "time", lambda: now[0])
+    return now
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    return RateLimiter(str(tmp_path / "limits.json"), LIMITS, headroom=1.0)
+
+def levels(limiter):
+    return limiter._update(dict)
+
+def test_acquire_reserves_a_request_its_prompt_and_max_tokens(limiter):
+    reservation = limiter.acquire(REQUEST)
+    assert reservation == {"requests": 1, "input_tokens": estimate_input_tokens(REQUEST), "output_tokens": 1000}
+    assert levels(limiter) == {"requests": 59, "input_tokens": 6000 - reservation["input_tokens"], "output_tokens": 5000}
+
+def test_settle_gives_back_unused_tokens_and_takes_the_shortfall(limiter):
+    reservation = limiter.acquire(REQUEST)
+    limiter.settle(reservation, {"input_tokens": 10, "cache_creation_input_tokens": reservation["input_tokens"] + 40,
+                                 "output_tokens": 200})
+    # 50 more input tokens than estimated are taken, the 800 unused output tokens given back
+    assert levels(limiter) == {"requests": 59, "input_tokens": 6000 - reservation["input_tokens"] - 50,
+                               "output_tokens": 5800}
+
+def test_failed_call_gets_its_tokens_back_but_keeps_its_request(limiter):
+    limiter.settle(limiter.acquire(REQUEST), {})
+    assert levels(limiter) == {"requests": 59, "input_tokens": 6000, "output_tokens": 6000}
+
+def test_buckets_refill_over_a_minute_up_to_capacity(limiter, clock):
+    limiter.acquire(REQUEST)
+    clock[0] += 6
+    assert levels(limiter)["output_tokens"] == 5600
+    clock[0] += 600
+    assert levels(limiter) == {"requests": 60, "input_tokens": 6000, "output_tokens": 6000}
+
+def test_empty_bucket_reports_the_wait(limiter):
+    for _ in range(6):
+        limiter.acquire(REQUEST)
+    # The output bucket is empty and refills 100 tokens a second
+    assert limiter._try_take(limiter._reservation(REQUEST)) == pytest.approx(10)
+    assert levels(limiter)["requests"] == 54
+
+def test_processes_share_the_state_file(tmp_path, clock):
+    first = RateLimiter(str(tmp_path / "limits.json"), LIMITS, headroom=1.0)
+    second = RateLimiter(str(tmp_path / "limits.json"), LIMITS, headroom=1.0)
+    first.acquire(REQUEST)
+    assert levels(second)["output_tokens"] == 5000
+
+def test_no_limits_means_no_limiter(monkeypatch, tmp_path):
+    for name in ("ANTHROPIC_RPM", "ANTHROPIC_ITPM", "ANTHROPIC_OTPM"):
+        monkeypatch.delenv(name, raising=False)
+    assert get_rate_limiter("key") is None
+    monkeypatch.setenv("ANTHROPIC_RPM", "50")
+    monkeypatch.setenv("RATE_LIMIT_DIR", str(tmp_path))
+    assert get_rate_limiter("key") is get_rate_limiter("key")
+    assert get_rate_limiter("key") is not get_rate_limiter("other key")
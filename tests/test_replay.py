@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from utils.cassette import Cassette
+from utils.claude_client import ClaudeClient, ClaudeResponse
+from utils.replay_client import ReplayClaudeClient, CassetteMiss
+from utils.response_cache import ResponseCache
+
+PREFILL = '{"command": "pass-on", "content": "# Plan'
+# The live reply hits max_tokens once and is continued
+PARTS = [('\\n\\nPart one.', "max_tokens"), (' Part two."}', "end_turn")]
+
+class ScriptedClient(ClaudeClient):
+    """Answers with PARTS in turn instead of calling the API, recording to a cassette."""
+
+    def __init__(self, cassette, cache):
+        super().__init__(api_key="test-key")
+        self.cache = cache
+        self.recorder = cassette
+        self.rate_limiter = None
+        self.hedge_policy = None
+        self.parts = list(PARTS)
+
+    async def _send_async(self, request_params, on_text=None, timeout=None, usage=None):
+        text, stop_reason = self.parts.pop(0)
+        if on_text:
+            on_text(text)
+        return ClaudeResponse(text, stop_reason, {"input_tokens": 10, "output_tokens": 5})
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(directory=str(tmp_path / "cache"), mode="off")
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    return str(tmp_path / "cassette.jsonl")
+
+def generate(client, prompt="Plan it."):
+    streamed = []
+    result = asyncio.run(client.generate_async(prompt, "Be brief.", max_tokens=50, on_text=streamed.append,
+                                               prefill=PREFILL))
+    return result, "".join(streamed)
+
+def test_replay_matches_the_recorded_reply(cache, cassette_path):
+    live, live_streamed = generate(ScriptedClient(Cassette(cassette_path), cache))
+    assert live.text == PREFILL + "".join(text for text, _ in PARTS)
+    assert live.continuations == 1
+
+    replay = ReplayClaudeClient(cassette=Cassette(cassette_path))
+    replay.cache = cache
+    replayed, replayed_streamed = generate(replay)
+
+    # The recorded reply starts with the prefill, which must not be repeated
+    assert replayed.text == live.text
+    assert replayed_streamed == live_streamed == live.text
+    assert replayed.continuations == live.continuations
+    assert replayed.usage == live.usage
+
+def test_unrecorded_request_is_a_miss(cache, cassette_path):
+    generate(ScriptedClient(Cassette(cassette_path), cache))
+    replay = ReplayClaudeClient(cassette=Cassette(cassette_path))
+    replay.cache = cache
+    with pytest.raises(CassetteMiss, match="No recorded response"):
+        generate(replay, "Plan something else.")
+
+def test_latest_recording_of_a_request_wins(cassette_path):
+    request = {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "Hi"}]}
+    cassette = Cassette(cassette_path)
+    cassette.record(request, ClaudeResponse("first", "end_turn"))
+    cassette.record(request, ClaudeResponse("second", "end_turn"))
+    assert Cassette(cassette_path).lookup(request)["text"] == "second"
+    assert Cassette(cassette_path).lookup(dict(request, max_tokens=20)) is None
+
+def test_replay_client_needs_a_cassette(monkeypatch):
+    monkeypatch.delenv("LLM_REPLAY", raising=False)
+    with pytest.raises(ValueError, match="LLM_REPLAY"):
+        ReplayClaudeClient()
+
+def test_replay_client_has_every_client_attribute(cassette_path):
+    replay = ReplayClaudeClient(cassette=Cassette(cassette_path))
+    assert set(vars(ClaudeClient(api_key="test-key"))) <= set(vars(replay))
+    assert replay.client is None and replay.recorder is None
@@ -0,0 +1,70 @@
+import os
+import time
+import pytest
+from utils import response_cache
+from utils.response_cache import ResponseCache, make_cache_key
+
+VALUE = {"text": "x" * 100, "stop_reason": "end_turn"}
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(directory=str(tmp_path), max_bytes=10 ** 6, max_age=3600, mode="on")
+
+def age(cache, key, seconds):
+    then = time.time() - seconds
+    os.utime(cache._path(key), (then, then))
+
+def test_key_ignores_dict_order():
+    assert make_cache_key({"model": "m", "max_tokens": 1}) == make_cache_key({"max_tokens": 1, "model": "m"})
+    assert make_cache_key({"model": "m"}) != make_cache_key({"model": "n"})
+
+def test_hit_and_miss(cache):
+    assert cache.get("aa01") is None
+    cache.put("aa01", VALUE)
+    assert cache.get("aa01") == VALUE
+    assert cache.stats() == {"hits": 1, "misses": 1, "writes": 1, "evictions": 0, "hit_rate": 0.5}
+
+def test_refresh_skips_reads_but_stores(cache):
+    cache.put("aa01", VALUE, mode="refresh")
+    assert cache.get("aa01", mode="refresh") is None
+    assert cache.get("aa01") == VALUE
+
+def test_off_stores_nothing(cache):
+    cache.put("aa01", VALUE, mode="off")
+    assert cache.get("aa01") is None
+
+def test_expired_entry_is_a_miss_and_removed(cache):
+    cache.put("aa01", VALUE)
+    age(cache, "aa01", 7200)
+    assert cache.get("aa01") is None
+    assert not os.path.exists(cache._path("aa01"))
+
+def test_evicts_least_recently_used_entries_over_max_bytes(cache):
+    cache.put("aa01", VALUE)
+    entry_size = os.path.getsize(cache._path("aa01"))
+    cache.max_bytes = entry_size * 2
+    cache.put("bb02", VALUE)
+    age(cache, "aa01", 60)
+    age(cache, "bb02", 30)
+    # Reading aa01 makes bb02 the least recently used entry
+    assert cache.get("aa01") == VALUE
+
+    cache.put("cc03", VALUE)
+
+    assert cache.get("bb02") is None
+    assert cache.get("aa01") == VALUE
+    assert cache.get("cc03") == VALUE
+    assert cache.stats()["evictions"] == 1
+
+def test_entry_evicted_during_a_hit_is_a_miss(cache, monkeypatch):
+    cache.put("aa01", VALUE)
+
+    def evicted_meanwhile(path, times):
+        # Another process evicts the entry between the read and the touch
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(response_cache.os, "utime", evicted_meanwhile)
+    assert cache.get("aa01") is None
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+import httpx
+import anthropic
+import pytest
+from utils.retry import classify_error, retry_delay, RETRY_POLICIES, MAX_SERVER_DELAY
+
+REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+def status_error(status, error_type=None, headers=None, cls=anthropic.APIStatusError):
+    body = {"type": "error", "error": {"type": error_type, "message": "..."}} if error_type else None
+    return cls("error", response=httpx.Response(status, request=REQUEST, headers=headers or {}), body=body)
+
+@pytest.mark.parametrize("error, expected", [
+    (status_error(429, cls=anthropic.RateLimitError), "rate_limit"),
+    (status_error(529), "overloaded"),
+    (status_error(500, cls=anthropic.InternalServerError), "overloaded"),
+    # Error events sent in the middle of a stream arrive with the stream's 200 status
+    (status_error(200, "overloaded_error"), "overloaded"),
+    (status_error(200, "api_error"), "overloaded"),
+    (status_error(200, "rate_limit_error"), "rate_limit"),
+    (anthropic.APIConnectionError(request=REQUEST), "connection"),
+    (anthropic.APITimeoutError(request=REQUEST), "connection"),
+    (httpx.RemoteProtocolError("peer closed connection"), "connection"),
+    (status_error(400, "invalid_request_error", cls=anthropic.BadRequestError), None),
+    (status_error(401, cls=anthropic.AuthenticationError), None),
+    (ValueError("not an API error"), None),
+])
+def test_classify_error(error, expected):
+    assert classify_error(error) == expected
+
+def test_delay_is_jittered_under_the_backoff_cap(monkeypatch):
+    monkeypatch.delenv("LLM_MAX_RETRIES", raising=False)
+    policy = RETRY_POLICIES["overloaded"]
+    for retries in range(policy["max_retries"]):
+        delay = retry_delay(status_error(529), retries)
+        assert 0 <= delay <= min(policy["max_delay"], policy["base_delay"] * 2 ** retries)
+    assert retry_delay(status_error(529), policy["max_retries"]) is None
+
+def test_unretryable_errors_give_up():
+    assert retry_delay(status_error(400, cls=anthropic.BadRequestError), 0) is None
+
+def test_max_retries_setting_caps_every_class(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_RETRIES", "0")
+    assert retry_delay(status_error(429, cls=anthropic.RateLimitError), 0) is None
+
+def test_server_delay_is_never_undercut_but_is_bounded(monkeypatch):
+    monkeypatch.delenv("LLM_MAX_RETRIES", raising=False)
+    assert retry_delay(status_error(529, headers={"retry-after": "45"}), 0) == 45
+    assert retry_delay(status_error(529, headers={"retry-after-ms": "1500"}), 0) >= 1.5
+    assert retry_delay(status_error(529, headers={"retry-after": "3600"}), 0) == MAX_SERVER_DELAY
+
+def test_rate_limit_without_retry_after_waits_for_the_reset(monkeypatch):
+    monkeypatch.delenv("LLM_MAX_RETRIES", raising=False)
+    reset = (datetime.now(timezone.utc) + timedelta(seconds=40)).isoformat().replace("+00:00", "Z")
+    error = status_error(429, headers={"anthropic-ratelimit-output-tokens-reset": reset}, cls=anthropic.RateLimitError)
+    assert 38 < retry_delay(error, 0) <= 40
@@ -0,0 +1,65 @@
+import os
+import pytest
+from utils import agents
+from utils.claude_client import DEFAULT_MODEL
+from utils.routing import Routing, load_routing
+
+SONNET = "claude-3-7-sonnet-20250219"
+SONNET_4 = "claude-sonnet-4-20250514"
+HAIKU = "claude-3-5-haiku-20241022"
+
+CONFIG = {
+    "defaults": {"model": SONNET, "timeout": 300},
+    "workflows": {"cto": {"model": SONNET_4, "max_tokens": 8000,
+                          "agents": {"RobustEngineeringManager": {"max_tokens": 10000}}}},
+    "agents": {"RobustEngineeringManager": {"max_tokens": 6000, "timeout": 900}},
+}
+
+def test_levels_override_in_order():
+    routing = Routing(CONFIG)
+    assert vars(routing.route("CTO")) == {"model": SONNET, "max_tokens": None, "timeout": 300,
+                                          "followup_model": None, "triage": None}
+    assert vars(routing.route("CTO", "cto"))["model"] == SONNET_4
+    assert vars(routing.route("RobustEngineeringManager", "prototype"))["max_tokens"] == 6000
+    route = routing.route("RobustEngineeringManager", "cto")
+    assert (route.model, route.max_tokens, route.timeout) == (SONNET_4, 10000, 900)
+
+def test_no_config_uses_the_default_model(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("ROUTING_CONFIG", raising=False)
+    assert load_routing().route("CTO").model == DEFAULT_MODEL
+
+def test_example_config_is_valid():
+    path = os.path.join(os.path.dirname(__file__), "..", "routing.example.yaml")
+    assert load_routing(path).route("TaskGenerator").triage is False
+
+@pytest.mark.parametrize("config, message", [
+    ({"defaults": {"modle": SONNET}}, "Unknown routing setting"),
+    ({"agent": {}}, "Unknown routing section"),
+    ({"defaults": {"model": "gpt-4o"}}, "No pricing for model"),
+    ({"agents": {"CTO": {"followup_model": "mystery-model"}}}, "No pricing for model"),
+    ({"agents": {"CTO": {"triage": "yes"}}}, "triage must be true or false"),
+    ({"workflows": {"cto": {"agents": {"CTO": {"max_tokens": 0}}}}}, "max_tokens must be a positive number"),
+    ({"agents": {"CTO": {"timeout": "slow"}}}, "timeout must be a positive number"),
+    ({"defaults": {"agents": {}}}, "defaults cannot have agents"),
+    ({"agents": {"CTO": "claude"}}, "must be a mapping"),
+])
+def test_invalid_configs_are_rejected(config, message):
+    with pytest.raises(ValueError, match=message):
+        Routing(config)
+
+@pytest.mark.parametrize("agent_settings, expected", [
+    ({}, None),
+    ({"triage": True}, SONNET),
+    ({"followup_model": HAIKU}, HAIKU),
+    # An explicit triage: false wins over a followup_model inherited from the defaults
+    ({"triage": False}, None),
+])
+def test_triage_model(monkeypatch, agent_settings, expected):
+    defaults = {"model": SONNET}
+    if agent_settings.get("triage") is False:
+        defaults["followup_model"] = HAIKU
+    routing = Routing({"defaults": defaults, "agents": {"TaskGenerator": agent_settings}})
+    monkeypatch.setattr(agents, "get_routing", lambda: routing)
+    monkeypatch.setattr(agents, "get_client", lambda: None)
+    assert agents.TaskGenerator()._triage_model() == expected
@@ -0,0 +1,49 @@
+import os
+import json
+import pstats
+import asyncio
+import pytest
+from utils.claude_client import _run_blocking, close_clients
+from utils.tracing import profiling, trace_run, span
+
+def busy_on_the_client_thread():
+    return sum(i * i for i in range(10000))
+
+async def client_work():
+    return busy_on_the_client_thread()
+
+@pytest.mark.parametrize("loop_started_before", [True, False])
+def test_cpu_profile_includes_blocking_client_calls(monkeypatch, tmp_path, loop_started_before):
+    monkeypatch.setenv("TRACE_PROFILE", "cpu")
+    close_clients()
+    try:
+        if loop_started_before:
+            _run_blocking(client_work())
+        with profiling(str(tmp_path)):
+            _run_blocking(client_work())
+    finally:
+        close_clients()
+
+    [name] = os.listdir(tmp_path)
+    functions = {function for _, _, function in pstats.Stats(str(tmp_path / name)).stats}
+    assert "busy_on_the_client_thread" in functions
+
+def test_trace_has_a_lane_per_task(monkeypatch, tmp_path):
+    monkeypatch.setenv("TRACE", "on")
+
+    async def stage(name):
+        with span(name, "stage"):
+            await asyncio.sleep(0)
+
+    async def run():
+        with trace_run(str(tmp_path)):
+            await asyncio.gather(asyncio.create_task(stage("a"), name="stage a"),
+                                 asyncio.create_task(stage("b"), name="stage b"))
+
+    asyncio.run(run())
+    [name] = os.listdir(tmp_path)
+    with open(tmp_path / name) as f:
+        events = json.load(f)["traceEvents"]
+    lanes = {event["tid"]: event["args"]["name"] for event in events if event["ph"] == "M"}
+    spans = {event["name"]: lanes[event["tid"]] for event in events if event["ph"] == "X"}
+    assert spans == {"a": "stage a", "b": "stage b"}
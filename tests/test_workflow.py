@@ -0,0 +1,97 @@
+import json
+import asyncio
+import pytest
+from utils import workflow
+from utils.agents import AgentResponse
+from utils.catalog import Catalog
+from utils.ledger import Ledger
+from utils.manifest import ProjectManifest, stable_hash
+from utils.workflow import Workflow, Stage, WorkflowRunner, NeedsInput, DESCRIPTION, ASSUME_ANSWER
+
+QUESTIONS = ["Who are the users?", "Which platforms matter?"]
+
+class StubAgent:
+    """Asks QUESTIONS every round, or only until it is told to assume when gives_in is set."""
+    gives_in = False
+
+    def __init__(self, workflow=None):
+        self.cache_policy = None
+
+    def request_hash(self, *args, **kwargs):
+        return stable_hash(list(args))
+
+    async def evaluate_project_async(self, description, on_text=None, on_question=None):
+        if self.gives_in and ASSUME_ANSWER in description:
+            return AgentResponse(json.dumps({"command": "pass-on", "content": "Requirements on assumptions."}))
+        return AgentResponse(json.dumps({"command": "follow-up", "questions": QUESTIONS, "content": ""}))
+
+class GivingInAgent(StubAgent):
+    gives_in = True
+
+def one_stage_workflow(agent):
+    return Workflow("stub", "STUB WORKFLOW", "", [
+        Stage("requirements", "Requirements", agent, "evaluate_project", inputs=[DESCRIPTION],
+              start_message="", question_message="")
+    ], completion_message="", summary_heading="")
+
+@pytest.fixture(autouse=True)
+def project_dir(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STREAM_RESPONSES", "off")
+    catalog = Catalog(str(tmp_path / "outputs"))
+    monkeypatch.setattr(workflow, "get_catalog", lambda: catalog)
+    ledger = Ledger(str(tmp_path / "ledger.jsonl"))
+    monkeypatch.setattr(workflow, "get_ledger", lambda: ledger)
+    return tmp_path / "outputs" / "demo"
+
+def run(agent, max_followups):
+    asked = []
+
+    def ask(stage, response):
+        asked.append(response.questions)
+        return "Small teams."
+
+    runner = WorkflowRunner(one_stage_workflow(agent), "demo", "A todo app", ask, echo=False,
+                            max_followups=max_followups)
+    return runner, asked, asyncio.run(runner.run_async())
+
+def test_stage_still_asking_after_assumptions_needs_input(project_dir):
+    with pytest.raises(NeedsInput, match="Who are the users"):
+        run(StubAgent, max_followups=1)
+
+    manifest = ProjectManifest(str(project_dir))
+    # The questions must not be recorded as the stage's artifact for downstream stages
+    assert manifest.stage("requirements") is None
+    assert manifest.status == "needs_input"
+
+def test_stage_proceeds_on_assumptions_after_its_followup_rounds(project_dir):
+    runner, asked, results = run(GivingInAgent, max_followups=1)
+
+    assert asked == [QUESTIONS]
+    assert results["requirements"][0].content == "Requirements on assumptions."
+    assert ProjectManifest(str(project_dir)).stage("requirements")["answers"] == ["Small teams.", ASSUME_ANSWER]
+
+class GatheringAgent(StubAgent):
+    """Asks its question in the gather phase and writes out the description it was given."""
+
+    async def gather_questions_async(self, description):
+        return QUESTIONS[:1]
+
+    async def evaluate_project_async(self, description, on_text=None, on_question=None):
+        return AgentResponse(json.dumps({"command": "pass-on", "content": description}))
+
+def test_gathered_answers_reach_the_stage_before_its_first_round():
+    forms = []
+
+    def gather(questions):
+        forms.append(questions)
+        return ["Small teams."]
+
+    def ask(stage, response):
+        raise AssertionError("no follow-up round expected")
+
+    runner = WorkflowRunner(one_stage_workflow(GatheringAgent), "demo", "A todo app", ask, echo=False, gather=gather)
+    results = asyncio.run(runner.run_async())
+
+    assert forms == [[(QUESTIONS[0], ["requirements"])]]
+    assert results["requirements"][0].content.endswith("Q: Who are the users?\nA: Small teams.")
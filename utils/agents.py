@@ -1,40 +1,89 @@
-from .claude_client import ClaudeClient
+from .claude_client import get_client, EARLY_STOP
 from .prompts import (
+    ADDITIONAL_INFO_TEMPLATE,
+    RESPONSE_TOOL,
+    TRIAGE_INSTRUCTIONS,
+    TRIAGE_TOOL,
+    GATHER_TEMPLATE,
     # Task Generator prompts
     TASK_GENERATOR_SYSTEM_PROMPT,
+    TASK_GENERATOR_CONTEXT_TEMPLATE,
     TASK_GENERATOR_TEMPLATE,
     # Prototype workflow prompts
     PROTOTYPE_CTO_SYSTEM_PROMPT,
     PROTOTYPE_PRODUCT_MANAGER_SYSTEM_PROMPT,
     PROTOTYPE_ENGINEERING_MANAGER_SYSTEM_PROMPT,
+    PROTOTYPE_CTO_CONTEXT_TEMPLATE,
     PROTOTYPE_CTO_TEMPLATE,
     PROTOTYPE_PRODUCT_MANAGER_TEMPLATE,
+    PROTOTYPE_ENGINEERING_MANAGER_CONTEXT_TEMPLATE,
     PROTOTYPE_ENGINEERING_MANAGER_TEMPLATE,
     # Robust workflow prompts
     ROBUST_CTO_SYSTEM_PROMPT,
     ROBUST_PRODUCT_MANAGER_SYSTEM_PROMPT,
     ROBUST_ENGINEERING_MANAGER_SYSTEM_PROMPT,
     ROBUST_CTO_TEMPLATE,
+    ROBUST_PRODUCT_MANAGER_CONTEXT_TEMPLATE,
     ROBUST_PRODUCT_MANAGER_TEMPLATE,
+    ROBUST_ENGINEERING_MANAGER_CONTEXT_TEMPLATE,
     ROBUST_ENGINEERING_MANAGER_TEMPLATE
 )
 import os
 import json
 import re
+import threading
 from datetime import datetime
-from .json_utils import robust_json_parse
+from .json_utils import robust_json_parse, StreamingEnvelopeParser
+from .manifest import stable_hash
+from .artifact_store import ArtifactStore, write_atomic
+from .metrics import log_call
+from .ledger import get_ledger
+from .routing import get_routing
+from .tracing import traced
 
-# Default model to use across all agents
-DEFAULT_MODEL = "claude-3-7-sonnet-20250219"
+def stop_on_followup_enabled():
+    return os.getenv("STOP_ON_FOLLOWUP", "on").lower() != "off"
+
+def structured_output_enabled():
+    return os.getenv("STRUCTURED_OUTPUT", "on").lower() != "off"
+
+# How agent replies were turned into envelopes in this process: "structured" came
+# from a forced tool call, "parsed" from JSON text, "failed" fell back to heuristics
+PARSE_OUTCOMES = ("structured", "parsed", "failed")
+_parse_lock = threading.Lock()
+_parse_stats = dict.fromkeys(PARSE_OUTCOMES, 0)
+
+def record_parse(outcome):
+    with _parse_lock:
+        _parse_stats[outcome] += 1
+
+def get_parse_stats():
+    """Return the envelope parse outcomes of every agent reply in this process."""
+    with _parse_lock:
+        return dict(_parse_stats)
+
+# Output budget of a triage pre-pass: a verdict and a handful of questions
+TRIAGE_MAX_TOKENS = 1024
+
+# Triage verdicts in this process: "questions" rounds were answered by the triage
+# call alone, "pass_on" rounds went on to the full generation
+_triage_stats = {"questions": 0, "pass_on": 0}
+
+def get_triage_stats():
+    with _parse_lock:
+        return dict(_triage_stats)
 
 class AgentResponse:
-    def __init__(self, json_str):
+    def __init__(self, json_str, envelope=None, stop_reason=None):
         self.raw_response = json_str
-        self.is_truncated = False
+        self.stop_reason = stop_reason
+        # The API reports truncation directly; stop_reason is None only for text loaded from disk
+        self.is_truncated = stop_reason == "max_tokens"
+        self.parse_failed = False
 
-        # Use the robust JSON parser
+        # Use the robust JSON parser, unless the envelope was already parsed from the stream
         try:
-            data = robust_json_parse(json_str)
+            data = envelope if envelope is not None else robust_json_parse(json_str)
             self.command = data.get("command", "")
             self.content = data.get("content", "")
             self.questions = data.get("questions", [])
@@ -43,12 +92,14 @@ class AgentResponse:
         except Exception as e:
             print("\n[AgentResponse] Robust JSON parse failed:", e)
             print("Offending content:\n", json_str)
+            self.parse_failed = True
 
         # If parsing fails, fallback handling for non-JSON responses
-        if json_str.strip().endswith(("...", "cursor", "```", "'", "\"", ",", "{", "[")):
+        if self.is_truncated or (stop_reason is None and json_str.strip().endswith(("...", "cursor", "```", "'", "\"", ",", "{", "["))):
             self.is_truncated = True
             print("\nDetected truncated response from agent.")
             self.needs_followup = True
+            self.command = "follow-up"
         elif "follow-up" in json_str.lower() or "?" in json_str:
             self.needs_followup = True
             self.command = "follow-up"
@@ -66,7 +117,7 @@ class AgentResponse:
         
         # If we detected a truncated response, add a standard question
         if self.is_truncated:
-            questions.append("The previous response appears to be incomplete. Would you like me to regenerate it or continue from where it left off?")
+            questions.append("The response hit the output limit even after being continued automatically. Which parts can be shortened or left out?")
             return questions
         
         for line in lines:
@@ -85,191 +136,376 @@ class AgentResponse:
         
         if self.is_truncated:
             questions_md += "## ⚠️ Incomplete Response Detected\n\n"
-            questions_md += "The previous response appears to have been cut off unexpectedly.\n\n"
+            questions_md += "The previous response was cut off at the output token limit.\n\n"
         
         for i, q in enumerate(self.questions, 1):
             questions_md += f"{i}. {q}\n"
         
         return questions_md
 
-class CTO:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = PROTOTYPE_CTO_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
+def with_additional_info(prompt, additional_info):
+    """Append the user's follow-up answers to a prompt so each round sends a new request."""
+    if not additional_info:
+        return prompt
+    return prompt + ADDITIONAL_INFO_TEMPLATE.format(additional_info=additional_info)
+
+def _content(value):
+    """Extract just the content if the value is an AgentResponse."""
+    if isinstance(value, AgentResponse):
+        return value.content
+    return value
+
+class Agent:
+    """Base class for all agents: holds the shared client and turns prompts into AgentResponses.
+
+    Prompt builders return a (context, prompt) pair. The context carries the
+    upstream documents, which stay the same across follow-up rounds and are
+    prompt-cached by the provider; the prompt carries the instructions and
+    anything that changes between rounds.
+
+    The model, max_tokens and timeout of its calls come from the agent's
+    route in the workflow it runs in (see utils.routing).
+    """
+    system_prompt = None
+
+    def __init__(self, workflow=None):
+        self.client = get_client()
+        self.route = get_routing().route(type(self).__name__, workflow)
+        self.model = self.route.model
+        # None uses the response cache, "refresh" forces a new generation, "bypass" skips the cache
+        self.cache_policy = None
+
+    def _envelope_parser(self, on_text, on_question=None):
+        # on_text receives the decoded markdown content, not the raw JSON envelope,
+        # and on_question each follow-up question as soon as it is complete
+        return StreamingEnvelopeParser(on_question=on_question, on_content=on_text,
+                                       stop_on_followup=stop_on_followup_enabled())
+
+    def request_hash(self, *args, **kwargs):
+        """Hash everything that determines this agent's request for the given inputs.
+
+        Takes the same arguments as _build_prompt; covers the model, system
+        prompt and rendered prompt.
+        """
+        context, prompt = self._build_prompt(*args, **kwargs)
+        return stable_hash({"model": self.model, "system": self.system_prompt, "context": context, "prompt": prompt})
+
+    def _tool_params(self):
+        # Force the envelope tool so the reply is schema-validated JSON instead of free text
+        if not structured_output_enabled():
+            return {}
+        return {"tools": [RESPONSE_TOOL], "tool_choice": {"type": "tool", "name": RESPONSE_TOOL["name"]}}
+
+    def _triage_tool_params(self):
+        # The verdict has no content field, so the triage call cannot start writing the document
+        return {"tools": [TRIAGE_TOOL], "tool_choice": {"type": "tool", "name": TRIAGE_TOOL["name"]}}
+
+    def _to_agent_response(self, result, parser, model):
+        if result.stop_reason == EARLY_STOP:
+            # Only the questions were needed; the stream was cut before the content
+            envelope = {"command": parser.command, "content": parser.content, "questions": parser.questions}
+            response = AgentResponse(result.text, envelope=envelope, stop_reason=result.stop_reason)
+        else:
+            response = AgentResponse(result.text, envelope=result.tool_input, stop_reason=result.stop_reason)
+        if response.parse_failed:
+            outcome = "failed"
+        elif result.tool_input is not None or result.stop_reason == EARLY_STOP:
+            outcome = "structured"
+        else:
+            outcome = "parsed"
+        record_parse(outcome)
+        # Every client call goes through here, so this is where its metrics and cost are recorded
+        log_call(result, model, type(self).__name__, outcome)
+        get_ledger().record(result, model, type(self).__name__)
+        return response
+
+    def _call(self, request, model, max_tokens, parser, prefill=None, tool_params=None):
+        context, prompt = request
+        # A cheaper model once the budget runs low; raises BudgetExceeded once it is spent
+        model = get_ledger().model_for(model)
+        result = self.client.generate(
+            prompt,
+            self.system_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            context=context,
+            cache=self.cache_policy,
+            on_text=parser.feed,
+            prefill=prefill,
+            timeout=self.route.timeout,
+            **(self._tool_params() if tool_params is None else tool_params)
+        )
+        return self._to_agent_response(result, parser, model)
+
+    async def _call_async(self, request, model, max_tokens, parser, prefill=None, tool_params=None):
+        context, prompt = request
+        model = get_ledger().model_for(model)
+        result = await self.client.generate_async(
+            prompt,
+            self.system_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            context=context,
+            cache=self.cache_policy,
+            on_text=parser.feed,
+            prefill=prefill,
+            timeout=self.route.timeout,
+            **(self._tool_params() if tool_params is None else tool_params)
+        )
+        return self._to_agent_response(result, parser, model)
+
+    def _triage_model(self):
+        """The model of the triage pre-pass: the route's followup_model, or the agent's own when triage is on.
+
+        An explicit triage: false turns the pre-pass off even when a followup_model is inherited.
+        """
+        if self.route.triage is False:
+            return None
+        if self.route.followup_model:
+            return self.route.followup_model
+        return self.model if self.route.triage else None
+
+    def _triage_request(self, request):
+        # System prompt and context stay as they are, so the triage call and the full
+        # generation share their prompt-cache prefix when they use the same model
+        context, prompt = request
+        return context, prompt + TRIAGE_INSTRUCTIONS
+
+    def _triaged(self, response):
+        """Return the triage response if it asks questions, counting the verdict."""
+        asks = response.needs_followup and bool(response.questions) and not response.parse_failed
+        with _parse_lock:
+            _triage_stats["questions" if asks else "pass_on"] += 1
+        return response if asks else None
+
+    def _gathered(self, response):
+        return response.questions if response.needs_followup and not response.parse_failed else []
+
+    def gather_questions(self, description):
+        """Return the questions this agent would ask about the project before any stage runs.
+
+        A triage-sized call on the triage model (or the agent's own), so every
+        agent of a workflow can be asked at once from the description alone.
+        """
+        response = self._call((None, GATHER_TEMPLATE.format(description=description)),
+                              self._triage_model() or self.model, TRIAGE_MAX_TOKENS,
+                              StreamingEnvelopeParser(), tool_params=self._triage_tool_params())
+        return self._gathered(response)
+
+    async def gather_questions_async(self, description):
+        response = await self._call_async((None, GATHER_TEMPLATE.format(description=description)),
+                                          self._triage_model() or self.model, TRIAGE_MAX_TOKENS,
+                                          StreamingEnvelopeParser(), tool_params=self._triage_tool_params())
+        return self._gathered(response)
 
-    def evaluate_project(self, requirements):
+    def _generate(self, request, max_tokens=4000, on_text=None, prefill=None, on_question=None):
+        # Replies cut off at max_tokens are continued and stitched together by the client
+        max_tokens = self.route.max_tokens or max_tokens
+        triage_model = self._triage_model()
+        if triage_model and not prefill:
+            # A small call decides whether there are questions; the document is only written on pass-on
+            response = self._triaged(self._call(self._triage_request(request), triage_model, TRIAGE_MAX_TOKENS,
+                                                StreamingEnvelopeParser(on_question=on_question),
+                                                tool_params=self._triage_tool_params()))
+            if response:
+                return response
+        return self._call(request, self.model, max_tokens, self._envelope_parser(on_text, on_question), prefill)
+
+    async def _generate_async(self, request, max_tokens=4000, on_text=None, prefill=None, on_question=None):
+        max_tokens = self.route.max_tokens or max_tokens
+        triage_model = self._triage_model()
+        if triage_model and not prefill:
+            response = self._triaged(await self._call_async(self._triage_request(request), triage_model, TRIAGE_MAX_TOKENS,
+                                                            StreamingEnvelopeParser(on_question=on_question),
+                                                            tool_params=self._triage_tool_params()))
+            if response:
+                return response
+        return await self._call_async(request, self.model, max_tokens, self._envelope_parser(on_text, on_question), prefill)
+
+class CTO(Agent):
+    system_prompt = PROTOTYPE_CTO_SYSTEM_PROMPT
+
+    def _build_prompt(self, requirements, additional_info=None):
         # requirements is now the output from ProductManager
-        if isinstance(requirements, AgentResponse):
-            requirements = requirements.content
-        prompt = PROTOTYPE_CTO_TEMPLATE.format(requirements=requirements)
-        response = self.client.generate_response(prompt, self.system_prompt, model=self.model)
-        return AgentResponse(response)
-
-class ProductManager:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = PROTOTYPE_PRODUCT_MANAGER_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def evaluate_project(self, description):
-        prompt = PROTOTYPE_PRODUCT_MANAGER_TEMPLATE.format(
+        context = PROTOTYPE_CTO_CONTEXT_TEMPLATE.format(requirements=_content(requirements))
+        return context, with_additional_info(PROTOTYPE_CTO_TEMPLATE, additional_info)
+
+    def evaluate_project(self, requirements, additional_info=None, on_text=None, on_question=None):
+        return self._generate(self._build_prompt(requirements, additional_info), on_text=on_text, on_question=on_question)
+
+    async def evaluate_project_async(self, requirements, additional_info=None, on_text=None, on_question=None):
+        return await self._generate_async(self._build_prompt(requirements, additional_info), on_text=on_text, on_question=on_question)
+
+class ProductManager(Agent):
+    system_prompt = PROTOTYPE_PRODUCT_MANAGER_SYSTEM_PROMPT
+
+    def _build_prompt(self, description):
+        # The description changes every round, so only the system prompt is cacheable
+        return None, PROTOTYPE_PRODUCT_MANAGER_TEMPLATE.format(
             description=description
         )
-        response = self.client.generate_response(prompt, self.system_prompt, model=self.model)
-        return AgentResponse(response)
-
-class EngineeringManager:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = PROTOTYPE_ENGINEERING_MANAGER_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def create_task_list(self, requirements, technical_strategy):
-        # Extract just the content if they're AgentResponses
-        if isinstance(requirements, AgentResponse):
-            requirements = requirements.content
-        if isinstance(technical_strategy, AgentResponse):
-            technical_strategy = technical_strategy.content
-            
-        prompt = PROTOTYPE_ENGINEERING_MANAGER_TEMPLATE.format(
-            requirements=requirements,
-            technical_strategy=technical_strategy
+
+    def evaluate_project(self, description, on_text=None, on_question=None):
+        return self._generate(self._build_prompt(description), on_text=on_text, on_question=on_question)
+
+    async def evaluate_project_async(self, description, on_text=None, on_question=None):
+        return await self._generate_async(self._build_prompt(description), on_text=on_text, on_question=on_question)
+
+class EngineeringManager(Agent):
+    system_prompt = PROTOTYPE_ENGINEERING_MANAGER_SYSTEM_PROMPT
+
+    def _build_context(self, requirements, technical_strategy):
+        return PROTOTYPE_ENGINEERING_MANAGER_CONTEXT_TEMPLATE.format(
+            requirements=_content(requirements),
+            technical_strategy=_content(technical_strategy)
         )
+
+    def _build_prompt(self, requirements, technical_strategy, additional_info=None):
+        context = self._build_context(requirements, technical_strategy)
+        return context, with_additional_info(PROTOTYPE_ENGINEERING_MANAGER_TEMPLATE, additional_info)
+
+
+    def create_task_list(self, requirements, technical_strategy, additional_info=None, on_text=None, on_question=None):
         # Use a higher max_tokens limit for implementation plans
-        response = self.client.generate_response(
-            prompt, 
-            self.system_prompt, 
-            model=self.model,
-            max_tokens=8000  # Doubled from default 4000
-        )
-        return AgentResponse(response)
-
-    def continue_from_truncated(self, requirements, technical_strategy, previous_response):
-        """Continue from a truncated response."""
-        # Extract just the content if they're AgentResponses
-        if isinstance(requirements, AgentResponse):
-            requirements = requirements.content
-        if isinstance(technical_strategy, AgentResponse):
-            technical_strategy = technical_strategy.content
-            
-        prompt = f"""
-Your previous response was cut off. Here are the requirements and technical strategy again:
-
-Requirements:
-{requirements}
-
-Technical Approach:
-{technical_strategy}
-
-Your partial response was:
-{previous_response}
-
-Please continue your implementation plan from where you left off.
-"""
-        # Use a higher max_tokens limit for continuation
-        response = self.client.generate_response(
-            prompt, 
-            self.system_prompt, 
-            model=self.model,
-            max_tokens=8000  # Doubled from default 4000
-        )
-        return AgentResponse(response)
-
-class RobustCTO:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = ROBUST_CTO_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def evaluate_project(self, description):
-        prompt = ROBUST_CTO_TEMPLATE.format(description=description)
-        response = self.client.generate_response(prompt, self.system_prompt, model=self.model)
-        return AgentResponse(response)
-
-class RobustProductManager:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = ROBUST_PRODUCT_MANAGER_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def evaluate_project(self, description, technical_strategy):
+        request = self._build_prompt(requirements, technical_strategy, additional_info)
+        return self._generate(request, max_tokens=8000, on_text=on_text, on_question=on_question)
+
+    async def create_task_list_async(self, requirements, technical_strategy, additional_info=None, on_text=None, on_question=None):
+        request = self._build_prompt(requirements, technical_strategy, additional_info)
+        return await self._generate_async(request, max_tokens=8000, on_text=on_text, on_question=on_question)
+
+    def continue_from_truncated(self, requirements, technical_strategy, previous_response, on_text=None, on_question=None):
+        """Continue from a truncated response by prefilling it as the start of the reply."""
+        if isinstance(previous_response, AgentResponse):
+            previous_response = previous_response.raw_response
+        request = self._build_prompt(requirements, technical_strategy)
+        return self._generate(request, max_tokens=8000, on_text=on_text, on_question=on_question, prefill=previous_response)
+
+    async def continue_from_truncated_async(self, requirements, technical_strategy, previous_response, on_text=None, on_question=None):
+        """Async version of continue_from_truncated."""
+        if isinstance(previous_response, AgentResponse):
+            previous_response = previous_response.raw_response
+        request = self._build_prompt(requirements, technical_strategy)
+        return await self._generate_async(request, max_tokens=8000, on_text=on_text, on_question=on_question, prefill=previous_response)
+
+class RobustCTO(Agent):
+    system_prompt = ROBUST_CTO_SYSTEM_PROMPT
+
+    def _build_prompt(self, description):
+        return None, ROBUST_CTO_TEMPLATE.format(description=description)
+
+    def evaluate_project(self, description, on_text=None, on_question=None):
+        return self._generate(self._build_prompt(description), on_text=on_text, on_question=on_question)
+
+    async def evaluate_project_async(self, description, on_text=None, on_question=None):
+        return await self._generate_async(self._build_prompt(description), on_text=on_text, on_question=on_question)
+
+class RobustProductManager(Agent):
+    system_prompt = ROBUST_PRODUCT_MANAGER_SYSTEM_PROMPT
+
+    def _build_prompt(self, description, technical_strategy):
         # Extract just the content from CTO's technical strategy if it's an AgentResponse
-        if isinstance(technical_strategy, AgentResponse):
-            technical_strategy = technical_strategy.content
-            
-        prompt = ROBUST_PRODUCT_MANAGER_TEMPLATE.format(
-            description=description,
-            technical_strategy=technical_strategy
+        context = ROBUST_PRODUCT_MANAGER_CONTEXT_TEMPLATE.format(
+            technical_strategy=_content(technical_strategy)
         )
-        response = self.client.generate_response(prompt, self.system_prompt, model=self.model)
-        return AgentResponse(response)
-
-class RobustEngineeringManager:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = ROBUST_ENGINEERING_MANAGER_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def create_task_list(self, requirements, technical_strategy):
-        # Extract just the content if they're AgentResponses
-        if isinstance(requirements, AgentResponse):
-            requirements = requirements.content
-        if isinstance(technical_strategy, AgentResponse):
-            technical_strategy = technical_strategy.content
-            
-        prompt = ROBUST_ENGINEERING_MANAGER_TEMPLATE.format(
-            requirements=requirements,
-            technical_strategy=technical_strategy
+        return context, ROBUST_PRODUCT_MANAGER_TEMPLATE.format(description=description)
+
+    def evaluate_project(self, description, technical_strategy, on_text=None, on_question=None):
+        return self._generate(self._build_prompt(description, technical_strategy), on_text=on_text, on_question=on_question)
+
+    async def evaluate_project_async(self, description, technical_strategy, on_text=None, on_question=None):
+        return await self._generate_async(self._build_prompt(description, technical_strategy), on_text=on_text, on_question=on_question)
+
+class RobustEngineeringManager(Agent):
+    system_prompt = ROBUST_ENGINEERING_MANAGER_SYSTEM_PROMPT
+
+    def _build_prompt(self, requirements, technical_strategy, additional_info=None):
+        context = ROBUST_ENGINEERING_MANAGER_CONTEXT_TEMPLATE.format(
+            requirements=_content(requirements),
+            technical_strategy=_content(technical_strategy)
         )
+        return context, with_additional_info(ROBUST_ENGINEERING_MANAGER_TEMPLATE, additional_info)
+
+    def create_task_list(self, requirements, technical_strategy, additional_info=None, on_text=None, on_question=None):
         # Use a higher max_tokens limit for detailed implementation plans
-        response = self.client.generate_response(
-            prompt, 
-            self.system_prompt,
-            model=self.model,
-            max_tokens=8000  # Doubled from default 4000
-        )
-        return AgentResponse(response)
-
-class TaskGenerator:
-    def __init__(self):
-        self.client = ClaudeClient()
-        self.system_prompt = TASK_GENERATOR_SYSTEM_PROMPT
-        self.model = DEFAULT_MODEL
-
-    def generate_tasks(self, implementation_plan, technical_strategy):
-        # Extract just the content if they're AgentResponses
-        if isinstance(implementation_plan, AgentResponse):
-            implementation_plan = implementation_plan.content
-        if isinstance(technical_strategy, AgentResponse):
-            technical_strategy = technical_strategy.content
-            
-        prompt = TASK_GENERATOR_TEMPLATE.format(
-            implementation_plan=implementation_plan,
-            technical_strategy=technical_strategy
+        request = self._build_prompt(requirements, technical_strategy, additional_info)
+        return self._generate(request, max_tokens=8000, on_text=on_text, on_question=on_question)
+
+    async def create_task_list_async(self, requirements, technical_strategy, additional_info=None, on_text=None, on_question=None):
+        request = self._build_prompt(requirements, technical_strategy, additional_info)
+        return await self._generate_async(request, max_tokens=8000, on_text=on_text, on_question=on_question)
+
+class TaskGenerator(Agent):
+    system_prompt = TASK_GENERATOR_SYSTEM_PROMPT
+
+    def _build_prompt(self, implementation_plan, technical_strategy, additional_info=None):
+        context = TASK_GENERATOR_CONTEXT_TEMPLATE.format(
+            implementation_plan=_content(implementation_plan),
+            technical_strategy=_content(technical_strategy)
         )
-        
+        return context, with_additional_info(TASK_GENERATOR_TEMPLATE, additional_info)
+
+    def generate_tasks(self, implementation_plan, technical_strategy, additional_info=None, on_text=None, on_question=None):
         # Simple approach - higher max_tokens for detailed tasks
-        print("\nTask Generator is creating a detailed task list...")
-        response = self.client.generate_response(
-            prompt, 
-            self.system_prompt,
-            model=self.model,
-            max_tokens=12000  # Doubled from default 4000
-        )
-            
-        return AgentResponse(response)
+        request = self._build_prompt(implementation_plan, technical_strategy, additional_info)
+        return self._generate(request, max_tokens=12000, on_text=on_text, on_question=on_question)
 
-def save_to_markdown(agent_response, filename, project_name):
-    # Create outputs directory if it doesn't exist
-    os.makedirs("outputs", exist_ok=True)
-    
+    async def generate_tasks_async(self, implementation_plan, technical_strategy, additional_info=None, on_text=None, on_question=None):
+        request = self._build_prompt(implementation_plan, technical_strategy, additional_info)
+        return await self._generate_async(request, max_tokens=12000, on_text=on_text, on_question=on_question)
+
+def _project_dir(project_name):
     # Create project-specific directory
     project_dir = os.path.join("outputs", project_name)
     os.makedirs(project_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filepath = os.path.join(project_dir, f"{filename}_{timestamp}.md")
+    return project_dir
+
+def artifact_view_path(filename, project_name):
+    """Path of the plain markdown view holding the latest version of an artifact."""
+    return os.path.join("outputs", project_name, f"{filename}.md")
+
+class MarkdownStream:
+    """Echo a streaming response to the terminal and write it progressively to a partial file.
+
+    save_to_markdown replaces the partial file with the stored version, so a
+    crash mid-stream still leaves the partial response on disk.
+    """
+
+    def __init__(self, filename, project_name, echo=True):
+        self.filepath = os.path.join(_project_dir(project_name), f"{filename}.partial.md")
+        self.echo = echo
+        self._file = open(self.filepath, "w")
+        self._questions = 0
+
+    def write(self, text):
+        self._file.write(text)
+        self._file.flush()
+        if self.echo:
+            print(text, end="", flush=True)
+
+    def question(self, text):
+        """Show a follow-up question as soon as the agent has asked it, before its reply is finished."""
+        self._questions += 1
+        if self._questions == 1:
+            self.write("# Follow-up Questions\n\n")
+        self.write(f"{self._questions}. {text}\n")
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            if self.echo:
+                print()
+
+@traced("save_to_markdown", "io")
+def save_to_markdown(agent_response, filename, project_name, filepath=None):
+    """Store an agent response as a new version of an artifact and refresh its markdown view.
+
+    Versions go into the project's ArtifactStore (deduplicated, delta-compressed);
+    outputs/<project>/<filename>.md always shows the latest one. filepath is
+    the partial file a MarkdownStream wrote, which is removed once stored.
+    Returns the path of the view.
+    """
+    project_dir = _project_dir(project_name)
     
     content = agent_response.content
     if agent_response.needs_followup:
@@ -277,13 +513,17 @@ def save_to_markdown(agent_response, filename, project_name):
     
     # Log truncated responses for debugging
     if agent_response.is_truncated:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         debug_path = os.path.join(project_dir, f"debug_{filename}_{timestamp}.log")
         with open(debug_path, "w") as f:
             f.write(f"TRUNCATED RESPONSE DETECTED:\n\n")
             f.write(f"Raw response:\n{agent_response.raw_response}\n\n")
             f.write(f"Content length: {len(agent_response.content)} characters\n")
     
-    with open(filepath, "w") as f:
-        f.write(content)
+    ArtifactStore(project_dir).save(filename, content)
+    view_path = artifact_view_path(filename, project_name)
+    write_atomic(view_path, content)
+    if filepath and os.path.exists(filepath):
+        os.remove(filepath)
     
-    return filepath 
\ No newline at end of file
+    return view_path
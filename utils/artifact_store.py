@@ -0,0 +1,107 @@
+import os
+import json
+import zlib
+import difflib
+import tempfile
+from .manifest import content_hash
+
+STORE_DIRNAME = ".store"
+
+# Every this many deltas in a chain a full copy is stored, bounding the cost of a read
+MAX_DELTA_DEPTH = 16
+
+def write_atomic(path, data):
+    """Write bytes or text to path via a temporary file and rename, so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with os.fdopen(fd, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _line_delta(base, text):
+    """Encode text as line operations against base: ["=", start, end] copies base lines, ["+", lines] inserts."""
+    base_lines = base.splitlines(keepends=True)
+    lines = text.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["=", i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append(["+", lines[j1:j2]])
+    return ops
+
+def _apply_delta(base, ops):
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if op[0] == "=":
+            parts.extend(base_lines[op[1]:op[2]])
+        else:
+            parts.extend(op[1])
+    return "".join(parts)
+
+class ArtifactStore:
+    """Content-addressed, compressed store of every version of a project's artifacts.
+
+    Objects are keyed by the sha256 of their text, so saving identical content
+    twice stores it once. A new version is stored as a zlib-compressed line
+    delta against the stage's previous version when that is smaller than the
+    full text. Each stage has a head pointing at its latest version.
+    """
+
+    def __init__(self, project_dir):
+        self.root = os.path.join(project_dir, STORE_DIRNAME)
+
+    def _object_path(self, key):
+        return os.path.join(self.root, "objects", key[:2], key)
+
+    def _head_path(self, name):
+        return os.path.join(self.root, "heads", name)
+
+    def contains(self, key):
+        return os.path.exists(self._object_path(key))
+
+    def _load(self, key):
+        with open(self._object_path(key), "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    def get(self, key):
+        """Return the text stored under key, following its delta chain."""
+        record = self._load(key)
+        if "text" in record:
+            return record["text"]
+        return _apply_delta(self.get(record["base"]), record["ops"])
+
+    def put(self, text, base=None):
+        """Store text, as a delta against base when that is smaller, and return its key."""
+        key = content_hash(text)
+        if self.contains(key):
+            return key
+
+        record = {"text": text}
+        if base and base != key and self.contains(base):
+            base_record = self._load(base)
+            depth = base_record.get("depth", 0) + 1
+            if depth <= MAX_DELTA_DEPTH:
+                delta = {"base": base, "depth": depth, "ops": _line_delta(self.get(base), text)}
+                if len(json.dumps(delta)) < len(json.dumps(record)):
+                    record = delta
+        write_atomic(self._object_path(key), zlib.compress(json.dumps(record).encode("utf-8"), 9))
+        return key
+
+    def head(self, name):
+        """Return the key of the latest version saved under name, or None."""
+        try:
+            with open(self._head_path(name), "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, text):
+        """Store a new version of name, delta-encoded against its previous one, and return its key."""
+        key = self.put(text, base=self.head(name))
+        write_atomic(self._head_path(name), key)
+        return key
@@ -0,0 +1,192 @@
+"""
+Unattended batch runs: push a JSONL file of project ideas through the workflows.
+
+Each line is a record {"name", "description", "workflow", "answers"}. workflow
+is "prototype" (the default) or "cto". answers feed the agents' follow-up
+questions: a list is used in order across the project (a resumed run skips
+the answers of the stages it reuses), a dict maps stage
+names to an answer or a list of answers, and a string answers every round.
+When the supplied answers run out the answer policy decides what happens.
+
+Projects always run with resume enabled, so rerunning the same file after a
+crash reuses every stage that already finished and only pays for the rest.
+"""
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from .workflow import WORKFLOWS, WorkflowRunner, NeedsInput, sanitize_project_name, ASSUME_ANSWER, CURRENT
+from .ledger import BudgetExceeded
+from .claude_client import close_async_clients
+
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_MAX_FOLLOWUPS = 2
+
+# Answer policies for follow-up questions the input file has no answer for:
+# "assume" tells the agent to make reasonable assumptions and proceed,
+# "fail" stops the project with status needs_input
+ANSWER_POLICIES = ("assume", "fail")
+
+class BatchAnswers:
+    """Answer follow-up rounds for one project from its record, falling back to the answer policy."""
+
+    def __init__(self, answers, policy="assume", max_followups=DEFAULT_MAX_FOLLOWUPS):
+        if policy not in ANSWER_POLICIES:
+            raise ValueError(f"Answer policy must be one of {', '.join(ANSWER_POLICIES)}, got '{policy}'")
+        self.answers = answers
+        self.policy = policy
+        self.max_followups = max_followups
+        self.rounds = {}
+
+    def _supplied(self, stage_name):
+        answers = self.answers
+        if isinstance(answers, dict):
+            answers = answers.get(stage_name)
+            if isinstance(answers, str):
+                return answers
+            if answers:
+                return answers.pop(0)
+            return None
+        if isinstance(answers, str):
+            return answers
+        if answers:
+            return answers.pop(0)
+        return None
+
+    def skip_reused(self, answered):
+        """Drop the answers a list already gave the stages a resumed run reuses instead of asking again.
+
+        A list is used in order across the project, so without this every
+        later stage would get the answers written for an earlier one.
+        """
+        if isinstance(self.answers, list):
+            del self.answers[:sum(1 for answer in answered if answer != ASSUME_ANSWER)]
+
+    def __call__(self, stage, response):
+        rounds = self.rounds.get(stage.name, 0) + 1
+        self.rounds[stage.name] = rounds
+        # Under "assume" the runner caps the rounds itself and ends with a pass on assumptions
+        if self.policy == "fail" and rounds > self.max_followups:
+            raise NeedsInput(f"{stage.title} still had questions after {self.max_followups} follow-up rounds")
+        answer = self._supplied(stage.name)
+        if answer is not None:
+            return answer
+        if self.policy == "fail":
+            raise NeedsInput(f"{stage.title} asked questions the input has no answers for: "
+                             + "; ".join(response.questions))
+        return ASSUME_ANSWER
+
+def reused_answers(runner):
+    """Return the answers recorded for the stages a resumed run will load rather than generate, in workflow order."""
+    statuses = runner.plan()
+    return [answer for stage in runner.workflow.stages if statuses[stage.name] == CURRENT
+            for answer in runner.manifest.stage(stage.name).get("answers", [])]
+
+def load_ideas(path):
+    """Read and validate the batch input, one record per non-empty line."""
+    records = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name = sanitize_project_name(record.get("name", ""))
+            workflow = record.get("workflow", "prototype")
+            if not name or not record.get("description"):
+                raise ValueError(f"{path}:{line_number}: every record needs a name and a description")
+            if workflow not in WORKFLOWS:
+                raise ValueError(f"{path}:{line_number}: unknown workflow '{workflow}', expected one of {', '.join(WORKFLOWS)}")
+            records.append({
+                "name": name,
+                "description": record["description"],
+                "workflow": workflow,
+                "answers": record.get("answers") or []
+            })
+    names = [record["name"] for record in records]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate project names: {', '.join(duplicates)}")
+    return records
+
+class BatchRun:
+    """Run many projects concurrently and log each one's outcome to a status JSONL file."""
+
+    def __init__(self, records, concurrency=DEFAULT_BATCH_CONCURRENCY, policy="assume",
+                 max_followups=DEFAULT_MAX_FOLLOWUPS, status_path=None):
+        self.records = records
+        self.concurrency = concurrency
+        self.policy = policy
+        self.max_followups = max_followups
+        self.status_path = status_path
+        self.statuses = {}
+
+    def _log_status(self, entry):
+        self.statuses[entry["name"]] = entry
+        if self.status_path:
+            # One line per finished project; the last line for a name is its current status
+            with open(self.status_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    async def _run_project(self, record, semaphore):
+        async with semaphore:
+            started = time.monotonic()
+            ask = BatchAnswers(record["answers"], self.policy, self.max_followups)
+            runner = WorkflowRunner(WORKFLOWS[record["workflow"]], record["name"], record["description"],
+                                    ask, resume=True, echo=False,
+                                    max_followups=self.max_followups if self.policy == "assume" else None)
+            entry = {"name": record["name"], "workflow": record["workflow"]}
+            try:
+                if runner.manifest.exists:
+                    ask.skip_reused(reused_answers(runner))
+                results = await runner.run_async()
+                entry["status"] = "complete"
+                entry["artifacts"] = {name: path for name, (_, path) in results.items()}
+                entry["stage_seconds"] = {name: round(seconds, 3) for name, seconds in runner.stage_seconds.items()}
+            except NeedsInput as e:
+                entry["status"] = "needs_input"
+                entry["error"] = str(e)
+            except BudgetExceeded as e:
+                entry["status"] = "over_budget"
+                entry["error"] = str(e)
+            except Exception as e:
+                entry["status"] = "failed"
+                entry["error"] = f"{type(e).__name__}: {e}"
+            entry["seconds"] = round(time.monotonic() - started, 2)
+            entry["finished_at"] = datetime.now().isoformat(timespec="seconds")
+            self._log_status(entry)
+            print(f"[{len(self.statuses)}/{len(self.records)}] {entry['name']}: {entry['status']}"
+                  + (f" ({entry['error']})" if "error" in entry else "") + f" in {entry['seconds']}s")
+
+    async def run_async(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(*(self._run_project(record, semaphore) for record in self.records))
+        return self.statuses
+
+def run_batch(path, concurrency=DEFAULT_BATCH_CONCURRENCY, policy="assume",
+              max_followups=DEFAULT_MAX_FOLLOWUPS, status_path=None):
+    """Run every project in a JSONL file and print a summary with throughput in projects per hour."""
+    records = load_ideas(path)
+    if status_path is None:
+        status_path = os.path.splitext(path)[0] + ".status.jsonl"
+    batch = BatchRun(records, concurrency, policy, max_followups, status_path)
+    print(f"Running {len(records)} projects with concurrency {concurrency}; status log: {status_path}")
+
+    async def run_and_close():
+        try:
+            return await batch.run_async()
+        finally:
+            await close_async_clients()
+
+    started = time.monotonic()
+    statuses = asyncio.run(run_and_close())
+    elapsed = time.monotonic() - started
+
+    counts = {}
+    for entry in statuses.values():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(f"\nBatch finished in {elapsed:.1f}s: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    completed = counts.get("complete", 0)
+    if elapsed > 0:
+        print(f"Throughput: {completed / elapsed * 3600:.1f} completed projects per hour")
+    return statuses
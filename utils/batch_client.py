@@ -0,0 +1,313 @@
+"""
+A ClaudeClient backend that sends requests through the message batches API.
+
+Requests made on an event loop are queued for a short window and submitted
+together as one batch; the batch is polled until it ends and each caller's
+await resolves with its own result. Agents and the workflow runner are
+unchanged: select the backend with LLM_BACKEND=batch (or fake-batch for the
+offline service below) and get_client() returns a BatchClaudeClient.
+
+Each request's custom_id is its response-cache key, and results are written
+to the response cache as they arrive. Submitted batch ids are persisted, so
+after a crash a rerun reattaches to the batches still in flight instead of
+submitting the same requests again.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import weakref
+import threading
+import contextlib
+from anthropic.types import Message
+from .claude_client import ClaudeClient, ClaudeResponse
+from .response_cache import make_cache_key
+from .artifact_store import write_atomic
+
+DEFAULT_BATCH_WINDOW = 2.0
+DEFAULT_POLL_INTERVAL = 30.0
+DEFAULT_MAX_BATCH_REQUESTS = 10000
+DEFAULT_PENDING_PATH = os.path.join(".cache", "batches", "pending.json")
+DEFAULT_FAKE_BATCH_DIR = os.path.join(".cache", "fake_batches")
+DEFAULT_FAKE_BATCH_LATENCY = 1.0
+
+class BatchRequestError(Exception):
+    """A request in a message batch did not succeed (errored, expired or canceled)."""
+
+class AnthropicBatchService:
+    """The provider's message batches endpoint."""
+    kind = "anthropic"
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, requests):
+        """Submit [(custom_id, params)] as one batch and return its id."""
+        batch = self.client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests]
+        )
+        return batch.id
+
+    def is_ended(self, batch_id):
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id):
+        """Yield (custom_id, result type, Message or error detail) for every request in an ended batch."""
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                yield entry.custom_id, "succeeded", entry.result.message
+            else:
+                yield entry.custom_id, entry.result.type, str(getattr(entry.result, "error", ""))
+
+def fake_message(params):
+    """A canned reply in the shape the API returns, so pipelines can run without network access."""
+    messages = params["messages"]
+    prompt_chars = len(json.dumps(messages))
+    envelope = {
+        "command": "pass-on",
+        "questions": [],
+        "content": f"# Offline Response\n\nGenerated by the fake batch service for a {prompt_chars}-character request."
+    }
+    tool_choice = params.get("tool_choice") or {}
+    if messages[-1]["role"] == "assistant":
+        # A continuation: the prefill already holds the start of the reply, so just close it
+        block = {"type": "text", "text": ""}
+        stop_reason = "end_turn"
+    elif tool_choice.get("type") == "tool":
+        block = {"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}", "name": tool_choice["name"], "input": envelope}
+        stop_reason = "tool_use"
+    else:
+        block = {"type": "text", "text": json.dumps(envelope)}
+        stop_reason = "end_turn"
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params["model"],
+        "content": [block],
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": prompt_chars // 4, "output_tokens": len(json.dumps(block)) // 4}
+    }
+
+class FakeBatchService:
+    """File-based stand-in for the batches endpoint, for running and testing batch mode offline.
+
+    Each batch is a directory holding its requests; once it is older than
+    latency seconds the next status check answers every request with
+    fake_message and writes the results next to them.
+    """
+    kind = "fake"
+
+    def __init__(self, directory=None, latency=None):
+        self.directory = directory or os.getenv("FAKE_BATCH_DIR", DEFAULT_FAKE_BATCH_DIR)
+        self.latency = float(latency if latency is not None else os.getenv("FAKE_BATCH_LATENCY", DEFAULT_FAKE_BATCH_LATENCY))
+
+    def _path(self, batch_id, name):
+        return os.path.join(self.directory, batch_id, name)
+
+    def create(self, requests):
+        batch_id = f"msgbatch_fake_{uuid.uuid4().hex[:16]}"
+        lines = [json.dumps({"custom_id": custom_id, "params": params}) for custom_id, params in requests]
+        write_atomic(self._path(batch_id, "requests.jsonl"), "\n".join(lines) + "\n")
+        return batch_id
+
+    def is_ended(self, batch_id):
+        results_path = self._path(batch_id, "results.jsonl")
+        if os.path.exists(results_path):
+            return True
+        requests_path = self._path(batch_id, "requests.jsonl")
+        if time.time() - os.path.getmtime(requests_path) < self.latency:
+            return False
+        with open(requests_path, "r") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        lines = [json.dumps({"custom_id": request["custom_id"],
+                             "result": {"type": "succeeded", "message": fake_message(request["params"])}})
+                 for request in requests]
+        write_atomic(results_path, "\n".join(lines) + "\n")
+        return True
+
+    def results(self, batch_id):
+        with open(self._path(batch_id, "results.jsonl"), "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                result = entry["result"]
+                if result["type"] == "succeeded":
+                    yield entry["custom_id"], "succeeded", Message.model_validate(result["message"])
+                else:
+                    yield entry["custom_id"], result["type"], json.dumps(result.get("error"))
+
+class PendingBatches:
+    """Batches that were submitted but whose results have not been collected yet, persisted as JSON."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("BATCH_PENDING_PATH", DEFAULT_PENDING_PATH)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def batches(self, kind):
+        """Return {batch id: [custom ids]} for the pending batches of one service kind."""
+        with self._lock:
+            return {batch_id: entry["custom_ids"] for batch_id, entry in self._load().items() if entry["service"] == kind}
+
+    def add(self, batch_id, kind, custom_ids):
+        with self._lock:
+            data = self._load()
+            data[batch_id] = {"service": kind, "custom_ids": list(custom_ids), "submitted_at": time.time()}
+            write_atomic(self.path, json.dumps(data))
+
+    def remove(self, batch_id):
+        with self._lock:
+            data = self._load()
+            if data.pop(batch_id, None) is not None:
+                write_atomic(self.path, json.dumps(data))
+
+class _BatchQueue:
+    """Collects the requests made on one event loop into batches and resolves them when the batches end."""
+
+    def __init__(self, client):
+        self.client = client
+        self.loop = asyncio.get_running_loop()
+        # custom_id -> futures awaiting it, for every request queued or in flight
+        self.waiting = {}
+        # custom_id -> params, for requests not submitted yet
+        self.queued = {}
+        self._tasks = set()
+        self._flush_scheduled = False
+        for batch_id, custom_ids in client.pending.batches(client.service.kind).items():
+            self._watch(batch_id, custom_ids)
+
+    def _spawn(self, coroutine):
+        task = self.loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def submit(self, custom_id, params):
+        """Return a future for the response to params, joining an identical queued or in-flight request."""
+        future = self.loop.create_future()
+        known = custom_id in self.waiting
+        self.waiting.setdefault(custom_id, []).append(future)
+        if not known:
+            self.queued[custom_id] = params
+            if len(self.queued) >= self.client.max_requests:
+                self._spawn(self._flush(0))
+            elif not self._flush_scheduled:
+                self._flush_scheduled = True
+                self._spawn(self._flush(self.client.window))
+        return future
+
+    def _resolve(self, custom_id, outcome):
+        for future in self.waiting.pop(custom_id, []):
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    async def _flush(self, delay):
+        await asyncio.sleep(delay)
+        self._flush_scheduled = False
+        queued, self.queued = self.queued, {}
+        if not queued:
+            return
+        try:
+            batch_id = await asyncio.to_thread(self.client.service.create, list(queued.items()))
+        except Exception as e:
+            for custom_id in queued:
+                self._resolve(custom_id, e)
+            return
+        self.client.pending.add(batch_id, self.client.service.kind, queued)
+        self._watch(batch_id, queued)
+
+    def _watch(self, batch_id, custom_ids):
+        for custom_id in custom_ids:
+            self.waiting.setdefault(custom_id, [])
+        self._spawn(self._poll(batch_id, list(custom_ids)))
+
+    async def _poll(self, batch_id, custom_ids):
+        while True:
+            try:
+                if await asyncio.to_thread(self.client.service.is_ended, batch_id):
+                    break
+            except Exception as e:
+                # Batches run for a long time; a failed status check is retried at the next interval
+                print(f"\nWarning: could not check message batch {batch_id}: {e}")
+            await asyncio.sleep(self.client.poll_interval)
+        try:
+            outcomes = await asyncio.to_thread(self.client.collect, batch_id)
+        except Exception as e:
+            outcomes = {}
+            for custom_id in custom_ids:
+                outcomes[custom_id] = e
+        for custom_id in custom_ids:
+            self._resolve(custom_id, outcomes.get(custom_id, BatchRequestError(f"No result for {custom_id} in batch {batch_id}")))
+
+class BatchClaudeClient(ClaudeClient):
+    """ClaudeClient that sends every request through message batches.
+
+    Results arrive when the batch ends, so on_text receives each response
+    in one piece and cannot stop a generation early. Requests are not held
+    back by ANTHROPIC_MAX_CONCURRENCY since they all travel in the same
+    batches; BATCH_WINDOW sets how long requests are collected before a
+    batch is submitted and BATCH_POLL_INTERVAL how often it is checked.
+    """
+
+    def __init__(self, api_key=None, service=None):
+        super().__init__(api_key)
+        self.service = service or AnthropicBatchService(self.client)
+        self.window = float(os.getenv("BATCH_WINDOW", DEFAULT_BATCH_WINDOW))
+        default_interval = 0.5 if self.service.kind == "fake" else DEFAULT_POLL_INTERVAL
+        self.poll_interval = float(os.getenv("BATCH_POLL_INTERVAL", default_interval))
+        self.max_requests = int(os.getenv("BATCH_MAX_REQUESTS", DEFAULT_MAX_BATCH_REQUESTS))
+        self.pending = PendingBatches()
+        # Batches have their own limits and latency, so direct-call pacing and hedging do not apply
+        self.rate_limiter = None
+        self.hedge_policy = None
+        self._queues = weakref.WeakKeyDictionary()
+        self._queues_lock = threading.Lock()
+
+    def _concurrency_limit(self):
+        return contextlib.nullcontext()
+
+    def _queue(self):
+        loop = asyncio.get_running_loop()
+        with self._queues_lock:
+            queue = self._queues.get(loop)
+            if queue is None:
+                queue = self._queues[loop] = _BatchQueue(self)
+            return queue
+
+    def collect(self, batch_id):
+        """Fetch an ended batch's results as {custom_id: ClaudeResponse or BatchRequestError}.
+
+        Complete responses are also stored in the response cache under their
+        custom_id, so a rerun finds them even if nobody is waiting for them now.
+        """
+        outcomes = {}
+        for custom_id, result_type, payload in self.service.results(batch_id):
+            if result_type != "succeeded":
+                outcomes[custom_id] = BatchRequestError(f"Batch request {custom_id} {result_type}: {payload}")
+                continue
+            response = ClaudeResponse.from_message(payload)
+            if not response.is_truncated:
+                self.cache.put(custom_id, response.to_dict())
+            outcomes[custom_id] = response
+        self.pending.remove(batch_id)
+        return outcomes
+
+    async def _send_async(self, request_params, on_text=None, timeout=None, usage=None):
+        # timeout bounds direct API calls only; a batch takes as long as the service needs
+        result = await self._queue().submit(make_cache_key(request_params), request_params)
+        if on_text:
+            on_text(result.text)
+        return result
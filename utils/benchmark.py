@@ -0,0 +1,210 @@
+"""
+End-to-end workflow benchmarks against the fake messages API.
+
+A scenario runs N projects at once, alternating the prototype and CTO
+workflows, through the batch runner against an in-process
+FakeAnthropicServer with realistic per-call latency and reply sizes (sped up
+by a constant factor). It runs once from scratch ("cold"), once more as a
+resume that should reuse every stage, and once after each project's first
+artifact was edited ("stale"), which regenerates every stage downstream of
+it. Every scenario gets its own process and temporary working directory, so
+clients, caches and the catalog start empty and the user's outputs are never
+touched. The per-loop request cap (ANTHROPIC_MAX_CONCURRENCY) and the
+connection pool are raised to the number of projects unless they are set,
+so a scenario measures that many projects really running at once.
+
+Results can be saved as a JSON baseline and later runs compared against
+it: a metric that grew by more than its threshold is a regression.
+"""
+import io
+import os
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import multiprocessing
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from .fake_server import FakeAnthropicServer, FakeServerConfig
+from .batch import BatchRun
+from .workflow import WORKFLOWS
+from .agents import artifact_view_path
+from .claude_client import close_async_clients
+from .hedging import percentile
+
+DEFAULT_SIZES = (1, 10, 100)
+DEFAULT_SPEEDUP = 20
+
+# Per-call behaviour of the simulated backend before the speedup is applied
+REALISTIC_CALLS = {"ttft": 0.8, "tokens_per_second": 60.0, "output_tokens": 1500, "followup_rate": 0.2}
+
+PHASES = ("cold", "resume", "stale")
+
+# Appended to each project's first artifact before the "stale" phase, as a user's edit
+STALE_EDIT = "\n\n## Late Addition\n\nThe service must also export its weekly trends as CSV.\n"
+
+# Largest allowed growth of each metric over the baseline, as a fraction
+DEFAULT_THRESHOLDS = {
+    "wall_seconds": 0.25,
+    "calls": 0.0,
+    "input_tokens": 0.05,
+    "output_tokens": 0.05,
+    "bytes_written": 0.10
+}
+# Timing differences smaller than this are noise, whatever the threshold says
+MIN_TIME_DELTA = 0.5
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+    return total
+
+def _ideas(projects):
+    return [{
+        "name": f"bench_{i:03d}",
+        "description": f"Benchmark project {i}: a service that tracks {('orders', 'habits', 'sensors', 'invoices')[i % 4]} "
+                       f"for a team of {5 + i % 20} people and reports weekly trends.",
+        "workflow": "prototype" if i % 2 == 0 else "cto",
+        "answers": []
+    } for i in range(projects)]
+
+def _edit_first_artifacts(records):
+    """Edit the first stage's artifact of every project, so each stage after it is out of date."""
+    for record in records:
+        path = artifact_view_path(WORKFLOWS[record["workflow"]].stages[0].name, record["name"])
+        with open(path, "a") as f:
+            f.write(STALE_EDIT)
+
+def _run_phase(records, server):
+    async def run_and_close():
+        try:
+            return await BatchRun(records, concurrency=len(records)).run_async()
+        finally:
+            await close_async_clients()
+
+    before = server.get_stats()
+    size_before = _directory_size("outputs")
+    started = time.monotonic()
+    with redirect_stdout(io.StringIO()):
+        statuses = asyncio.run(run_and_close())
+    wall_seconds = time.monotonic() - started
+    after = server.get_stats()
+
+    stage_samples = {}
+    for entry in statuses.values():
+        for stage, seconds in entry.get("stage_seconds", {}).items():
+            stage_samples.setdefault(stage, []).append(seconds)
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "completed": sum(1 for entry in statuses.values() if entry["status"] == "complete"),
+        "calls": after["requests"] - before["requests"],
+        "input_tokens": after["input_tokens"] - before["input_tokens"],
+        "output_tokens": after["output_tokens"] - before["output_tokens"],
+        "bytes_sent": after["bytes_received"] - before["bytes_received"],
+        "bytes_received": after["bytes_sent"] - before["bytes_sent"],
+        "bytes_written": _directory_size("outputs") - size_before,
+        "stage_seconds": {stage: {"p50": percentile(samples, 50), "p95": percentile(samples, 95), "max": max(samples)}
+                          for stage, samples in sorted(stage_samples.items())}
+    }
+
+def run_scenario(projects, speedup=DEFAULT_SPEEDUP, seed=0):
+    """Run one scenario (cold run, resume, then stale resume) and return {phase: metrics}; meant for a fresh process."""
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    os.chdir(workdir)
+    config = FakeServerConfig(ttft=REALISTIC_CALLS["ttft"] / speedup,
+                              tokens_per_second=REALISTIC_CALLS["tokens_per_second"] * speedup,
+                              output_tokens=REALISTIC_CALLS["output_tokens"],
+                              followup_rate=REALISTIC_CALLS["followup_rate"], seed=seed)
+    server = FakeAnthropicServer(config)
+    os.environ.update(ANTHROPIC_BASE_URL=server.start(), ANTHROPIC_API_KEY="fake", LLM_BACKEND="api")
+    for name in ("LLM_RECORD", "LLM_REPLAY"):
+        os.environ.pop(name, None)
+    # Every project has one stage running at a time, so this lets all of them call the API at once
+    for name in ("ANTHROPIC_MAX_CONCURRENCY", "ANTHROPIC_MAX_CONNECTIONS"):
+        os.environ.setdefault(name, str(projects))
+    max_concurrency = int(os.environ["ANTHROPIC_MAX_CONCURRENCY"])
+    try:
+        records = _ideas(projects)
+        results = {}
+        for phase in PHASES:
+            if phase == "stale":
+                _edit_first_artifacts(records)
+            results[phase] = dict(_run_phase(records, server), max_concurrency=max_concurrency)
+        return results
+    finally:
+        server.stop()
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(results, baseline, thresholds):
+    """Return a description of every metric that grew past its threshold over the baseline."""
+    regressions = []
+    for size, phases in results["scenarios"].items():
+        base_phases = baseline.get("scenarios", {}).get(size)
+        if not base_phases:
+            continue
+        for phase, metrics in phases.items():
+            for metric, allowed in thresholds.items():
+                old = base_phases.get(phase, {}).get(metric)
+                if old is None:
+                    continue
+                new = metrics[metric]
+                limit = old * (1 + allowed)
+                if metric.endswith("seconds"):
+                    limit = max(limit, old + MIN_TIME_DELTA)
+                if new > limit:
+                    regressions.append(f"{size} projects, {phase}: {metric} {old} -> {new} (allowed +{allowed:.0%})")
+    return regressions
+
+def _print_scenario(size, phases):
+    print(f"\n{size} concurrent project(s), at most {phases['cold']['max_concurrency']} API calls at once")
+    for phase, m in phases.items():
+        print(f"  {phase:<7} {m['wall_seconds']:>8.2f}s  {m['completed']} complete  {m['calls']} calls  "
+              f"{m['input_tokens']} in / {m['output_tokens']} out tokens  "
+              f"{m['bytes_sent']} B sent / {m['bytes_received']} B received  {m['bytes_written']} B written")
+        for stage, seconds in m["stage_seconds"].items():
+            print(f"          {stage:<24} p50 {seconds['p50']:.2f}s  p95 {seconds['p95']:.2f}s  max {seconds['max']:.2f}s")
+
+def run_benchmarks(sizes=DEFAULT_SIZES, speedup=DEFAULT_SPEEDUP, seed=0, baseline_path=None,
+                   save_path=None, threshold_overrides=None):
+    """Run every scenario, print the results, compare them with a baseline and return the regressions."""
+    results = {"config": {"speedup": speedup, "seed": seed, "calls": REALISTIC_CALLS}, "scenarios": {}}
+    print(f"Benchmarking {', '.join(map(str, sizes))} concurrent project(s) against the fake API (speedup {speedup}x)")
+    spawn = multiprocessing.get_context("spawn")
+    for size in sizes:
+        # A fresh process per scenario, so no client, cache or catalog carries over
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            results["scenarios"][str(size)] = pool.submit(run_scenario, size, speedup, seed).result()
+        _print_scenario(size, results["scenarios"][str(size)])
+
+    regressions = []
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if baseline_path:
+        with open(baseline_path, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("speedup") != speedup or baseline.get("config", {}).get("seed") != seed:
+            print(f"\nWarning: {baseline_path} was recorded with different settings: {baseline.get('config')}")
+        thresholds.update(baseline.get("thresholds", {}))
+        thresholds.update(threshold_overrides or {})
+        regressions = compare(results, baseline, thresholds)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {baseline_path}:")
+            for regression in regressions:
+                print(f"  {regression}")
+        else:
+            print(f"\nNo regressions against {baseline_path}")
+    else:
+        thresholds.update(threshold_overrides or {})
+
+    if save_path:
+        results["thresholds"] = thresholds
+        with open(save_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {save_path}")
+    return regressions
@@ -0,0 +1,56 @@
+"""
+Cassettes: JSONL files of recorded requests and replies.
+
+With LLM_RECORD=<path> every reply ClaudeClient generates is appended to
+the cassette as {"key", "request", "response"}, keyed like the response
+cache, for utils.replay_client to play back offline. The response is the
+complete reply to the request, after any retries and continuations, so a
+replay sends each request once and gets the same reply regardless of the
+failures that happened while recording.
+"""
+import os
+import json
+import threading
+from .response_cache import make_cache_key
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+class Cassette:
+    """An append-only JSONL file of request/response pairs, indexed by request key."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        # The latest recording of a request wins
+                        self.entries[entry["key"]] = entry["response"]
+
+    def record(self, request_params, response):
+        key = make_cache_key(request_params)
+        line = json.dumps({"key": key, "request": request_params, "response": response.to_dict()})
+        with self._lock:
+            self.entries[key] = response.to_dict()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def lookup(self, request_params):
+        """Return the recorded response for request_params as a dict, or None."""
+        return self.entries.get(make_cache_key(request_params))
+
+def get_recorder():
+    """Return the cassette that LLM_RECORD names, or None when recording is off."""
+    global _recorder
+    path = os.getenv("LLM_RECORD")
+    if not path:
+        return None
+    with _recorder_lock:
+        if _recorder is None or _recorder.path != path:
+            _recorder = Cassette(path)
+        return _recorder
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from .manifest import MANIFEST_FILENAME
+
+CATALOG_FILENAME = "catalog.sqlite3"
+
+# Artifact files written before the catalog existed: <stage>_<YYYYmmdd_HHMMSS>.md
+_ARTIFACT_NAME = re.compile(r"^(?P<stage>[a-z_]+?)_(?P<timestamp>\d{8}_\d{6})\.md$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    workflow TEXT,
+    status TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    project TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    inputs_hash TEXT,
+    content_hash TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (project, stage, version)
+);
+"""
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class Catalog:
+    """SQLite index of every project and artifact version under the outputs directory.
+
+    Listing projects, finding a project's workflow and looking up the latest
+    version of a stage are single indexed queries instead of directory scans.
+    The per-project manifests stay the source of truth for resuming; the
+    catalog is rebuilt from the project directories if its file is missing.
+    """
+
+    def __init__(self, outputs_dir="outputs"):
+        self.outputs_dir = outputs_dir
+        self.path = os.path.join(outputs_dir, CATALOG_FILENAME)
+        is_new = not os.path.exists(self.path)
+        os.makedirs(outputs_dir, exist_ok=True)
+        with self._transaction() as conn:
+            # WAL lets several processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        if is_new:
+            self.rebuild()
+
+    @contextmanager
+    def _transaction(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _upsert_project(self, conn, name, workflow=None, status=None, timestamp=None):
+        timestamp = timestamp or _now()
+        conn.execute(
+            """INSERT INTO projects (name, workflow, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET
+                   workflow = COALESCE(excluded.workflow, workflow),
+                   status = COALESCE(excluded.status, status),
+                   updated_at = excluded.updated_at""",
+            (name, workflow, status, timestamp, timestamp)
+        )
+
+    def record_project(self, name, workflow=None, status=None):
+        """Create or update a project; None leaves the stored workflow or status unchanged."""
+        with self._transaction() as conn:
+            self._upsert_project(conn, name, workflow, status)
+
+    def _insert_artifact(self, conn, project, stage, file, inputs_hash, content_hash, status, created_at, version=None):
+        # version, when known, is kept unless the stage already has that many versions
+        row = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM artifacts WHERE project = ? AND stage = ?",
+                           (project, stage)).fetchone()
+        version = max(row[0], version or 0)
+        conn.execute("INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (project, stage, version, file, inputs_hash, content_hash, status, created_at))
+        return version
+
+    def record_artifact(self, project, stage, file, inputs_hash=None, content_hash=None, status="complete"):
+        """Add a new version of a stage's artifact and return its version number."""
+        timestamp = _now()
+        with self._transaction() as conn:
+            self._upsert_project(conn, project, timestamp=timestamp)
+            return self._insert_artifact(conn, project, stage, file, inputs_hash, content_hash, status, timestamp)
+
+    def latest_artifact(self, project, stage, status=None):
+        """Return the newest artifact row for a stage (optionally with a given status), or None."""
+        query = "SELECT * FROM artifacts WHERE project = ? AND stage = ?"
+        params = [project, stage]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        with self._transaction() as conn:
+            return conn.execute(query + " ORDER BY version DESC LIMIT 1", params).fetchone()
+
+    def artifacts(self, project, stage=None):
+        """Return every artifact version of a project (or of one stage), oldest first."""
+        query = "SELECT * FROM artifacts WHERE project = ?"
+        params = [project]
+        if stage:
+            query += " AND stage = ?"
+            params.append(stage)
+        with self._transaction() as conn:
+            return conn.execute(query + " ORDER BY stage, version", params).fetchall()
+
+    def project(self, name):
+        with self._transaction() as conn:
+            return conn.execute("SELECT * FROM projects WHERE name = ?", (name,)).fetchone()
+
+    def projects(self):
+        with self._transaction() as conn:
+            return conn.execute("SELECT * FROM projects ORDER BY name").fetchall()
+
+    def rebuild(self):
+        """Re-index every project directory: its manifest and its artifact files."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM artifacts")
+            conn.execute("DELETE FROM projects")
+            for name in sorted(os.listdir(self.outputs_dir)):
+                project_dir = os.path.join(self.outputs_dir, name)
+                if not os.path.isdir(project_dir):
+                    continue
+                manifest = {}
+                manifest_path = os.path.join(project_dir, MANIFEST_FILENAME)
+                if os.path.exists(manifest_path):
+                    with open(manifest_path, "r") as f:
+                        manifest = json.load(f)
+                self._upsert_project(conn, name, manifest.get("workflow"), manifest.get("status"))
+
+                stages = manifest.get("stages", {})
+                for filename in sorted(os.listdir(project_dir)):
+                    match = _ARTIFACT_NAME.match(filename)
+                    if not match:
+                        continue
+                    stage = match.group("stage")
+                    created_at = datetime.strptime(match.group("timestamp"), "%Y%m%d_%H%M%S").isoformat()
+                    entry = stages.get(stage, {})
+                    if entry.get("file") == filename:
+                        self._insert_artifact(conn, name, stage, filename, entry.get("inputs_hash"),
+                                              entry.get("content_hash"), "complete", created_at)
+                    else:
+                        self._insert_artifact(conn, name, stage, filename, None, None, "unknown", created_at)
+
+                # Stages saved through the artifact store have a single view file;
+                # the manifest knows their current version and its number
+                for stage, entry in stages.items():
+                    if not _ARTIFACT_NAME.match(entry.get("file", "")):
+                        self._insert_artifact(conn, name, stage, entry.get("file"), entry.get("inputs_hash"),
+                                              entry.get("content_hash"), "complete", entry.get("updated_at") or _now(),
+                                              entry.get("version"))
+
+def get_catalog():
+    """Return the catalog shared by everything in this process."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
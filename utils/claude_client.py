@@ -1,32 +1,654 @@
 import os
-from anthropic import Anthropic
+import json
+import time
+import asyncio
+import threading
+import weakref
+import httpx
+from anthropic import Anthropic, AsyncAnthropic, DefaultHttpxClient, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
+from .response_cache import get_response_cache, make_cache_key
+from .retry import retry_delay
+from .rate_limiter import get_rate_limiter, CHARS_PER_TOKEN
+from .hedging import get_hedge_policy, CHECK_INTERVAL
+from .cassette import get_recorder
+from .tracing import span, register_loop_thread
 
 load_dotenv()
 
+# Model used when a call does not name one (agents get theirs from utils.routing)
+DEFAULT_MODEL = "claude-3-7-sonnet-20250219"
+
+# Connection pool defaults, overridable through the environment
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 120.0
+
+# Maximum number of in-flight async requests per event loop
+DEFAULT_MAX_CONCURRENCY = 8
+
+# How many times a response cut off at max_tokens is continued before giving up
+DEFAULT_MAX_CONTINUATIONS = 3
+
+# Backends get_client() can return, selected with LLM_BACKEND
+BACKENDS = ("api", "batch", "fake-batch", "replay")
+
+# Process-wide registry of Anthropic clients, keyed by API key
+_registry_lock = threading.RLock()
+_anthropic_clients = {}
+_shared_client = None
+
+# Async clients and their concurrency limits are bound to the event loop that uses them
+_async_state = weakref.WeakKeyDictionary()
+
+# Event loop, run on a background thread, that every blocking call is made on
+_blocking_loop = None
+
+def get_pool_limits():
+    """Build the HTTP connection pool limits from the environment."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS)),
+        keepalive_expiry=float(os.getenv("ANTHROPIC_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY))
+    )
+
+def get_anthropic_client(api_key=None):
+    """Return the shared Anthropic client for an API key, creating it on first use."""
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    with _registry_lock:
+        client = _anthropic_clients.get(api_key)
+        if client is None:
+            # One keep-alive pool per key so every agent reuses warm connections
+            # Retries are handled by ClaudeClient, which also resumes streams cut off midway
+            client = Anthropic(
+                api_key=api_key,
+                max_retries=0,
+                http_client=DefaultHttpxClient(limits=get_pool_limits())
+            )
+            _anthropic_clients[api_key] = client
+        return client
+
+def _get_loop_state():
+    """Return the async clients and semaphore belonging to the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        state = _async_state.get(loop)
+        if state is None:
+            max_concurrency = int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+            state = {"clients": {}, "semaphore": asyncio.Semaphore(max_concurrency)}
+            _async_state[loop] = state
+        return state
+
+def get_async_anthropic_client(api_key=None):
+    """Return the shared AsyncAnthropic client for an API key on the running event loop."""
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+    state = _get_loop_state()
+    client = state["clients"].get(api_key)
+    if client is None:
+        client = AsyncAnthropic(
+            api_key=api_key,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(limits=get_pool_limits())
+        )
+        state["clients"][api_key] = client
+    return client
+
+def get_concurrency_limit():
+    """Return the semaphore that bounds concurrent requests on the running event loop."""
+    return _get_loop_state()["semaphore"]
+
+def _get_blocking_loop():
+    global _blocking_loop
+    with _registry_lock:
+        if _blocking_loop is None:
+            _blocking_loop = asyncio.new_event_loop()
+            threading.Thread(target=_blocking_loop.run_forever, name="claude-client", daemon=True).start()
+            # The calls run on this thread, so CPU profiles have to follow them there
+            register_loop_thread(_blocking_loop)
+        return _blocking_loop
+
+def _run_blocking(coroutine):
+    """Run a coroutine on the blocking-call event loop and wait for its result.
+
+    The coroutine sees the caller's context variables, so tracing and metrics
+    attribution carry over; callbacks it makes run on the loop's thread.
+    """
+    loop = _get_blocking_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("Blocking ClaudeClient calls cannot be made from its own event loop; await the async version")
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    try:
+        return future.result()
+    except BaseException:
+        # e.g. KeyboardInterrupt while waiting: stop the call instead of leaving it running
+        future.cancel()
+        raise
+
+def get_client():
+    """Return the ClaudeClient shared by all agents in this process.
+
+    LLM_BACKEND picks how requests are sent: "api" (the default) calls the
+    messages API directly, "batch" queues them into message batches,
+    "fake-batch" does the same against a local file-based batch service and
+    "replay" answers from the cassette LLM_REPLAY names.
+    """
+    global _shared_client
+    with _registry_lock:
+        if _shared_client is None:
+            backend = os.getenv("LLM_BACKEND", "api")
+            if backend not in BACKENDS:
+                raise ValueError(f"LLM_BACKEND must be one of {', '.join(BACKENDS)}, got '{backend}'")
+            if backend == "api":
+                _shared_client = ClaudeClient()
+            # The other backends build on ClaudeClient, so they are imported here
+            elif backend == "replay":
+                from .replay_client import ReplayClaudeClient
+                _shared_client = ReplayClaudeClient()
+            else:
+                from .batch_client import BatchClaudeClient, FakeBatchService
+                _shared_client = BatchClaudeClient(service=FakeBatchService() if backend == "fake-batch" else None)
+        return _shared_client
+
+def close_clients():
+    """Close every pooled connection, e.g. before the process exits."""
+    global _shared_client, _blocking_loop
+    with _registry_lock:
+        for client in _anthropic_clients.values():
+            client.close()
+        _anthropic_clients.clear()
+        _shared_client = None
+        loop, _blocking_loop = _blocking_loop, None
+    if loop is not None:
+        asyncio.run_coroutine_threadsafe(close_async_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+async def close_async_clients():
+    """Close the async connection pools opened on the running event loop."""
+    state = _get_loop_state()
+    for client in state["clients"].values():
+        await client.close()
+    state["clients"].clear()
+
+# Token counters reported by the API, accumulated for the whole process
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+_usage_lock = threading.Lock()
+_usage_totals = dict.fromkeys(USAGE_FIELDS, 0)
+
+def record_usage(usage):
+    """Add one API call's token usage to the process totals."""
+    with _usage_lock:
+        for field in USAGE_FIELDS:
+            _usage_totals[field] += usage.get(field) or 0
+
+def get_usage_totals():
+    """Return the token usage of every API call made by this process."""
+    with _usage_lock:
+        return dict(_usage_totals)
+
+def _cache_mode(cache):
+    """Map a per-call cache flag onto a ResponseCache mode (None keeps the configured default)."""
+    if cache is None:
+        return None
+    if cache == "bypass":
+        return "off"
+    if cache == "refresh":
+        return "refresh"
+    raise ValueError(f"Unknown cache flag '{cache}', expected 'bypass' or 'refresh'")
+
+# stop_reason recorded when the caller stopped a stream early (the API never returns this)
+EARLY_STOP = "early_stop"
+
+def _cache_control_enabled():
+    return os.getenv("PROMPT_CACHING", "on").lower() != "off"
+
+def _max_continuations(max_continuations):
+    if max_continuations is None:
+        return int(os.getenv("MAX_CONTINUATIONS", DEFAULT_MAX_CONTINUATIONS))
+    return max_continuations
+
+def _with_prefill(request_params, prefill):
+    """Add an assistant turn for the model to continue from (it may not end in whitespace)."""
+    messages = request_params["messages"] + [{"role": "assistant", "content": prefill.rstrip()}]
+    return dict(request_params, messages=messages)
+
+def _without_tools(request_params):
+    """Drop the tool definitions so a truncated tool call can be continued as plain JSON text.
+
+    The API does not accept an assistant prefill together with a forced tool
+    call, and the system prompts describe the same envelope in text.
+    """
+    return {k: v for k, v in request_params.items() if k not in ("tools", "tool_choice")}
+
+def _delta_text(event):
+    """Return the text carried by a stream event: a text delta or a piece of tool-call JSON."""
+    if event.type != "content_block_delta":
+        return ""
+    if event.delta.type == "text_delta":
+        return event.delta.text
+    if event.delta.type == "input_json_delta":
+        return event.delta.partial_json
+    return ""
+
+def _request_options(timeout):
+    """Per-request SDK options; the client's own timeout applies unless one is given."""
+    return {"timeout": timeout} if timeout else {}
+
+def _span_details(result):
+    """The outcome of a call, as shown on its trace span."""
+    usage = result.usage or {}
+    return {"cached": result.cached, "stop_reason": result.stop_reason, "retries": result.retries,
+            "input_tokens": usage.get("input_tokens") or 0, "output_tokens": usage.get("output_tokens") or 0}
+
+def _collecting(on_text, streamed, timing):
+    """Wrap on_text so every delta is also appended to streamed and the first one's arrival is noted in timing.
+
+    None stays None to keep the call unstreamed.
+    """
+    if on_text is None:
+        return None
+
+    def collect(text):
+        timing.setdefault("first_text", time.monotonic())
+        streamed.append(text)
+        return on_text(text)
+    return collect
+
+def _split_prefill(request_params):
+    """Return the request without its assistant prefill, and the prefill text."""
+    messages = request_params["messages"]
+    if messages[-1]["role"] != "assistant":
+        return request_params, ""
+    return dict(request_params, messages=messages[:-1]), messages[-1]["content"]
+
+def _extend_prefill(request_params, text):
+    """Continue a request from text, appended to its assistant prefill if it already ends with one.
+
+    Returns the new request and the part of its prefill that came from text.
+    """
+    if not text.strip():
+        return request_params, ""
+    base, prefill = _split_prefill(request_params)
+    merged = (prefill + text).rstrip()
+    return _with_prefill(_without_tools(base), merged), merged[len(prefill):]
+
+def _sum_usage(*usages):
+    """Add up the token counters of several calls."""
+    return {field: sum(usage.get(field) or 0 for usage in usages) for field in USAGE_FIELDS}
+
+def _record_latency(history, model, started, progress):
+    """Add a hedge-watched call's time to first token and streaming rate to the latency history.
+
+    A call cancelled before its first token counts with the time it had
+    waited, which is a lower bound of its real time to first token.
+    """
+    end, first = progress["end"], progress["first"]
+    if first is None:
+        history.record(model, end - started)
+    elif end > first:
+        history.record(model, first - started, progress["chars"] / (end - first))
+
+class ClaudeResponse:
+    """The text of a model reply plus the metadata the workflow cares about."""
+
+    def __init__(self, text, stop_reason=None, usage=None, cached=False, continuations=0, tool_input=None,
+                 latency=None, retries=0, ttft=None):
+        self.text = text
+        self.stop_reason = stop_reason
+        self.usage = usage or {}
+        # True when the reply came from the local response cache instead of the API
+        self.cached = cached
+        # Number of prefill continuations stitched into this reply after hitting max_tokens
+        self.continuations = continuations
+        # The validated arguments of a complete tool call, when the request forced one
+        self.tool_input = tool_input
+        # Wall-clock seconds spent on the API calls behind this reply, including retries and their waits
+        self.latency = latency
+        # Number of failed attempts that were retried while generating this reply
+        self.retries = retries
+        # Seconds until the first streamed text arrived, for streamed replies
+        self.ttft = ttft
+
+    @property
+    def is_truncated(self):
+        return self.stop_reason == "max_tokens"
+
+    def continued_from(self, prefill, previous=None):
+        """Stitch this reply onto the prefill it continued, adding up usage across the calls."""
+        if previous is None and not prefill:
+            return self
+        usage = dict(self.usage)
+        # A replayed reply already counts the continuations it was recorded with
+        continuations = self.continuations
+        if previous is not None:
+            usage.update(_sum_usage(previous.usage, usage))
+            continuations += previous.continuations + 1
+        return ClaudeResponse(prefill + self.text, self.stop_reason, usage, continuations=continuations)
+
+    @classmethod
+    def from_message(cls, message, stop_reason=None, text=None):
+        """Build a response from an API message.
+
+        text is the raw streamed output when the message was streamed; for a
+        tool call that is the JSON exactly as generated, which stays usable as
+        a prefill even when the call was cut off.
+        """
+        usage = message.usage.model_dump() if message.usage else {}
+        stop_reason = stop_reason or message.stop_reason
+        tool_input = None
+        if stop_reason == "tool_use":
+            tool_input = next((block.input for block in message.content if block.type == "tool_use"), None)
+        if text is None:
+            text = "".join(block.text for block in message.content if block.type == "text")
+            if tool_input is not None:
+                text += json.dumps(tool_input)
+        return cls(text, stop_reason, usage, tool_input=tool_input)
+
+    def to_dict(self):
+        return {"text": self.text, "stop_reason": self.stop_reason, "usage": self.usage,
+                "continuations": self.continuations, "tool_input": self.tool_input}
+
+    @classmethod
+    def from_dict(cls, data, cached=False):
+        return cls(data["text"], data.get("stop_reason"), data.get("usage"), cached=cached,
+                   continuations=data.get("continuations", 0), tool_input=data.get("tool_input"))
+
 class ClaudeClient:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self.client = get_anthropic_client(api_key)
+        self.cache = get_response_cache()
+        # Shared with every other process using the same key; None when no limits are configured
+        self.rate_limiter = get_rate_limiter(api_key)
+        # Set when HEDGING=on; calls are then watched and may be hedged
+        self.hedge_policy = get_hedge_policy()
+        # Set when LLM_RECORD names a cassette to append every generated reply to
+        self.recorder = get_recorder()
         
-    def generate_response(self, prompt, system_prompt=None, max_tokens=4000, model="claude-3-opus-20240229", thinking=None):
+    def _build_request(self, prompt, system_prompt=None, max_tokens=4000, model=DEFAULT_MODEL, thinking=None, context=None, tools=None, tool_choice=None):
+        """Build the messages API parameters.
+
+        context holds large documents that stay the same across follow-up rounds.
+        It is sent ahead of the prompt and, like the system prompt, marked as a
+        prompt-cache breakpoint so repeated calls only pay for the new tail.
+        tools and tool_choice are passed through to the API unchanged.
+        """
+        use_cache_control = _cache_control_enabled()
+        content = prompt
+        if context:
+            context_block = {"type": "text", "text": context}
+            if use_cache_control:
+                context_block["cache_control"] = {"type": "ephemeral"}
+            content = [context_block, {"type": "text", "text": prompt}]
         messages = [
-            {"role": "user", "content": prompt}
+            {"role": "user", "content": content}
         ]
         
         # Build request parameters - ignore thinking parameter completely
         request_params = {
             "model": model,
             "max_tokens": max_tokens,
-            "system": system_prompt,
             "messages": messages
         }
+        if system_prompt:
+            if use_cache_control:
+                # The system prompts are static, so they are always worth caching
+                request_params["system"] = [
+                    {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+                ]
+            else:
+                request_params["system"] = system_prompt
+        if tools:
+            request_params["tools"] = tools
+        if tool_choice:
+            request_params["tool_choice"] = tool_choice
         
         # Extended thinking is not supported in this version, just log a message if it was requested
         if thinking:
             print("\nNote: Extended thinking requested but not available in this version.")
             print("Using standard Claude model without extended thinking.")
         
-        response = self.client.messages.create(**request_params)
-        
+        return request_params
+
+    async def _send_async(self, request_params, on_text=None, timeout=None, usage=None):
+        """Make one API call, streaming text deltas to on_text when it is given.
+
+        Tool-call arguments are streamed as the raw JSON text. If on_text returns True the stream is closed right away and the partial
+        response is returned with stop_reason EARLY_STOP. usage, when given,
+        is kept up to date while the reply streams (output tokens estimated
+        from its length), so a call that is cancelled midway still shows
+        what it used.
+        """
+        client = get_async_anthropic_client(self.api_key)
+        if on_text is None:
+            return ClaudeResponse.from_message(await client.messages.create(**request_params, **_request_options(timeout)))
+        async with client.messages.stream(**request_params, **_request_options(timeout)) as stream:
+            streamed = []
+            chars = 0
+            async for event in stream:
+                if event.type == "message_start" and usage is not None:
+                    usage.update(event.message.usage.model_dump())
+                text = _delta_text(event)
+                if not text:
+                    continue
+                streamed.append(text)
+                chars += len(text)
+                if usage is not None:
+                    usage["output_tokens"] = max(usage.get("output_tokens") or 0, chars // CHARS_PER_TOKEN)
+                if on_text(text):
+                    # Leaving the block closes the connection, which cancels the generation
+                    return ClaudeResponse.from_message(stream.current_message_snapshot, EARLY_STOP, "".join(streamed))
+            return ClaudeResponse.from_message(await stream.get_final_message(), text="".join(streamed))
+
+    async def _send_reserved_async(self, request_params, on_text=None, timeout=None, usage=None):
+        """Make one API call under a reservation from the shared rate limiter, settled against its usage.
+
+        A call that fails or is cancelled is settled against what it used
+        before it stopped, usually nothing, so the rest of its reserved tokens
+        are given back instead of staying drawn from the buckets. usage, when
+        given, ends up holding the call's usage either way.
+        """
+        usage = {} if usage is None else usage
+        reservation = None
+        if self.rate_limiter:
+            with span("rate limiter", "llm"):
+                reservation = await self.rate_limiter.acquire_async(request_params)
+        try:
+            part = await self._send_async(request_params, on_text, timeout, usage)
+            usage.update(part.usage)
+            return part
+        finally:
+            if reservation:
+                self.rate_limiter.settle(reservation, usage)
+
+    async def _send_hedged_async(self, request_params, on_text=None, timeout=None):
+        """Send a request and race a duplicate against it if it falls behind the latency history.
+
+        The reply streams to on_text until a hedge is sent. From then on both
+        replies are held back: the hedge continues from the text already
+        delivered as a prefill, so whichever finishes first, on_text receives
+        the rest of the winning reply and the loser is cancelled. Every call
+        streams so that its time to first token and rate can be recorded,
+        hedged or not.
+        """
+        policy = self.hedge_policy
+        thresholds = policy.thresholds(request_params)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        progress = {"first": None, "chars": 0}
+        delivered, held, hedge_held = [], [], []
+        primary_usage, hedge_usage = {}, {}
+        hedge = None
+
+        def primary_text(text):
+            if progress["first"] is None:
+                progress["first"] = loop.time()
+            progress["chars"] += len(text)
+            if hedge is not None:
+                held.append(text)
+                return None
+            delivered.append(text)
+            return on_text(text) if on_text else None
+
+        primary = asyncio.ensure_future(self._send_reserved_async(request_params, primary_text, timeout, primary_usage))
+        primary.add_done_callback(lambda _: progress.setdefault("end", loop.time()))
+        try:
+            while thresholds is not None and not primary.done():
+                await asyncio.wait({primary}, timeout=CHECK_INTERVAL)
+                now = loop.time()
+                streaming_time = None if progress["first"] is None else now - progress["first"]
+                if not primary.done() and policy.is_behind(thresholds, now - started, streaming_time, progress["chars"]) \
+                        and policy.try_hedge():
+                    # A continuation or retry already ends with a prefill, which the delivered text extends
+                    hedge_params, prefill = _extend_prefill(request_params, "".join(delivered))
+                    hedge = asyncio.ensure_future(self._send_reserved_async(hedge_params, hedge_held.append, timeout, hedge_usage))
+                    break
+
+            if hedge is None:
+                result = await primary
+                _record_latency(policy.history, request_params["model"], started, progress)
+                return result
+
+            winner, error, pending = None, None, {primary, hedge}
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in (primary, hedge):
+                    if task in done and winner is None:
+                        if task.exception() is None:
+                            winner = task
+                        else:
+                            error = error or task.exception()
+            if winner is None:
+                raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+            await asyncio.gather(*(task for task in (primary, hedge) if task is not None), return_exceptions=True)
+
+        # The primary is recorded whether it won or lost, or the slow calls that get hedged
+        # would never reach the history and its thresholds would keep drifting down
+        if primary.cancelled() or primary.exception() is None:
+            _record_latency(policy.history, request_params["model"], started, progress)
+        if winner is primary:
+            result, remainder = primary.result(), "".join(held)
+        else:
+            policy.record_win()
+            result = hedge.result().continued_from(prefill) if prefill else hedge.result()
+            remainder = "".join(hedge_held)
+        # Both calls are paid for, so the reply carries their combined usage
+        result.usage = _sum_usage(primary_usage, hedge_usage)
+        if on_text and remainder:
+            on_text(remainder)
+        return result
+
+    def _concurrency_limit(self):
+        return get_concurrency_limit()
+
+    async def _complete_async(self, request_params, on_text, max_continuations, timeout=None):
+        """Send a request, continuing from an assistant prefill while the reply stops at max_tokens.
+
+        Failed attempts are retried according to utils.retry. When a stream
+        fails after some text has arrived, the retry continues from that text
+        as a prefill instead of starting over, so on_text never sees it twice.
+        Every attempt first reserves capacity from the shared rate limiter.
+        """
+        request_params, prefill = _split_prefill(request_params)
+        result = None
+        retries = 0
+        started = time.monotonic()
+        timing = {}
+        while True:
+            params = _with_prefill(request_params, prefill) if prefill else request_params
+            streamed = []
+            try:
+                send = self._send_hedged_async if self.hedge_policy else self._send_reserved_async
+                with span("api call", "llm", attempt=retries + 1):
+                    part = await send(params, _collecting(on_text, streamed, timing), timeout)
+            except Exception as e:
+                delay = retry_delay(e, retries)
+                if delay is None:
+                    raise
+                retries += 1
+                with span("retry backoff", "llm", error=type(e).__name__, seconds=round(delay, 3)):
+                    await asyncio.sleep(delay)
+                if "".join(streamed).strip():
+                    request_params = _without_tools(request_params)
+                    prefill = (prefill + "".join(streamed)).rstrip()
+                continue
+            record_usage(part.usage)
+            result = part.continued_from(prefill, result)
+            if not part.is_truncated or result.continuations >= max_continuations:
+                result.latency = time.monotonic() - started
+                result.retries = retries
+                if "first_text" in timing:
+                    result.ttft = timing["first_text"] - started
+                return result
+            request_params = _without_tools(request_params)
+            prefill = result.text.rstrip()
+
+    def generate(self, prompt, system_prompt=None, max_tokens=4000, model=DEFAULT_MODEL, thinking=None, context=None, cache=None, on_text=None, prefill=None, max_continuations=None, tools=None, tool_choice=None, timeout=None):
+        """Blocking version of generate_async, run on the event loop shared by every blocking call."""
+        return _run_blocking(self.generate_async(prompt, system_prompt, max_tokens, model, thinking, context, cache, on_text,
+                                                 prefill, max_continuations, tools, tool_choice, timeout))
+
+    async def generate_async(self, prompt, system_prompt=None, max_tokens=4000, model=DEFAULT_MODEL, thinking=None, context=None, cache=None, on_text=None, prefill=None, max_continuations=None, tools=None, tool_choice=None, timeout=None):
+        """Generate a ClaudeResponse, serving identical requests from the on-disk cache.
+
+        cache may be "bypass" to skip the cache entirely or "refresh" to ignore
+        any stored response but store the new one. When on_text is given the
+        response is streamed and on_text is called with each text delta as it
+        arrives (a cached response is delivered as a single delta); returning
+        True from on_text stops the generation early.
+
+        A reply that stops at max_tokens is continued up to max_continuations
+        times (MAX_CONTINUATIONS, default 3) by sending it back as an assistant
+        prefill, and the pieces are stitched into one response. prefill starts
+        the reply from a given text, e.g. an earlier truncated response.
+
+        tools and tool_choice request a tool call; forcing a single tool makes
+        the reply's tool_input the validated arguments. A continued or prefilled
+        tool call is completed as JSON text instead, so only text is set then.
+
+        Calls on one event loop are bounded by ANTHROPIC_MAX_CONCURRENCY.
+
+        timeout (seconds) bounds each API attempt instead of the client's
+        default; it is not part of the request, so it does not change the cache key.
+        """
+        with span("claude.generate", "llm", model=model, max_tokens=max_tokens) as details:
+            request_params = self._build_request(prompt, system_prompt, max_tokens, model, thinking, context, tools, tool_choice)
+            if prefill:
+                request_params = _with_prefill(_without_tools(request_params), prefill)
+            cache_mode = _cache_mode(cache)
+            key = make_cache_key(request_params)
+            cached = self.cache.get(key, cache_mode)
+            if cached is not None:
+                result = ClaudeResponse.from_dict(cached, cached=True)
+                details.update(_span_details(result))
+                if on_text:
+                    on_text(result.text)
+                return result
+
+            if prefill and on_text:
+                # Stream consumers see the whole reply, starting with the text being continued
+                on_text(prefill.rstrip())
+            async with self._concurrency_limit():
+                result = await self._complete_async(request_params, on_text, _max_continuations(max_continuations), timeout)
+            details.update(_span_details(result))
+            if self.recorder:
+                self.recorder.record(request_params, result)
+            if result.stop_reason != EARLY_STOP:
+                self.cache.put(key, result.to_dict(), cache_mode)
+            return result
+
+    def generate_response(self, prompt, system_prompt=None, max_tokens=4000, model=DEFAULT_MODEL, thinking=None, **kwargs):
         # Standard response handling
-        return response.content[0].text 
\ No newline at end of file
+        return self.generate(prompt, system_prompt, max_tokens, model, thinking, **kwargs).text
+
+    async def generate_response_async(self, prompt, system_prompt=None, max_tokens=4000, model=DEFAULT_MODEL, thinking=None, **kwargs):
+        result = await self.generate_async(prompt, system_prompt, max_tokens, model, thinking, **kwargs)
+        return result.text
@@ -0,0 +1,336 @@
+"""
+A local fake of the Anthropic messages API for offline runs and benchmarks.
+
+FakeAnthropicServer answers POST /v1/messages like the real endpoint:
+plain and streamed (server-sent events) replies, forced tool calls, assistant
+prefills, max_tokens truncation and usage. Replies are agent envelopes with
+generated markdown, derived deterministically from the request, so a
+continuation picks up exactly where the truncated reply stopped. Time to
+first token, streaming rate and reply size follow log-normal distributions,
+and rate limits (429 with retry-after), overloads (529) and errors in the
+middle of a stream can be injected at configurable rates.
+
+Point ClaudeClient at it with ANTHROPIC_BASE_URL=<server url>; start one with
+`python main.py fake-server`.
+"""
+import re
+import json
+import math
+import time
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from .response_cache import make_cache_key
+
+CHARS_PER_TOKEN = 4
+# Characters sent per streamed delta
+STREAM_CHUNK_SIZE = 16
+
+# Stage prompts carry the user's answers under a heading like "Additional Product Information"
+_ANSWERED = re.compile(r"Additional [A-Za-z ]*Information")
+
+_WORDS = ("service", "module", "user", "data", "request", "cache", "queue", "schema", "deploy", "test",
+          "latency", "storage", "interface", "workflow", "config", "metric", "client", "server", "token",
+          "session", "index", "event", "handler", "pipeline", "release", "review", "budget", "feature")
+
+STAT_FIELDS = ("requests", "succeeded", "rate_limited", "overloaded", "stream_errors", "invalid",
+               "input_tokens", "output_tokens", "bytes_received", "bytes_sent")
+
+class FakeServerConfig:
+    """How the fake API behaves: latency and size distributions, follow-ups and injected failures.
+
+    ttft and tokens_per_second are medians in seconds and output tokens per
+    second, output_tokens the median reply size; each *_sigma is the sigma
+    of the log-normal distribution around it. The *_rate values are the
+    fractions of requests that ask follow-up questions (when the prompt has
+    no answers yet), get a 429, get a 529 or fail halfway through a stream.
+    """
+
+    def __init__(self, ttft=0.3, ttft_sigma=0.5, tokens_per_second=200.0, tokens_per_second_sigma=0.2,
+                 output_tokens=1200, output_tokens_sigma=0.3, followup_rate=0.0, rate_limit_rate=0.0,
+                 overload_rate=0.0, stream_error_rate=0.0, retry_after=1.0, seed=0):
+        self.ttft = ttft
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_second_sigma = tokens_per_second_sigma
+        self.output_tokens = output_tokens
+        self.output_tokens_sigma = output_tokens_sigma
+        self.followup_rate = followup_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.overload_rate = overload_rate
+        self.stream_error_rate = stream_error_rate
+        self.retry_after = retry_after
+        self.seed = seed
+
+def _lognormal(rng, median, sigma):
+    if median <= 0:
+        return 0.0
+    return rng.lognormvariate(math.log(median), sigma)
+
+def _message_text(message):
+    content = message["content"]
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+def _document(rng, tokens):
+    """Markdown of roughly tokens tokens made of sections of generated sentences."""
+    target = tokens * CHARS_PER_TOKEN
+    parts = [f"# {' '.join(rng.choice(_WORDS) for _ in range(3)).title()}\n"]
+    length = len(parts[0])
+    section = 0
+    while length < target:
+        section += 1
+        sentences = [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 14))).capitalize() + "."
+                     for _ in range(rng.randint(3, 6))]
+        part = f"\n## Section {section}\n\n" + " ".join(sentences) + "\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)[:target]
+
+class _Server(ThreadingHTTPServer):
+    # Room for a hundred clients connecting at once, instead of the default 5
+    request_queue_size = 128
+
+class FakeAnthropicServer:
+    """A threaded HTTP server speaking enough of the messages API for ClaudeClient."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or FakeServerConfig()
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.stats = dict.fromkeys(STAT_FIELDS, 0)
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve from a background thread and return the base URL."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def count(self, **amounts):
+        with self._lock:
+            for field, amount in amounts.items():
+                self.stats[field] += amount
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def attempt(self, key):
+        """Number this request's attempts, so failures are decided per attempt but reproducibly."""
+        with self._lock:
+            self._attempts[key] = self._attempts.get(key, 0) + 1
+            return self._attempts[key]
+
+    def plan(self, body):
+        """Decide everything about the reply to a request: text, stop reason, timing and failures."""
+        config = self.config
+        messages = body["messages"]
+        prefill = _message_text(messages[-1]) if messages[-1]["role"] == "assistant" else ""
+        conversation = messages[:-1] if prefill else messages
+        # The reply depends on the conversation only, so continuations extend the same reply
+        reply_key = make_cache_key({"model": body["model"], "system": body.get("system"), "messages": conversation})
+        reply_rng = random.Random(f"{config.seed}:{reply_key}")
+        attempt_rng = random.Random(f"{config.seed}:{make_cache_key(body)}:{self.attempt(make_cache_key(body))}")
+
+        answered = _ANSWERED.search(_message_text(conversation[-1])) is not None
+        if not answered and reply_rng.random() < config.followup_rate:
+            questions = [f"Which {reply_rng.choice(_WORDS)} should the {reply_rng.choice(_WORDS)} support?"
+                         for _ in range(reply_rng.randint(2, 4))]
+            envelope = {"command": "follow-up", "questions": questions, "content": ""}
+        else:
+            tokens = max(1, int(_lognormal(reply_rng, config.output_tokens, config.output_tokens_sigma)))
+            envelope = {"command": "pass-on", "questions": [], "content": _document(reply_rng, tokens)}
+
+        tool_choice = body.get("tool_choice") or {}
+        use_tool = tool_choice.get("type") == "tool" and not prefill
+        schema = next((tool.get("input_schema") or {} for tool in body.get("tools") or []
+                       if tool.get("name") == tool_choice.get("name")), None)
+        if use_tool and schema:
+            # A forced tool only fills in its own fields, e.g. a triage verdict has no content
+            envelope = {key: value for key, value in envelope.items() if key in schema.get("properties", {})}
+        full_text = json.dumps(envelope)
+        remaining = full_text[len(prefill):] if full_text.startswith(prefill) else full_text
+        limit = body["max_tokens"] * CHARS_PER_TOKEN
+        if len(remaining) > limit:
+            text, stop_reason = remaining[:limit], "max_tokens"
+        else:
+            text, stop_reason = remaining, "tool_use" if use_tool else "end_turn"
+
+        failure = None
+        roll = attempt_rng.random()
+        if roll < config.rate_limit_rate:
+            failure = "rate_limit"
+        elif roll < config.rate_limit_rate + config.overload_rate:
+            failure = "overloaded"
+        elif roll < config.rate_limit_rate + config.overload_rate + config.stream_error_rate:
+            failure = "stream_error"
+        return {
+            "text": text,
+            "stop_reason": stop_reason,
+            "tool": tool_choice.get("name") if use_tool else None,
+            "envelope": envelope if use_tool and stop_reason == "tool_use" else None,
+            "input_tokens": len(json.dumps([body.get("system"), body.get("tools"), messages])) // CHARS_PER_TOKEN,
+            "output_tokens": max(1, len(text) // CHARS_PER_TOKEN),
+            "ttft": _lognormal(attempt_rng, config.ttft, config.ttft_sigma),
+            "tokens_per_second": _lognormal(attempt_rng, config.tokens_per_second, config.tokens_per_second_sigma),
+            "failure": failure
+        }
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.send_header("request-id", f"req_fake_{random.getrandbits(48):012x}")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.fake.count(bytes_sent=len(data))
+
+    def _error(self, status, error_type, message, headers=None):
+        self._send_json(status, {"type": "error", "error": {"type": error_type, "message": message}}, headers)
+
+    def do_POST(self):
+        fake = self.server.fake
+        raw = self.rfile.read(int(self.headers.get("content-length", 0)))
+        fake.count(requests=1, bytes_received=len(raw))
+        if self.path.split("?")[0] != "/v1/messages":
+            self._error(404, "not_found_error", f"Unknown path {self.path}")
+            return
+        try:
+            body = json.loads(raw)
+        except ValueError as e:
+            fake.count(invalid=1)
+            self._error(400, "invalid_request_error", f"Malformed JSON: {e}")
+            return
+        missing = [field for field in ("model", "max_tokens", "messages") if field not in body]
+        if missing:
+            fake.count(invalid=1)
+            self._error(400, "invalid_request_error", f"Missing required fields: {', '.join(missing)}")
+            return
+        messages = body["messages"]
+        if (body.get("tool_choice") or {}).get("type") == "tool" and messages[-1]["role"] == "assistant":
+            fake.count(invalid=1)
+            self._error(400, "invalid_request_error", "Prefilling the assistant message is not supported when forcing tool use.")
+            return
+
+        plan = fake.plan(body)
+        try:
+            if plan["failure"] == "rate_limit":
+                fake.count(rate_limited=1)
+                reset = datetime.now(timezone.utc) + timedelta(seconds=fake.config.retry_after)
+                self._error(429, "rate_limit_error", "Number of requests has exceeded your rate limit.",
+                            {"retry-after": str(fake.config.retry_after),
+                             "anthropic-ratelimit-requests-reset": reset.isoformat().replace("+00:00", "Z")})
+            elif plan["failure"] == "overloaded":
+                fake.count(overloaded=1)
+                self._error(529, "overloaded_error", "Overloaded")
+            elif body.get("stream"):
+                self._stream(body, plan)
+            else:
+                self._reply(body, plan)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away, e.g. it cancelled a hedge or stopped a stream early
+            pass
+
+    def _message(self, body, plan, content, stop_reason, output_tokens):
+        return {
+            "id": f"msg_fake_{random.getrandbits(64):016x}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {"input_tokens": plan["input_tokens"], "output_tokens": output_tokens,
+                      "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        }
+
+    def _reply(self, body, plan):
+        fake = self.server.fake
+        time.sleep(plan["ttft"] + plan["output_tokens"] / plan["tokens_per_second"])
+        if plan["failure"] == "stream_error":
+            fake.count(stream_errors=1)
+            self._error(500, "api_error", "Internal server error")
+            return
+        if plan["tool"]:
+            content = [{"type": "tool_use", "id": f"toolu_fake_{random.getrandbits(64):016x}",
+                        "name": plan["tool"], "input": plan["envelope"] or {}}]
+        else:
+            content = [{"type": "text", "text": plan["text"]}]
+        fake.count(succeeded=1, input_tokens=plan["input_tokens"], output_tokens=plan["output_tokens"])
+        self._send_json(200, self._message(body, plan, content, plan["stop_reason"], plan["output_tokens"]))
+
+    def _event(self, name, data):
+        chunk = f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+        self.wfile.flush()
+        self.server.fake.count(bytes_sent=len(chunk))
+
+    def _stream(self, body, plan):
+        fake = self.server.fake
+        time.sleep(plan["ttft"])
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        self._event("message_start", {"type": "message_start",
+                                      "message": self._message(body, plan, [], None, 1)})
+        if plan["tool"]:
+            block = {"type": "tool_use", "id": f"toolu_fake_{random.getrandbits(64):016x}", "name": plan["tool"], "input": {}}
+        else:
+            block = {"type": "text", "text": ""}
+        self._event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+
+        text = plan["text"]
+        fail_at = len(text) // 2 if plan["failure"] == "stream_error" else None
+        delay = STREAM_CHUNK_SIZE / CHARS_PER_TOKEN / plan["tokens_per_second"]
+        for start in range(0, len(text), STREAM_CHUNK_SIZE):
+            if fail_at is not None and start >= fail_at:
+                fake.count(stream_errors=1)
+                self._event("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            piece = text[start:start + STREAM_CHUNK_SIZE]
+            if plan["tool"]:
+                delta = {"type": "input_json_delta", "partial_json": piece}
+            else:
+                delta = {"type": "text_delta", "text": piece}
+            self._event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+            time.sleep(delay)
+
+        self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        self._event("message_delta", {"type": "message_delta",
+                                      "delta": {"stop_reason": plan["stop_reason"], "stop_sequence": None},
+                                      "usage": {"output_tokens": plan["output_tokens"]}})
+        self._event("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+        fake.count(succeeded=1, input_tokens=plan["input_tokens"], output_tokens=plan["output_tokens"])
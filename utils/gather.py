@@ -0,0 +1,62 @@
+"""
+The gather phase: every agent's clarifying questions, asked once up front.
+
+Before a workflow's stages run, each agent that will generate is asked for
+its questions about the project description, all at once. Questions several
+agents asked in different words are merged when their word sets overlap by
+at least DEDUPE_THRESHOLD (Jaccard similarity), and the user answers them all
+in one form, and each stage gets the answers to its questions before its
+first round, the way it would get a follow-up answer.
+"""
+import re
+
+# Word-set overlap above which two questions count as the same question
+DEDUPE_THRESHOLD = 0.6
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "any", "are", "be", "by", "can", "do", "does", "for", "have", "how", "if", "in", "is",
+    "it", "of", "on", "or", "should", "that", "the", "there", "this", "to", "what", "which", "will",
+    "with", "would", "you", "your"
+}
+
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+def _stem(word):
+    # Just enough stemming that "users"/"user" and "preferred"/"prefer" match
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 4 and word[-1] == word[-2]:
+        word = word[:-1]
+    return word
+
+def question_words(question):
+    return {_stem(word) for word in _WORD.findall(question.lower()) if word not in _STOPWORDS}
+
+def jaccard(a, b):
+    union = a | b
+    return len(a & b) / len(union) if union else 1.0
+
+def dedupe_questions(asked, threshold=DEDUPE_THRESHOLD):
+    """Merge near-duplicate questions.
+
+    asked is a list of (stage name, question) in workflow order; returns a list
+    of (question, [stage names that asked it]) keeping the first wording.
+    """
+    merged = []
+    for stage_name, question in asked:
+        words = question_words(question)
+        for entry in merged:
+            if jaccard(words, entry["words"]) >= threshold:
+                if stage_name not in entry["stages"]:
+                    entry["stages"].append(stage_name)
+                break
+        else:
+            merged.append({"question": question, "words": words, "stages": [stage_name]})
+    return [(entry["question"], entry["stages"]) for entry in merged]
+
+def format_answers(pairs):
+    """Render answered (question, answer) pairs as the text agents receive; unanswered ones are left out."""
+    return "\n".join(f"Q: {question}\nA: {answer.strip()}" for question, answer in pairs if answer and answer.strip())
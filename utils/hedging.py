@@ -0,0 +1,136 @@
+"""
+Hedging policy for long generations: when to send a duplicate of a slow request.
+
+The latency history keeps recent time-to-first-token and streaming-rate
+samples per model in .cache. A call that has not produced its first token
+by the history's HEDGE_PERCENTILE time to first token, or that streams
+slower than all but that percentile of past calls, is worth hedging. The
+policy only allows hedges while they stay within HEDGE_BUDGET of the
+eligible calls, so hedging never adds more than a few percent of requests.
+"""
+import os
+import json
+import math
+import threading
+from .artifact_store import write_atomic
+
+DEFAULT_HISTORY_PATH = os.path.join(".cache", "latency_history.json")
+
+# Samples kept per model and needed before any call is hedged
+HISTORY_WINDOW = 200
+MIN_SAMPLES = 20
+
+DEFAULT_PERCENTILE = 95
+# Largest fraction of eligible calls that may be hedged
+DEFAULT_BUDGET = 0.05
+# Only calls allowed at least this many output tokens are hedged
+DEFAULT_MIN_MAX_TOKENS = 8000
+
+# Seconds of streaming before a call's rate is compared with the history
+MIN_PROGRESS_WINDOW = 2.0
+# How often a running call is checked against the thresholds
+CHECK_INTERVAL = 0.25
+
+_policy = None
+_policy_lock = threading.Lock()
+
+def percentile(values, p):
+    """The p-th percentile (0-100) of values by the nearest-rank method, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def hedging_enabled():
+    return os.getenv("HEDGING", "off").lower() == "on"
+
+class LatencyHistory:
+    """Recent time-to-first-token and characters-per-second samples per model, persisted as JSON."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("LATENCY_HISTORY_PATH", DEFAULT_HISTORY_PATH)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                self.samples = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.samples = {}
+
+    def record(self, model, ttft, rate=None):
+        """Add a call's samples; rate is None for a call cancelled before it streamed anything."""
+        with self._lock:
+            entry = self.samples.setdefault(model, {"ttft": [], "rate": []})
+            entry["ttft"] = (entry["ttft"] + [ttft])[-HISTORY_WINDOW:]
+            if rate is not None:
+                entry["rate"] = (entry["rate"] + [rate])[-HISTORY_WINDOW:]
+            write_atomic(self.path, json.dumps(self.samples))
+
+    def thresholds(self, model, p):
+        """Return (time to first token, streaming rate) that only the slowest 100 - p percent of calls fall behind.
+
+        Returns None until the model has MIN_SAMPLES samples.
+        """
+        with self._lock:
+            entry = self.samples.get(model)
+            if not entry or len(entry["ttft"]) < MIN_SAMPLES:
+                return None
+            return percentile(entry["ttft"], p), percentile(entry["rate"], 100 - p)
+
+class HedgePolicy:
+    """Decides which calls may be hedged and keeps hedges within their budget."""
+
+    def __init__(self, history=None, p=None, budget=None, min_max_tokens=None):
+        self.history = history or LatencyHistory()
+        self.p = float(p or os.getenv("HEDGE_PERCENTILE", DEFAULT_PERCENTILE))
+        self.budget = float(budget or os.getenv("HEDGE_BUDGET", DEFAULT_BUDGET))
+        self.min_max_tokens = int(min_max_tokens or os.getenv("HEDGE_MIN_MAX_TOKENS", DEFAULT_MIN_MAX_TOKENS))
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+
+    def thresholds(self, request_params):
+        """Return the thresholds to watch a call against, or None if it is not eligible for hedging."""
+        if request_params.get("max_tokens", 0) < self.min_max_tokens:
+            return None
+        thresholds = self.history.thresholds(request_params["model"], self.p)
+        if thresholds is not None:
+            with self._lock:
+                self.stats["calls"] += 1
+        return thresholds
+
+    def is_behind(self, thresholds, elapsed, streaming_time, chars):
+        """Whether a call has fallen behind: no first token in time, or streaming too slowly."""
+        ttft_limit, rate_limit = thresholds
+        if streaming_time is None:
+            return elapsed > ttft_limit
+        return (rate_limit is not None and streaming_time > MIN_PROGRESS_WINDOW
+                and chars / streaming_time < rate_limit)
+
+    def try_hedge(self):
+        """Claim budget for one hedge; False when hedging now would exceed HEDGE_BUDGET."""
+        with self._lock:
+            if self.stats["hedged"] + 1 > self.budget * self.stats["calls"]:
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.stats["hedge_wins"] += 1
+
+def get_hedge_policy():
+    """Return the process-wide hedging policy, or None when HEDGING is off."""
+    global _policy
+    if not hedging_enabled():
+        return None
+    with _policy_lock:
+        if _policy is None:
+            _policy = HedgePolicy()
+        return _policy
+
+def get_hedge_stats():
+    """Return how many eligible calls were made, hedged, and won by the hedge."""
+    if _policy is None:
+        return {"calls": 0, "hedged": 0, "hedge_wins": 0}
+    with _policy._lock:
+        return dict(_policy.stats)
@@ -1,6 +1,8 @@
 import json
 import re
+from .tracing import traced
 
+@traced("robust_json_parse", "parse")
 def robust_json_parse(text):
     """
     Try to robustly parse a JSON object from a string, even if it is pretty-printed,
@@ -22,4 +24,178 @@ def robust_json_parse(text):
             return json.loads(json_content)
         except Exception:
             pass
-    raise ValueError("Could not robustly parse JSON from text.") 
\ No newline at end of file
+    raise ValueError("Could not robustly parse JSON from text.") 
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_WHITESPACE = " \t\r\n"
+
+class StreamingEnvelopeParser:
+    """
+    Incrementally parse the agent JSON envelope ({"command", "questions", "content"})
+    from a stream of text chunks, without waiting for the full response.
+
+    The command is reported as soon as its string closes, each question as soon
+    as it is complete, and the content as decoded text deltas. Other keys are
+    skipped. feed() returns True once the caller can stop the stream early:
+    when stop_on_followup is set and the agent asked follow-up questions.
+    """
+
+    def __init__(self, on_command=None, on_question=None, on_content=None, stop_on_followup=False):
+        self.on_command = on_command
+        self.on_question = on_question
+        self.on_content = on_content
+        self.stop_on_followup = stop_on_followup
+        self.command = None
+        self.questions = []
+        self.content = ""
+        self.questions_complete = False
+        self.complete = False
+        self._state = "start"
+        self._key = None
+        self._target = None
+        self._buffer = []
+        self._escape = None
+        self._pending_surrogate = None
+        self._skip_depth = 0
+        self._skip_in_string = False
+        self._skip_escaped = False
+
+    def should_stop(self):
+        return (self.stop_on_followup and self.command == "follow-up"
+                and self.questions_complete and bool(self.questions))
+
+    def feed(self, chunk):
+        """Consume a chunk of raw response text. Returns True when the stream can be stopped."""
+        for char in chunk:
+            if self.complete:
+                break
+            self._step(char)
+        return self.should_stop()
+
+    def _step(self, char):
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._state = "key"
+        elif state == "key":
+            if char == '"':
+                self._begin_string("key")
+            elif char == "}":
+                self.complete = True
+        elif state == "colon":
+            if char == ":":
+                self._state = "value"
+        elif state == "value":
+            if char in _WHITESPACE:
+                return
+            if char == '"':
+                self._begin_string(self._key)
+            elif char == "[" and self._key == "questions":
+                self._state = "array"
+            else:
+                self._begin_skip(char)
+        elif state == "array":
+            if char == '"':
+                self._begin_string("question")
+            elif char == "]":
+                self.questions_complete = True
+                self._state = "after_value"
+        elif state == "after_value":
+            if char == ",":
+                self._state = "key"
+            elif char == "}":
+                self.complete = True
+        elif state == "string":
+            self._string_char(char)
+        elif state == "skip":
+            self._skip_char(char)
+
+    def _begin_string(self, target):
+        self._target = target
+        self._buffer = []
+        self._escape = None
+        self._state = "string"
+
+    def _string_char(self, char):
+        decoded = ""
+        if self._escape is not None:
+            self._escape += char
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                code = int(self._escape[1:], 16)
+                self._escape = None
+                if 0xD800 <= code < 0xDC00:
+                    self._pending_surrogate = code
+                    return
+                if 0xDC00 <= code < 0xE000 and self._pending_surrogate is not None:
+                    code = 0x10000 + ((self._pending_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                self._pending_surrogate = None
+                decoded = chr(code)
+            else:
+                decoded = _ESCAPES.get(self._escape, self._escape)
+                self._escape = None
+        elif char == "\\":
+            self._escape = ""
+            return
+        elif char == '"':
+            self._end_string()
+            return
+        else:
+            decoded = char
+
+        self._buffer.append(decoded)
+        if self._target == "content" and self.on_content:
+            self.content += decoded
+            self.on_content(decoded)
+        elif self._target == "content":
+            self.content += decoded
+
+    def _end_string(self):
+        value = "".join(self._buffer)
+        target = self._target
+        if target == "key":
+            self._key = value
+            self._state = "colon"
+            return
+        if target == "question":
+            self.questions.append(value)
+            if self.on_question:
+                self.on_question(value)
+            self._state = "array"
+            return
+        if target == "command":
+            self.command = value
+            if self.on_command:
+                self.on_command(value)
+        self._state = "after_value"
+
+    def _begin_skip(self, char):
+        # Skip an uninteresting value (number, literal, object or array) without decoding it
+        self._state = "skip"
+        self._skip_depth = 0
+        self._skip_in_string = False
+        self._skip_escaped = False
+        self._skip_char(char)
+
+    def _skip_char(self, char):
+        if self._skip_in_string:
+            if self._skip_escaped:
+                self._skip_escaped = False
+            elif char == "\\":
+                self._skip_escaped = True
+            elif char == '"':
+                self._skip_in_string = False
+            return
+        if char == '"':
+            self._skip_in_string = True
+        elif char in "{[":
+            self._skip_depth += 1
+        elif char in "}]":
+            if self._skip_depth == 0:
+                # End of the enclosing object
+                self.complete = True
+                return
+            self._skip_depth -= 1
+        elif char == "," and self._skip_depth == 0:
+            self._state = "key"
@@ -0,0 +1,215 @@
+"""
+Cost ledger: what every model call cost, and the budgets that limit spend.
+
+Every call that reaches the API is appended to LEDGER_PATH (default
+.cache/ledger.jsonl) with its run, project, stage, agent, model, token usage
+and cost, priced from PRICING. Responses served from the local response cache
+cost nothing and are not recorded. Spend is totalled per project across runs
+and per run (one invocation of main.py), so a resumed project keeps counting
+what it already spent.
+
+Budgets are optional, in US dollars: BUDGET_PROJECT_USD caps each project and
+BUDGET_RUN_USD the whole run. Once a budget is BUDGET_SOFT_LIMIT (default 0.8)
+spent, agents switch to BUDGET_FALLBACK_MODEL and a stage that has had
+BUDGET_MAX_FOLLOWUPS follow-up rounds has to proceed on assumptions; once it
+is fully spent the next call raises BudgetExceeded.
+Calls already in flight when a budget runs out still finish, so spend can
+overshoot a budget by the calls running at that moment.
+"""
+import os
+import json
+import threading
+from datetime import datetime
+from .metrics import current_context
+
+DEFAULT_LEDGER_PATH = os.path.join(".cache", "ledger.jsonl")
+DEFAULT_SOFT_LIMIT = 0.8
+DEFAULT_FALLBACK_MODEL = "claude-3-5-haiku-20241022"
+DEFAULT_MAX_FOLLOWUPS = 1
+
+# US dollars per million tokens: input, output, cache reads and cache writes (5-minute TTL)
+PRICING = {
+    "claude-opus-4": {"input": 15.0, "output": 75.0, "cache_read": 1.50, "cache_write": 18.75},
+    "claude-sonnet-4": {"input": 3.0, "output": 15.0, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-3-7-sonnet": {"input": 3.0, "output": 15.0, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-3-5-sonnet": {"input": 3.0, "output": 15.0, "cache_read": 0.30, "cache_write": 3.75},
+    "claude-3-5-haiku": {"input": 0.80, "output": 4.0, "cache_read": 0.08, "cache_write": 1.0},
+    "claude-3-opus": {"input": 15.0, "output": 75.0, "cache_read": 1.50, "cache_write": 18.75},
+    "claude-3-haiku": {"input": 0.25, "output": 1.25, "cache_read": 0.03, "cache_write": 0.30}
+}
+# Models missing from PRICING are priced like the most expensive model of their family
+FAMILY_PRICING = {"opus": "claude-opus-4", "sonnet": "claude-sonnet-4", "haiku": "claude-3-5-haiku"}
+
+# Message Batches are billed at half price
+BATCH_BACKENDS = ("batch", "fake-batch")
+BATCH_DISCOUNT = 0.5
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+class BudgetExceeded(Exception):
+    """A call was refused because the project's or the run's budget is spent."""
+
+def model_pricing(model):
+    """Return the per-million-token prices of a model, matched by its name without the date suffix."""
+    for prefix in sorted(PRICING, key=len, reverse=True):
+        if model.startswith(prefix):
+            return PRICING[prefix]
+    for family, prefix in FAMILY_PRICING.items():
+        if family in model:
+            return PRICING[prefix]
+    raise ValueError(f"No pricing for model '{model}'; add it to utils.ledger.PRICING")
+
+def call_cost(model, usage):
+    """Return the cost in US dollars of one call's token usage."""
+    prices = model_pricing(model)
+    cost = ((usage.get("input_tokens") or 0) * prices["input"]
+            + (usage.get("output_tokens") or 0) * prices["output"]
+            + (usage.get("cache_read_input_tokens") or 0) * prices["cache_read"]
+            + (usage.get("cache_creation_input_tokens") or 0) * prices["cache_write"]) / 1_000_000
+    if os.getenv("LLM_BACKEND", "api") in BATCH_BACKENDS:
+        cost *= BATCH_DISCOUNT
+    return cost
+
+def _budget(name):
+    value = os.getenv(name)
+    return float(value) if value else None
+
+class Ledger:
+    """Append-only log of call costs with running totals per project and for this run."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("LEDGER_PATH", DEFAULT_LEDGER_PATH)
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        self.project_budget = _budget("BUDGET_PROJECT_USD")
+        self.run_budget = _budget("BUDGET_RUN_USD")
+        self.soft_limit = float(os.getenv("BUDGET_SOFT_LIMIT", DEFAULT_SOFT_LIMIT))
+        self.fallback_model = os.getenv("BUDGET_FALLBACK_MODEL", DEFAULT_FALLBACK_MODEL)
+        self.max_followups = int(os.getenv("BUDGET_MAX_FOLLOWUPS", DEFAULT_MAX_FOLLOWUPS))
+        model_pricing(self.fallback_model)
+        self.run_cost = 0.0
+        self.project_costs = {}
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        project = entry.get("project")
+                        self.project_costs[project] = self.project_costs.get(project, 0.0) + entry["cost"]
+        except FileNotFoundError:
+            pass
+
+    def record(self, result, model, agent=None):
+        """Add the cost of a ClaudeResponse to the ledger and return it; cache hits cost nothing."""
+        if result.cached:
+            return 0.0
+        context = current_context()
+        usage = result.usage or {}
+        cost = call_cost(model, usage)
+        entry = {
+            "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+            "run": self.run_id,
+            "workflow": context.get("workflow"),
+            "project": context.get("project"),
+            "stage": context.get("stage"),
+            "agent": agent,
+            "model": model,
+            "input_tokens": usage.get("input_tokens") or 0,
+            "output_tokens": usage.get("output_tokens") or 0,
+            "cache_read_input_tokens": usage.get("cache_read_input_tokens") or 0,
+            "cache_creation_input_tokens": usage.get("cache_creation_input_tokens") or 0,
+            "cost": round(cost, 6)
+        }
+        with self._lock:
+            self.run_cost += cost
+            project = entry["project"]
+            self.project_costs[project] = self.project_costs.get(project, 0.0) + cost
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return cost
+
+    def project_cost(self, project):
+        with self._lock:
+            return self.project_costs.get(project, 0.0)
+
+    def _spent(self, project):
+        """Return the largest fraction of any budget spent, for project and this run."""
+        fractions = [0.0]
+        with self._lock:
+            if self.run_budget is not None:
+                fractions.append(self.run_cost / self.run_budget if self.run_budget else float("inf"))
+            if self.project_budget is not None and project is not None:
+                spent = self.project_costs.get(project, 0.0)
+                fractions.append(spent / self.project_budget if self.project_budget else float("inf"))
+        return max(fractions)
+
+    def model_for(self, model):
+        """Return the model the next call in the current project should use.
+
+        Raises BudgetExceeded when a budget is spent, and returns the fallback
+        model instead of model once one is past the soft limit.
+        """
+        project = current_context().get("project")
+        spent = self._spent(project)
+        if spent >= 1:
+            raise BudgetExceeded(
+                f"Budget exhausted: ${self.run_cost:.2f} spent this run"
+                + (f", ${self.project_cost(project):.2f} on project '{project}'" if project else "")
+                + f" (limits: run {_limit(self.run_budget)}, project {_limit(self.project_budget)})")
+        if spent >= self.soft_limit and model_pricing(self.fallback_model)["output"] < model_pricing(model)["output"]:
+            return self.fallback_model
+        return model
+
+    def followup_cap(self, project):
+        """Return how many follow-up rounds a stage of project may have, or None for no cap."""
+        if self._spent(project) >= self.soft_limit:
+            return self.max_followups
+        return None
+
+def _limit(budget):
+    return "none" if budget is None else f"${budget:.2f}"
+
+def get_ledger():
+    """Return the cost ledger shared by every agent in this process."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger()
+        return _ledger
+
+def load_entries(path=None, project=None):
+    entries = []
+    try:
+        with open(path or os.getenv("LEDGER_PATH", DEFAULT_LEDGER_PATH), "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if project is None or entry.get("project") == project:
+                        entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+def print_costs(path=None, project=None):
+    """Print spend and token totals per run, project, stage and model from the ledger."""
+    entries = load_entries(path, project)
+    if not entries:
+        print(f"No costs recorded in {path or os.getenv('LEDGER_PATH', DEFAULT_LEDGER_PATH)}"
+              + (" for that project." if project else "."))
+        return
+    total = sum(entry["cost"] for entry in entries)
+    print(f"${total:.4f} across {len(entries)} calls")
+    for key, heading in (("run", "Run"), ("project", "Project"), ("stage", "Stage"), ("model", "Model")):
+        groups = {}
+        for entry in entries:
+            group = groups.setdefault(entry.get(key) or "-", {"calls": 0, "input": 0, "output": 0, "cached": 0, "cost": 0.0})
+            group["calls"] += 1
+            group["input"] += entry["input_tokens"]
+            group["output"] += entry["output_tokens"]
+            group["cached"] += entry["cache_read_input_tokens"]
+            group["cost"] += entry["cost"]
+        print(f"\n{heading:<30} {'calls':>6} {'in tokens':>10} {'out tokens':>11} {'cache read':>11} {'cost':>10}")
+        for name, g in sorted(groups.items(), key=lambda item: -item[1]["cost"]):
+            print(f"{name:<30} {g['calls']:>6} {g['input']:>10} {g['output']:>11} {g['cached']:>11} {'$' + format(g['cost'], '.4f'):>10}")
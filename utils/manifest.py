@@ -0,0 +1,73 @@
+import os
+import json
+import hashlib
+import tempfile
+from datetime import datetime
+# Input hashes use the same canonical JSON hashing as response-cache keys
+from .response_cache import stable_hash
+
+MANIFEST_FILENAME = "manifest.json"
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ProjectManifest:
+    """Per-project record of the workflow and how each stage's current artifact was produced.
+
+    The project entry holds the workflow key, its status and timestamps.
+    Every stage entry holds the artifact file name and catalog version, the
+    hash of the inputs it was generated from (model, system prompt, rendered
+    prompt and upstream content hashes), the hash of its content and the
+    follow-up answers given while generating it. A rerun compares input
+    hashes to decide which stages are still up to date.
+    """
+
+    def __init__(self, project_dir):
+        self.path = os.path.join(project_dir, MANIFEST_FILENAME)
+        self.exists = os.path.exists(self.path)
+        self.data = {"workflow": None, "status": None, "created_at": None, "updated_at": None, "stages": {}}
+        if self.exists:
+            with open(self.path, "r") as f:
+                self.data.update(json.load(f))
+
+    @property
+    def workflow(self):
+        return self.data["workflow"]
+
+    @property
+    def status(self):
+        return self.data["status"]
+
+    def set_project(self, workflow, status):
+        self.data["workflow"] = workflow
+        self.data["status"] = status
+        self.save()
+
+    def stage(self, name):
+        """Return the entry for a stage, or None if it has never completed."""
+        return self.data["stages"].get(name)
+
+    def record_stage(self, name, file, version, inputs_hash, content_hash, answers=()):
+        self.data["stages"][name] = {
+            "file": file,
+            "version": version,
+            "status": "complete",
+            "inputs_hash": inputs_hash,
+            "content_hash": content_hash,
+            "answers": list(answers),
+            "updated_at": datetime.now().isoformat(timespec="seconds")
+        }
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run never leaves it half-written."""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        self.data["created_at"] = self.data["created_at"] or timestamp
+        self.data["updated_at"] = timestamp
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.exists = True
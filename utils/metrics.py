@@ -0,0 +1,142 @@
+"""
+Per-call metrics: one JSONL record for every model call, and reports over them.
+
+Each record holds where the call was made (workflow, project, stage, taken
+from the metrics context the workflow runner sets around each stage), the
+agent and model, latency and time to first token, token usage, stop_reason,
+retries, continuations, whether the response cache answered it and how the
+reply's envelope was parsed. Records are appended to LLM_METRICS_PATH
+(default .cache/metrics.jsonl); LLM_METRICS=off turns logging off.
+"""
+import os
+import json
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from .hedging import percentile
+
+DEFAULT_METRICS_PATH = os.path.join(".cache", "metrics.jsonl")
+
+# Fields describing where a call was made; set per stage and inherited by the tasks it starts
+_call_context = contextvars.ContextVar("call_context", default={})
+_write_lock = threading.Lock()
+
+def metrics_enabled():
+    return os.getenv("LLM_METRICS", "on").lower() != "off"
+
+def metrics_path():
+    return os.getenv("LLM_METRICS_PATH", DEFAULT_METRICS_PATH)
+
+@contextmanager
+def metrics_context(**fields):
+    """Attach fields such as workflow, project and stage to every call logged inside the block."""
+    token = _call_context.set({**_call_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+def current_context():
+    """Return the fields the enclosing metrics contexts set, e.g. {"workflow", "project", "stage"}."""
+    return dict(_call_context.get())
+
+def log_call(result, model, agent=None, parse=None):
+    """Append the metrics record of one ClaudeClient call."""
+    if not metrics_enabled():
+        return
+    usage = result.usage or {}
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+        **_call_context.get(),
+        "agent": agent,
+        "model": model,
+        "latency": None if result.latency is None else round(result.latency, 4),
+        "ttft": None if result.ttft is None else round(result.ttft, 4),
+        "input_tokens": usage.get("input_tokens") or 0,
+        "output_tokens": usage.get("output_tokens") or 0,
+        "cache_read_input_tokens": usage.get("cache_read_input_tokens") or 0,
+        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens") or 0,
+        "stop_reason": result.stop_reason,
+        "retries": result.retries,
+        "continuations": result.continuations,
+        "cached": result.cached,
+        "parse": parse
+    }
+    path = metrics_path()
+    line = json.dumps(record) + "\n"
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One short append per record, so concurrent processes don't interleave lines
+        with open(path, "a") as f:
+            f.write(line)
+
+def load_records(path=None, project=None, workflow=None):
+    """Read the metrics log, optionally only the calls of one project or workflow."""
+    records = []
+    try:
+        with open(path or metrics_path(), "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if project and record.get("project") != project:
+                    continue
+                if workflow and record.get("workflow") != workflow:
+                    continue
+                records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+def summarize(records, key):
+    """Group records by key and return {group: summary} with latency percentiles, tokens and failure counts.
+
+    Latency and time-to-first-token percentiles only cover calls that went to
+    the API; response-cache hits are counted separately.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get(key) or "-", []).append(record)
+    summaries = {}
+    for group, members in sorted(groups.items()):
+        live = [record for record in members if not record.get("cached")]
+        latencies = [record["latency"] for record in live if record.get("latency") is not None]
+        ttfts = [record["ttft"] for record in live if record.get("ttft") is not None]
+        summaries[group] = {
+            "calls": len(members),
+            "cached": len(members) - len(live),
+            "latency_total": sum(latencies),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": percentile(latencies, 95),
+            "latency_p99": percentile(latencies, 99),
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p95": percentile(ttfts, 95),
+            "input_tokens": sum(record["input_tokens"] for record in live),
+            "output_tokens": sum(record["output_tokens"] for record in live),
+            "retries": sum(record.get("retries") or 0 for record in live),
+            "truncated": sum(1 for record in members if record.get("stop_reason") == "max_tokens"),
+            "parse_failures": sum(1 for record in members if record.get("parse") == "failed")
+        }
+    return summaries
+
+def _seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+def print_stats(path=None, project=None, workflow=None):
+    """Print latency percentiles and token usage per agent, stage and workflow from the metrics log."""
+    records = load_records(path, project, workflow)
+    if not records:
+        print(f"No calls recorded in {path or metrics_path()}" + (" for that filter." if project or workflow else "."))
+        return
+    projects = {record.get("project") for record in records}
+    print(f"{len(records)} calls across {len(projects)} project(s) from {path or metrics_path()}")
+    for key, heading in (("workflow", "Workflow"), ("stage", "Stage"), ("agent", "Agent")):
+        summaries = summarize(records, key)
+        print(f"\n{heading:<26} {'calls':>6} {'cached':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'ttft p50':>9} "
+              f"{'total':>9} {'in tokens':>10} {'out tokens':>11} {'retries':>8} {'parse fail':>10}")
+        for group, s in sorted(summaries.items(), key=lambda item: -item[1]["latency_total"]):
+            print(f"{group:<26} {s['calls']:>6} {s['cached']:>6} {_seconds(s['latency_p50']):>8} "
+                  f"{_seconds(s['latency_p95']):>8} {_seconds(s['latency_p99']):>8} {_seconds(s['ttft_p50']):>9} "
+                  f"{_seconds(s['latency_total']):>9} {s['input_tokens']:>10} {s['output_tokens']:>11} "
+                  f"{s['retries']:>8} {s['parse_failures']:>10}")
@@ -3,22 +3,94 @@ System prompts and templates for different agent roles and product types.
 Organized by:
 1. Role (CTO, Product Manager, Engineering Manager, Task Generator)
 2. Product Type (Prototype vs Robust/Enterprise)
+
+Templates that embed upstream documents are split in two: a *_CONTEXT_TEMPLATE
+holding the documents, which stay the same across follow-up rounds and are sent
+first so the provider can cache them, and a *_TEMPLATE with the instructions.
 """
 
 # ============================================================================
 # Common Components
 # ============================================================================
 
-JSON_RESPONSE_FORMAT = """You MUST return a JSON response in the following format:
+JSON_RESPONSE_FORMAT = """You MUST return a JSON response in the following format, with the keys in this order:
 {
   "command": "follow-up" OR "pass-on",
-  "content": "your detailed response in markdown format",
-  "questions": ["question1", "question2", ...] (only if command is "follow-up")
+  "questions": ["question1", "question2", ...] (only if command is "follow-up"),
+  "content": "your detailed response in markdown format"
 }"""
 
+# The same envelope as a tool schema. Agents force a call to this tool so the
+# reply arrives as validated JSON; the properties keep the order above so the
+# questions stream before the content.
+RESPONSE_TOOL = {
+    "name": "submit_response",
+    "description": "Submit your response to the user. Always call this tool exactly once.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "command": {
+                "type": "string",
+                "enum": ["follow-up", "pass-on"],
+                "description": "\"follow-up\" if you need more information from the user, otherwise \"pass-on\""
+            },
+            "questions": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Specific questions for the user (only if command is \"follow-up\")"
+            },
+            "content": {
+                "type": "string",
+                "description": "Your detailed response in markdown format"
+            }
+        },
+        "required": ["command", "content"]
+    }
+}
+
+# Appended to an agent's prompt for its triage pre-pass, which decides whether
+# the agent can write its document yet without writing it
+TRIAGE_INSTRUCTIONS = """
+
+TRIAGE ONLY: do not write the document yet. Decide whether the information above is
+sufficient for you to write a complete, high-quality response. If it is not, set command
+to "follow-up" and list only the specific questions whose answers you need. If it is,
+set command to "pass-on" with no questions."""
+
+# The triage verdict as a tool schema: the envelope without its content
+TRIAGE_TOOL = {
+    "name": "submit_triage",
+    "description": "Submit whether you need more information before writing your response. Always call this tool exactly once.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "command": RESPONSE_TOOL["input_schema"]["properties"]["command"],
+            "questions": RESPONSE_TOOL["input_schema"]["properties"]["questions"]
+        },
+        "required": ["command"]
+    }
+}
+
+# Sent to every agent of a workflow at once before any stage runs, so that all of
+# their questions can be put to the user in a single form
+GATHER_TEMPLATE = """A new project is about to start. Here is the user's description of it:
+
+{description}
+
+Before any work starts, decide whether you have what you need to do your part of this project
+well. If not, set command to "follow-up" and list only the specific questions whose answers you
+need and cannot reasonably assume. Other specialists are asking about their own areas, so keep
+to yours. If you need nothing more, set command to "pass-on" with no questions. Do not write
+any other part of your response yet."""
+
 FOLLOW_UP_INSTRUCTIONS = """If you need more information, set command to "follow-up" and provide specific questions.
 If you have enough information, set command to "pass-on" """
 
+ADDITIONAL_INFO_TEMPLATE = """
+
+Additional Information from the user (answers to your earlier follow-up questions):
+{additional_info}"""
+
 # ============================================================================
 # Task Generator Prompts (Common to both workflows)
 # ============================================================================
@@ -41,13 +113,13 @@ IMPORTANT: Each task should represent approximately one "story point" of work -
 When creating the task list, you should **directly include any schemas, code, or other technical details** that are present in the implementation plan. Do not summarize or omit these details—copy them into the relevant sections of the task list so that engineers have all the technical context they need to start work immediately.
 """
 
-TASK_GENERATOR_TEMPLATE = """Implementation Plan:
+TASK_GENERATOR_CONTEXT_TEMPLATE = """Implementation Plan:
 {implementation_plan}
 
 Technical Approach:
-{technical_strategy}
+{technical_strategy}"""
 
-Please convert this implementation plan into a comprehensive list of 1-point engineering tasks. 
+TASK_GENERATOR_TEMPLATE = """Please convert this implementation plan into a comprehensive list of 1-point engineering tasks. 
 
 Each task should:
 1. Be completable in approximately half a day by a single engineer
@@ -82,10 +154,10 @@ IMPORTANT: Focus on pragmatic, quick-to-implement solutions. Avoid deep discussi
 
 {FOLLOW_UP_INSTRUCTIONS}and provide a practical technical approach."""
 
-PROTOTYPE_CTO_TEMPLATE = """Prototype Requirements:
-{requirements}
+PROTOTYPE_CTO_CONTEXT_TEMPLATE = """Prototype Requirements:
+{requirements}"""
 
-Please evaluate these requirements and either:
+PROTOTYPE_CTO_TEMPLATE = """Please evaluate these requirements and either:
 1. Ask clarifying questions about the technical implementation needed
 2. Generate a practical technical approach including:
    - Core technologies to use
@@ -149,13 +221,13 @@ IMPORTANT: Focus entirely on getting a working prototype built quickly. Avoid ov
 
 {FOLLOW_UP_INSTRUCTIONS}and provide a practical implementation plan."""
 
-PROTOTYPE_ENGINEERING_MANAGER_TEMPLATE = """Prototype Requirements:
+PROTOTYPE_ENGINEERING_MANAGER_CONTEXT_TEMPLATE = """Prototype Requirements:
 {requirements}
 
 Technical Approach:
-{technical_strategy}
+{technical_strategy}"""
 
-Please review these requirements and either:
+PROTOTYPE_ENGINEERING_MANAGER_TEMPLATE = """Please review these requirements and either:
 1. Ask clarifying questions about implementation specifics, or
 2. Create a practical prototype implementation plan including:
 
@@ -241,12 +313,13 @@ IMPORTANT: Focus on building a complete product strategy that can evolve over ti
 
 {FOLLOW_UP_INSTRUCTIONS}and provide comprehensive product requirements."""
 
+ROBUST_PRODUCT_MANAGER_CONTEXT_TEMPLATE = """Technical Approach:
+{technical_strategy}"""
+
+# The description grows with every follow-up answer, so it comes after the cached technical approach
 ROBUST_PRODUCT_MANAGER_TEMPLATE = """Project Description:
 {description}
 
-Technical Approach:
-{technical_strategy}
-
 Please evaluate this project from a comprehensive product strategy perspective and either:
 1. Ask clarifying questions about the product vision and requirements
 2. Generate detailed product requirements including:
@@ -284,13 +357,13 @@ IMPORTANT: Focus on building a solid foundation for a product that will grow and
 
 {FOLLOW_UP_INSTRUCTIONS}and provide a comprehensive implementation plan."""
 
-ROBUST_ENGINEERING_MANAGER_TEMPLATE = """Product Requirements:
+ROBUST_ENGINEERING_MANAGER_CONTEXT_TEMPLATE = """Product Requirements:
 {requirements}
 
 Technical Approach:
-{technical_strategy}
+{technical_strategy}"""
 
-Please review these requirements and either:
+ROBUST_ENGINEERING_MANAGER_TEMPLATE = """Please review these requirements and either:
 1. Ask clarifying questions about implementation specifics, or
 2. Create a comprehensive implementation plan including:
 
@@ -0,0 +1,180 @@
+"""
+Token-bucket rate limiter shared by every thread and process using an API key on this host.
+
+Three buckets, one each for requests, input tokens and output tokens per
+minute, refill continuously and live in a small JSON state file guarded by
+an exclusive file lock, so several copies of main.py or a batch run draw
+from the same budget. Before each call ClaudeClient reserves one request,
+the estimated prompt tokens and max_tokens of output; once the call returns
+the reservation's tokens are settled against the usage the API reported. A
+call that fails or is cancelled gets back the tokens it did not use; its
+request stays counted, since it was sent.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_STATE_DIR = os.path.join(".cache", "ratelimit")
+
+# Fraction of each limit the buckets refill to, leaving room for clock skew and estimation error
+DEFAULT_HEADROOM = 0.95
+
+# Rough characters per token, used to estimate a prompt's size before sending it
+CHARS_PER_TOKEN = 4
+
+BUCKETS = ("requests", "input_tokens", "output_tokens")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def estimate_input_tokens(request_params):
+    """Estimate the input tokens of a request from the length of its system prompt, tools and messages."""
+    payload = [request_params.get("system"), request_params.get("tools"), request_params["messages"]]
+    return len(json.dumps(payload, ensure_ascii=False)) // CHARS_PER_TOKEN + 1
+
+@contextmanager
+def _locked(path):
+    """Hold an exclusive lock on path across processes."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class RateLimiter:
+    """Requests, input-token and output-token buckets stored in a lock-protected state file.
+
+    limits maps bucket names to per-minute limits; a bucket without a limit
+    is not enforced.
+    """
+
+    def __init__(self, path, limits, headroom=DEFAULT_HEADROOM):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.capacity = {name: limit * headroom for name, limit in limits.items() if limit}
+        # Every bucket refills its whole capacity over one minute
+        self.rate = {name: capacity / 60 for name, capacity in self.capacity.items()}
+        self._thread_lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save(self, state):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def _refill(self, state, now):
+        levels = {}
+        for name, capacity in self.capacity.items():
+            bucket = state.get(name) or {"level": capacity, "updated": now}
+            elapsed = max(0.0, now - bucket["updated"])
+            levels[name] = min(capacity, bucket["level"] + elapsed * self.rate[name])
+        return levels
+
+    def _update(self, change):
+        """Refill, apply change(levels) under the locks and save; returns what change returns."""
+        with self._thread_lock, _locked(self.lock_path):
+            now = time.time()
+            levels = self._refill(self._load(), now)
+            result = change(levels)
+            self._save({name: {"level": level, "updated": now} for name, level in levels.items()})
+            return result
+
+    def _try_take(self, amounts):
+        """Take amounts from the buckets if they all have room; otherwise return the seconds to wait."""
+
+        def take(levels):
+            wait = 0.0
+            for name, amount in amounts.items():
+                if name in levels:
+                    # A single call bigger than a whole bucket only has to wait for a full bucket
+                    needed = min(amount, self.capacity[name])
+                    wait = max(wait, (needed - levels[name]) / self.rate[name])
+            if wait > 0:
+                return wait
+            for name, amount in amounts.items():
+                if name in levels:
+                    levels[name] -= amount
+            return 0.0
+        return self._update(take)
+
+    def _reservation(self, request_params):
+        return {"requests": 1,
+                "input_tokens": estimate_input_tokens(request_params),
+                "output_tokens": request_params.get("max_tokens", 0)}
+
+    def acquire(self, request_params):
+        """Block until the buckets have room for request_params and return the reservation taken."""
+        reservation = self._reservation(request_params)
+        while True:
+            wait = self._try_take(reservation)
+            if not wait:
+                return reservation
+            time.sleep(wait)
+
+    async def acquire_async(self, request_params):
+        reservation = self._reservation(request_params)
+        while True:
+            wait = await asyncio.to_thread(self._try_take, reservation)
+            if not wait:
+                return reservation
+            await asyncio.sleep(wait)
+
+    def settle(self, reservation, usage):
+        """Give back the tokens of a reservation the call did not use, or take the shortfall.
+
+        The reserved request is kept whatever the usage, as the call was made.
+        """
+        actual = {"input_tokens": sum(usage.get(field) or 0 for field in ("input_tokens", "cache_creation_input_tokens")),
+                  "output_tokens": usage.get("output_tokens") or 0}
+
+        def adjust(levels):
+            for name, amount in actual.items():
+                if name in levels:
+                    levels[name] = min(self.capacity[name], levels[name] + reservation[name] - amount)
+        self._update(adjust)
+
+def get_rate_limiter(api_key=None):
+    """Return the limiter for an API key, or None when no ANTHROPIC_RPM/ITPM/OTPM limit is set."""
+    limits = {
+        "requests": float(os.getenv("ANTHROPIC_RPM", 0)),
+        "input_tokens": float(os.getenv("ANTHROPIC_ITPM", 0)),
+        "output_tokens": float(os.getenv("ANTHROPIC_OTPM", 0))
+    }
+    if not any(limits.values()):
+        return None
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY") or ""
+    # Processes sharing a key share a state file; the key itself is never written to disk
+    key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    directory = os.getenv("RATE_LIMIT_DIR", DEFAULT_STATE_DIR)
+    with _limiters_lock:
+        limiter = _limiters.get(key_id)
+        if limiter is None:
+            limiter = _limiters[key_id] = RateLimiter(os.path.join(directory, f"{key_id}.json"), limits)
+        return limiter
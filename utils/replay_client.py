@@ -0,0 +1,54 @@
+"""
+A ClaudeClient backend that answers from a recorded cassette instead of the API.
+
+With LLM_BACKEND=replay and LLM_REPLAY=<cassette>, get_client() returns a
+ReplayClaudeClient. Each request is looked up by its key and the recorded
+text is streamed back in chunks, so workflows run deterministically,
+offline and without an API key. A request the cassette does not contain
+raises CassetteMiss.
+"""
+import os
+from .claude_client import ClaudeClient, ClaudeResponse, EARLY_STOP, _split_prefill
+from .response_cache import make_cache_key
+from .cassette import Cassette
+
+# Characters per on_text call when replaying a response
+REPLAY_CHUNK_SIZE = 64
+
+class CassetteMiss(KeyError):
+    """The cassette has no recorded response for a request."""
+
+class ReplayClaudeClient(ClaudeClient):
+    """ClaudeClient that answers from a cassette instead of the API."""
+
+    def __init__(self, api_key=None, cassette=None):
+        path = os.getenv("LLM_REPLAY")
+        if cassette is None and not path:
+            raise ValueError("LLM_BACKEND=replay needs LLM_REPLAY set to a cassette file")
+        super().__init__(api_key)
+        # Replaying never touches the network, so it needs no Anthropic client, pacing,
+        # hedging or key, and does not record its own replies
+        self.client = None
+        self.rate_limiter = None
+        self.hedge_policy = None
+        self.recorder = None
+        self.cassette = cassette or Cassette(path)
+
+    def _replay(self, request_params, on_text):
+        recorded = self.cassette.lookup(request_params)
+        if recorded is None:
+            raise CassetteMiss(f"No recorded response in {self.cassette.path} for request "
+                               f"{make_cache_key(request_params)[:12]} (model {request_params['model']})")
+        response = ClaudeResponse.from_dict(recorded)
+        # The recorded reply starts with the request's prefill, which the client stitches back on itself
+        _, prefill = _split_prefill(request_params)
+        if prefill and response.text.startswith(prefill):
+            response.text = response.text[len(prefill):]
+        if on_text:
+            for start in range(0, len(response.text), REPLAY_CHUNK_SIZE):
+                if on_text(response.text[start:start + REPLAY_CHUNK_SIZE]):
+                    return ClaudeResponse(response.text[:start + REPLAY_CHUNK_SIZE], EARLY_STOP, response.usage)
+        return response
+
+    async def _send_async(self, request_params, on_text=None, timeout=None, usage=None):
+        return self._replay(request_params, on_text)
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+# Cache location and eviction limits, overridable through the environment
+DEFAULT_CACHE_DIR = os.path.join(".cache", "responses")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+# Cache modes: "on" reads and writes, "refresh" skips reads but stores new responses, "off" does neither
+CACHE_MODES = ("on", "refresh", "off")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def stable_hash(value):
+    """sha256 of a JSON-serializable value, independent of dict ordering."""
+    canonical = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def make_cache_key(request_params):
+    """Content-address a request: model, system prompt, messages, max_tokens and sampling params."""
+    return stable_hash(request_params)
+
+class ResponseCache:
+    """On-disk store of LLM responses with size- and age-based LRU eviction."""
+
+    def __init__(self, directory=None, max_bytes=None, max_age=None, mode=None):
+        self.directory = directory or os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_bytes or os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_age = float(max_age or os.getenv("LLM_CACHE_MAX_AGE", DEFAULT_MAX_AGE))
+        self.mode = (mode or os.getenv("LLM_CACHE", "on")).lower()
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"LLM_CACHE must be one of {', '.join(CACHE_MODES)}, got '{self.mode}'")
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key, mode=None):
+        """Return the cached response for a key, or None on a miss."""
+        mode = mode or self.mode
+        if mode != "on":
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r") as f:
+                value = json.load(f)
+            # Touch the entry so eviction treats it as recently used; another
+            # process may have evicted it since the read, which counts as a miss
+            os.utime(path, None)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key, value, mode=None):
+        """Store a response atomically and evict old entries if the cache is over budget."""
+        mode = mode or self.mode
+        if mode == "off":
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.writes += 1
+            if self._size is not None:
+                self._size += os.path.getsize(path)
+            over_budget = self._size is None or self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes."""
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        with self._lock:
+            self._size = sum(size for _, size, _ in entries)
+        entries.sort()
+        for mtime, size, path in entries:
+            if now - mtime > self.max_age or self._size > self.max_bytes:
+                self._remove(path)
+
+    def clear(self):
+        """Remove every cached response."""
+        self._size = None
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                self._remove(os.path.join(root, name))
+        self._size = 0
+
+    def stats(self):
+        """Return the hit/miss counters for this process."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+def get_response_cache():
+    """Return the response cache shared by all clients in this process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,116 @@
+"""
+Retry policy for API calls: which errors are worth retrying and how long to wait.
+
+Errors are grouped into classes with their own attempt limits and backoff:
+rate limits (429), overloads and server errors (529, 5xx and error events
+sent in the middle of a stream) and dropped connections or timeouts. Waits
+grow exponentially with full jitter, so clients that failed together don't
+retry together, and never undercut the server's retry-after or rate-limit
+reset headers.
+"""
+import os
+import random
+import threading
+from datetime import datetime, timezone
+import httpx
+import anthropic
+
+# Retry settings per error class: retries after the first attempt, first backoff and backoff cap in seconds
+RETRY_POLICIES = {
+    "rate_limit": {"max_retries": 6, "base_delay": 2.0, "max_delay": 60.0},
+    "overloaded": {"max_retries": 5, "base_delay": 1.0, "max_delay": 30.0},
+    "connection": {"max_retries": 4, "base_delay": 0.5, "max_delay": 10.0}
+}
+
+# Longest wait accepted from a retry-after or rate-limit reset header
+MAX_SERVER_DELAY = 300.0
+
+_RATE_LIMIT_RESET_HEADERS = (
+    "anthropic-ratelimit-requests-reset",
+    "anthropic-ratelimit-tokens-reset",
+    "anthropic-ratelimit-input-tokens-reset",
+    "anthropic-ratelimit-output-tokens-reset"
+)
+
+_retry_lock = threading.Lock()
+_retry_totals = dict.fromkeys(RETRY_POLICIES, 0)
+
+def _error_type(error):
+    """The "type" of an API error body, e.g. "overloaded_error" for an error event sent mid-stream."""
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        details = body.get("error", body)
+        if isinstance(details, dict):
+            return details.get("type")
+    return None
+
+def classify_error(error):
+    """Return the retry class of an exception, or None if retrying would not help."""
+    if isinstance(error, (anthropic.APIConnectionError, httpx.TransportError)):
+        # Covers timeouts and connections reset while a response is streaming
+        return "connection"
+    if isinstance(error, anthropic.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, anthropic.APIStatusError):
+        if error.status_code >= 500:
+            return "overloaded"
+        error_type = _error_type(error)
+        if error_type == "rate_limit_error":
+            return "rate_limit"
+        if error_type in ("overloaded_error", "api_error"):
+            return "overloaded"
+    return None
+
+def _server_delay(error):
+    """Seconds the server asked us to wait, from retry-after or the rate-limit reset headers."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    # A 429 without retry-after: wait for the earliest limit that is exhausted to reset
+    resets = []
+    now = datetime.now(timezone.utc)
+    for header in _RATE_LIMIT_RESET_HEADERS:
+        if header in headers:
+            try:
+                reset = datetime.fromisoformat(headers[header].replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            resets.append((reset - now).total_seconds())
+    if resets and isinstance(error, anthropic.RateLimitError):
+        return max(0.0, min(resets))
+    return None
+
+def retry_delay(error, retries):
+    """Return how long to wait before retrying error after retries earlier retries, or None to give up.
+
+    LLM_MAX_RETRIES caps the retries of every class (0 turns retrying off).
+    """
+    error_class = classify_error(error)
+    if error_class is None:
+        return None
+    policy = RETRY_POLICIES[error_class]
+    max_retries = policy["max_retries"]
+    if os.getenv("LLM_MAX_RETRIES"):
+        max_retries = min(max_retries, int(os.getenv("LLM_MAX_RETRIES")))
+    if retries >= max_retries:
+        return None
+    delay = random.uniform(0, min(policy["max_delay"], policy["base_delay"] * 2 ** retries))
+    server_delay = _server_delay(error)
+    if server_delay is not None:
+        delay = max(delay, min(server_delay, MAX_SERVER_DELAY))
+    with _retry_lock:
+        _retry_totals[error_class] += 1
+    return delay
+
+def get_retry_totals():
+    """Return the number of retries made by this process, per error class."""
+    with _retry_lock:
+        return dict(_retry_totals)
@@ -0,0 +1,119 @@
+"""
+Model routing: which model, max_tokens and timeout each agent uses.
+
+Routes come from the YAML file ROUTING_CONFIG names (default routing.yaml, if
+it exists), with four levels that override each other in this order:
+
+    defaults:                       # every agent
+      model: claude-3-7-sonnet-20250219
+    workflows:
+      cto:                          # every agent in the CTO workflow
+        model: claude-sonnet-4-20250514
+        agents:
+          RobustEngineeringManager: # one agent in one workflow
+            max_tokens: 10000
+    agents:
+      TaskGenerator:                # one agent in every workflow
+        timeout: 900
+
+i.e. defaults, then the workflow, then the agent, then the agent within the
+workflow. Without a max_tokens the agent's own size for the call applies,
+and without a timeout the client's.
+
+triage: true gives every round a small pre-pass that only decides whether
+the agent has follow-up questions; rounds that do are answered by it alone,
+and only the pass-on round generates the full document. followup_model runs
+that pre-pass on a faster model (and implies triage unless triage is set to
+false); without it the pre-pass uses the route's model.
+"""
+import os
+import threading
+import yaml
+from .claude_client import DEFAULT_MODEL
+from .ledger import model_pricing
+
+DEFAULT_ROUTING_PATH = "routing.yaml"
+ROUTE_KEYS = ("model", "max_tokens", "timeout", "followup_model", "triage")
+
+_routing = None
+_routing_lock = threading.Lock()
+
+class Route:
+    """The settings one agent's calls are made with."""
+
+    def __init__(self, model=DEFAULT_MODEL, max_tokens=None, timeout=None, followup_model=None, triage=None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.followup_model = followup_model
+        # None leaves it to followup_model; False turns triage off even when one is inherited
+        self.triage = triage
+
+    def __repr__(self):
+        return (f"Route(model={self.model!r}, max_tokens={self.max_tokens!r}, timeout={self.timeout!r}, "
+                f"followup_model={self.followup_model!r}, triage={self.triage!r})")
+
+def _check_route(settings, where):
+    if not isinstance(settings, dict):
+        raise ValueError(f"Routing {where} must be a mapping of settings")
+    unknown = set(settings) - set(ROUTE_KEYS) - {"agents"}
+    if unknown:
+        raise ValueError(f"Unknown routing setting(s) {', '.join(sorted(unknown))} in {where}; "
+                         f"expected {', '.join(ROUTE_KEYS)}")
+    for key in ("model", "followup_model"):
+        if settings.get(key):
+            # Every routed model must be priced, so budgets can be enforced on it
+            model_pricing(settings[key])
+    if "triage" in settings and not isinstance(settings["triage"], bool):
+        raise ValueError(f"Routing {where}: triage must be true or false, got {settings['triage']!r}")
+    for key in ("max_tokens", "timeout"):
+        if settings.get(key) is not None and not (isinstance(settings[key], (int, float)) and settings[key] > 0):
+            raise ValueError(f"Routing {where}: {key} must be a positive number, got {settings[key]!r}")
+
+class Routing:
+    """Resolves the Route of an agent in a workflow from a routing config."""
+
+    def __init__(self, config=None, path=None):
+        config = config or {}
+        self.path = path
+        self.defaults = config.get("defaults") or {}
+        self.workflows = config.get("workflows") or {}
+        self.agents = config.get("agents") or {}
+        unknown = set(config) - {"defaults", "workflows", "agents"}
+        if unknown:
+            raise ValueError(f"Unknown routing section(s): {', '.join(sorted(unknown))}")
+        _check_route(self.defaults, "defaults")
+        if "agents" in self.defaults:
+            raise ValueError("Routing defaults cannot have agents; use the top-level agents section")
+        for name, settings in self.agents.items():
+            _check_route(settings, f"agents.{name}")
+        for workflow, settings in self.workflows.items():
+            _check_route(settings, f"workflows.{workflow}")
+            for name, agent_settings in (settings.get("agents") or {}).items():
+                _check_route(agent_settings, f"workflows.{workflow}.agents.{name}")
+
+    def route(self, agent, workflow=None):
+        """Return the Route for the agent class name agent in workflow (a workflow key or None)."""
+        workflow_settings = self.workflows.get(workflow) or {}
+        settings = {}
+        for level in (self.defaults, workflow_settings, self.agents.get(agent) or {},
+                      (workflow_settings.get("agents") or {}).get(agent) or {}):
+            settings.update((key, value) for key, value in level.items() if key in ROUTE_KEYS)
+        return Route(**settings)
+
+def load_routing(path=None):
+    """Read a routing config; a missing default config means every agent uses the defaults."""
+    explicit = path or os.getenv("ROUTING_CONFIG")
+    path = explicit or DEFAULT_ROUTING_PATH
+    if not explicit and not os.path.exists(path):
+        return Routing()
+    with open(path, "r") as f:
+        return Routing(yaml.safe_load(f), path)
+
+def get_routing():
+    """Return the routing config shared by every agent in this process."""
+    global _routing
+    with _routing_lock:
+        if _routing is None:
+            _routing = load_routing()
+        return _routing
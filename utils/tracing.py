@@ -0,0 +1,222 @@
+"""
+Lightweight tracing of workflow runs, exported in the Chrome trace-event format.
+
+With TRACE=on every workflow run collects spans for its stages, each model
+call and API attempt (retry waits included), the time spent waiting for the
+user's answers, envelope parsing and artifact writes. The spans are written
+to outputs/<project>/traces/trace_<timestamp>.json, which chrome://tracing or
+ui.perfetto.dev open as a timeline with one lane per stage.
+
+TRACE_PROFILE=cpu,memory additionally profiles the whole command: cProfile
+stats and the top tracemalloc allocation sites are written to .cache/profiles.
+The CPU profile includes the event loops registered with register_loop_thread,
+such as the one ClaudeClient runs blocking calls on.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import pstats
+import weakref
+import cProfile
+import functools
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from .artifact_store import write_atomic
+
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+PROFILE_MODES = ("cpu", "memory")
+
+# Allocation sites listed in a memory profile
+MEMORY_TOP_N = 30
+
+# The tracer collecting spans for the running workflow; tasks inherit it from the run that started them
+_tracer = contextvars.ContextVar("tracer", default=None)
+
+# Before Python 3.12 a cProfile profiler only sees the thread that enabled it; since then it sees every thread
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Event loops running on threads of their own, and the CPU profile being collected, if any
+_loop_threads = weakref.WeakSet()
+_cpu_profile = None
+_profile_lock = threading.Lock()
+
+def tracing_enabled():
+    return os.getenv("TRACE", "off").lower() == "on"
+
+class Tracer:
+    """Collects complete ("X") trace events, one lane per asyncio task or thread."""
+
+    def __init__(self):
+        self.events = []
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def now(self):
+        """Microseconds since the tracer started."""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def lane(self):
+        """Return the trace tid of the current task (or thread), naming the lane the first time."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = ("task", id(task)) if task else ("thread", threading.get_ident())
+        with self._lock:
+            tid = self._lanes.get(key)
+            if tid is None:
+                tid = self._lanes[key] = len(self._lanes) + 1
+                name = task.get_name() if task else threading.current_thread().name
+                self.events.append({"ph": "M", "name": "thread_name", "pid": self.pid, "tid": tid, "args": {"name": name}})
+            return tid
+
+    def add(self, name, category, start, tid, args):
+        with self._lock:
+            self.events.append({"name": name, "cat": category, "ph": "X", "ts": round(start, 1),
+                                "dur": round(self.now() - start, 1), "pid": self.pid, "tid": tid, "args": args})
+
+    def export(self, path):
+        write_atomic(path, json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"}))
+
+@contextmanager
+def span(name, category="app", **args):
+    """Time the block as a span; yields a dict the block can add result details to.
+
+    Does nothing unless a trace is being collected.
+    """
+    tracer = _tracer.get()
+    if tracer is None:
+        yield {}
+        return
+    tid = tracer.lane()
+    start = tracer.now()
+    details = dict(args)
+    try:
+        yield details
+    finally:
+        tracer.add(name, category, start, tid, details)
+
+def traced(name, category="app"):
+    """Decorator running a function inside a span."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def trace_run(directory):
+    """Collect the spans of the block (and the tasks it starts) into a trace file in directory, when TRACE is on."""
+    if not tracing_enabled():
+        yield None
+        return
+    tracer = Tracer()
+    token = _tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer.reset(token)
+        path = os.path.join(directory, f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+        tracer.export(path)
+        print(f"\nTrace written to {path}")
+
+def register_loop_thread(loop):
+    """Include the work of an event loop running on a thread of its own in CPU profiles."""
+    with _profile_lock:
+        _loop_threads.add(loop)
+        profile = _cpu_profile
+    if profile:
+        profile.add_loop(loop)
+
+def _disable_profiler(profiler, disabled):
+    profiler.disable()
+    disabled.set()
+
+class CpuProfile:
+    """cProfile of the calling thread and of every registered event-loop thread, saved as one stats file."""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        # (loop, profiler) for each loop thread profiled separately
+        self.loop_profilers = []
+
+    def add_loop(self, loop):
+        if PROFILES_ALL_THREADS or loop.is_closed():
+            return
+        profiler = cProfile.Profile()
+        self.loop_profilers.append((loop, profiler))
+        # A profiler has to be enabled on the thread it profiles
+        loop.call_soon_threadsafe(profiler.enable)
+
+    def start(self):
+        global _cpu_profile
+        self.profiler.enable()
+        with _profile_lock:
+            _cpu_profile = self
+            loops = list(_loop_threads)
+        for loop in loops:
+            self.add_loop(loop)
+
+    def stop(self):
+        global _cpu_profile
+        with _profile_lock:
+            _cpu_profile = None
+        self.profiler.disable()
+        for loop, profiler in self.loop_profilers:
+            if loop.is_running():
+                disabled = threading.Event()
+                loop.call_soon_threadsafe(_disable_profiler, profiler, disabled)
+                disabled.wait(5)
+
+    def dump(self, path):
+        stats = pstats.Stats(self.profiler)
+        for _, profiler in self.loop_profilers:
+            # A loop that ran nothing while profiled has no stats to add
+            if profiler.getstats():
+                stats.add(profiler)
+        stats.dump_stats(path)
+
+@contextmanager
+def profiling(directory=None):
+    """Profile the block with cProfile and/or tracemalloc as TRACE_PROFILE asks."""
+    modes = {mode.strip() for mode in os.getenv("TRACE_PROFILE", "").lower().split(",") if mode.strip()}
+    unknown = modes - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(f"TRACE_PROFILE must be a comma-separated list of {', '.join(PROFILE_MODES)}, got '{', '.join(sorted(unknown))}'")
+    if not modes:
+        yield
+        return
+    directory = directory or DEFAULT_PROFILE_DIR
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    profile = CpuProfile() if "cpu" in modes else None
+    if "memory" in modes:
+        tracemalloc.start(25)
+    if profile:
+        profile.start()
+    try:
+        yield
+    finally:
+        os.makedirs(directory, exist_ok=True)
+        if profile:
+            profile.stop()
+            path = os.path.join(directory, f"cpu_{stamp}.prof")
+            profile.dump(path)
+            print(f"CPU profile written to {path} (view with: python -m pstats {path})")
+        if "memory" in modes:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"Current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:MEMORY_TOP_N]]
+            path = os.path.join(directory, f"memory_{stamp}.txt")
+            write_atomic(path, "\n".join(lines) + "\n")
+            print(f"Memory profile written to {path}")
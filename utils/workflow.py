@@ -0,0 +1,561 @@
+"""
+Workflows declared as stage graphs, and the scheduler that runs them.
+
+Each stage names the agent method that produces its artifact and the inputs it
+reads: the project description or the responses of earlier stages. The
+scheduler starts every stage as soon as its inputs are ready, so independent
+stages run concurrently.
+
+Every finished stage is recorded in the project manifest with a hash of its
+exact inputs. On resume a stage whose inputs hash still matches is loaded
+from disk; any other stage is regenerated, and because a stage's inputs
+include the content hashes of its upstream stages, a changed artifact
+invalidates everything downstream of it.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+from functools import partial
+from .agents import (
+    CTO, ProductManager, EngineeringManager,
+    RobustCTO, RobustProductManager, RobustEngineeringManager,
+    TaskGenerator, AgentResponse,
+    MarkdownStream, save_to_markdown, artifact_view_path
+)
+from .claude_client import close_async_clients
+from .manifest import ProjectManifest, stable_hash, content_hash
+from .catalog import get_catalog
+from .artifact_store import ArtifactStore, write_atomic
+from .metrics import metrics_context
+from .tracing import span, trace_run
+from .ledger import get_ledger, BudgetExceeded
+from .gather import dedupe_questions, format_answers
+
+# Input name that refers to the project description rather than another stage
+DESCRIPTION = "description"
+
+# Answer sent in place of the user's when a stage may not ask any more follow-up questions
+ASSUME_ANSWER = ("No further information is available. Make reasonable, clearly stated assumptions "
+                 "for anything still open and proceed with the complete response instead of asking more questions.")
+
+# Follow-up rounds a stage may still ask for after the gather phase, unless GATHER_MAX_FOLLOWUPS says otherwise
+DEFAULT_GATHER_MAX_FOLLOWUPS = 1
+
+class NeedsInput(Exception):
+    """A stage needs answers nobody is there to give, such as questions it still asks after its last round."""
+
+# Stage statuses reported by WorkflowRunner.plan
+CURRENT = "current"
+MISSING = "missing"
+CHANGED = "changed"
+STALE = "stale"
+
+class Stage:
+    """One agent call in a workflow and the artifact it writes.
+
+    Answers to a stage's follow-up questions are appended to the project
+    description under answer_heading when the stage reads the description,
+    and passed to the agent as additional_info otherwise.
+    """
+
+    def __init__(self, name, title, agent, method, inputs, start_message, question_message, answer_heading="Additional Information"):
+        self.name = name
+        self.title = title
+        self.agent = agent
+        self.method = method
+        self.inputs = tuple(inputs)
+        self.start_message = start_message
+        self.question_message = question_message
+        self.answer_heading = answer_heading
+
+    @property
+    def reads_description(self):
+        return DESCRIPTION in self.inputs
+
+    @property
+    def upstream(self):
+        return [name for name in self.inputs if name != DESCRIPTION]
+
+class Workflow:
+    """A named set of stages; every input must be the description or an earlier stage."""
+
+    def __init__(self, key, title, focus, stages, completion_message, summary_heading):
+        self.key = key
+        self.title = title
+        self.focus = focus
+        self.stages = stages
+        self.completion_message = completion_message
+        self.summary_heading = summary_heading
+
+        seen = set()
+        for stage in stages:
+            unknown = [name for name in stage.inputs if name != DESCRIPTION and name not in seen]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' in workflow '{key}' reads unknown or later stages: {', '.join(unknown)}")
+            seen.add(stage.name)
+
+    def stage(self, name):
+        return next(stage for stage in self.stages if stage.name == name)
+
+PROTOTYPE_WORKFLOW = Workflow(
+    key="prototype",
+    title="RAPID PROTOTYPE WORKFLOW",
+    focus="This workflow focuses on quick implementation and minimal viable features.",
+    stages=[
+        Stage("prototype_requirements", "Prototype Requirements", ProductManager, "evaluate_project",
+              inputs=[DESCRIPTION],
+              start_message="Prototype Planner is defining core features...",
+              question_message="Prototype Planner has some questions about core functionality:",
+              answer_heading="Additional Feature Information"),
+        Stage("technical_approach", "Technical Approach", CTO, "evaluate_project",
+              inputs=["prototype_requirements"],
+              start_message="Technical Advisor is suggesting practical technologies for your prototype...",
+              question_message="Technical Advisor needs some clarification about your prototype:"),
+        Stage("implementation_plan", "Implementation Plan", EngineeringManager, "create_task_list",
+              inputs=["prototype_requirements", "technical_approach"],
+              start_message="Prototype Developer is creating a practical implementation plan...",
+              question_message="Prototype Developer has some implementation questions:"),
+        Stage("engineering_tasks", "Engineering Tasks", TaskGenerator, "generate_tasks",
+              inputs=["implementation_plan", "technical_approach"],
+              start_message="Task Generator is creating a detailed task list for engineers...",
+              question_message="Task Generator has some questions about task breakdown:"),
+    ],
+    completion_message="Prototype plan for '{project_name}' completed!",
+    summary_heading="Your prototype development plan includes:"
+)
+
+CTO_WORKFLOW = Workflow(
+    key="cto",
+    title="CTO WORKFLOW FOR ROBUST SOFTWARE",
+    focus="This workflow focuses on scalability, maintainability, and long-term architecture.",
+    stages=[
+        Stage("technical_architecture", "Technical Architecture", RobustCTO, "evaluate_project",
+              inputs=[DESCRIPTION],
+              start_message="CTO is designing a robust technical architecture...",
+              question_message="CTO needs more information about your long-term vision:",
+              answer_heading="Additional Information"),
+        Stage("product_requirements", "Product Requirements", RobustProductManager, "evaluate_project",
+              inputs=[DESCRIPTION, "technical_architecture"],
+              start_message="Product Strategy Manager is defining comprehensive requirements...",
+              question_message="Product Strategy Manager has questions about product vision:",
+              answer_heading="Additional Product Information"),
+        Stage("engineering_plan", "Engineering Plan", RobustEngineeringManager, "create_task_list",
+              inputs=["product_requirements", "technical_architecture"],
+              start_message="Engineering Lead is creating a robust implementation plan...",
+              question_message="Engineering Lead has some implementation questions:"),
+        Stage("engineering_tasks", "Engineering Tasks", TaskGenerator, "generate_tasks",
+              inputs=["engineering_plan", "technical_architecture"],
+              start_message="Task Generator is creating a detailed task list for engineers...",
+              question_message="Task Generator has some questions about task breakdown:"),
+    ],
+    completion_message="Robust software plan for '{project_name}' completed!",
+    summary_heading="Your comprehensive development plan includes:"
+)
+
+WORKFLOWS = {workflow.key: workflow for workflow in (PROTOTYPE_WORKFLOW, CTO_WORKFLOW)}
+
+def sanitize_project_name(name):
+    """Turn a name into one usable as a directory: spaces become underscores, other symbols are dropped."""
+    return re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')
+
+def streaming_enabled():
+    return os.getenv("STREAM_RESPONSES", "on").lower() != "off"
+
+def gather_enabled():
+    return os.getenv("GATHER", "off").lower() == "on"
+
+def run_stage(generate, filename, project_name, echo=True):
+    """Run one agent call, streaming it live to the terminal and its markdown file.
+
+    generate is the agent method with its arguments bound; it is called with
+    on_text and on_question when streaming is enabled, so follow-up questions
+    show up as they arrive. Returns the response and the saved file.
+    """
+    if not streaming_enabled():
+        response = generate()
+        return response, save_to_markdown(response, filename, project_name)
+
+    stream = MarkdownStream(filename, project_name, echo=echo)
+    try:
+        response = generate(on_text=stream.write, on_question=stream.question)
+    finally:
+        # On failure the partial response stays on disk
+        stream.close()
+    return response, save_to_markdown(response, filename, project_name, filepath=stream.filepath)
+
+async def run_stage_async(generate, filename, project_name, echo=True):
+    """Async version of run_stage; generate is an agent's *_async method with its arguments bound."""
+    if not streaming_enabled():
+        response = await generate()
+        return response, save_to_markdown(response, filename, project_name)
+
+    stream = MarkdownStream(filename, project_name, echo=echo)
+    try:
+        response = await generate(on_text=stream.write, on_question=stream.question)
+    finally:
+        stream.close()
+    return response, save_to_markdown(response, filename, project_name, filepath=stream.filepath)
+
+def artifact_response(content):
+    """Wrap a saved stage output in a pass-on AgentResponse."""
+    return AgentResponse(json.dumps({"command": "pass-on", "content": content}))
+
+def detect_workflow(project_name):
+    """Return the workflow a project was run with, as recorded in the catalog.
+
+    Projects from before the workflow was recorded are matched on the
+    artifacts only one workflow writes.
+    """
+    catalog = get_catalog()
+    project = catalog.project(project_name)
+    if project and project["workflow"] in WORKFLOWS:
+        return WORKFLOWS[project["workflow"]]
+
+    def score(workflow):
+        others = {stage.name for other in WORKFLOWS.values() if other is not workflow for stage in other.stages}
+        return sum(1 for stage in workflow.stages
+                   if stage.name not in others and catalog.latest_artifact(project_name, stage.name))
+    return max(WORKFLOWS.values(), key=score)
+
+class WorkflowRunner:
+    """Run a workflow for one project, scheduling each stage once its inputs are ready.
+
+    ask(stage, response) is called for every follow-up round and returns the
+    user's answer; it may be a coroutine function. A plain blocking function
+    such as an input() prompt pauses the other stages while it waits, which
+    keeps concurrent output from scrolling over the prompt.
+
+    With resume=True, stages whose inputs hash matches the manifest are
+    loaded instead of generated, and the follow-up answers recorded for them
+    are replayed onto the description. Projects created before the manifest
+    existed reuse whatever artifacts they have. Stages named in rerun are
+    always generated, with the response cache refreshed. echo=False keeps
+    progress messages and streamed text off the terminal.
+
+    max_followups, when set, caps the follow-up rounds of each stage: once a
+    stage has had that many it gets one last round on stated assumptions,
+    and raises NeedsInput if it still asks questions after that.
+
+    gather(questions), when given, runs the gather phase (see utils.gather):
+    before any stage starts it is called once with the merged questions of
+    every agent that will generate, as (question, [stage names]) pairs, and
+    returns one answer per question; it may be a coroutine function. Each
+    stage gets the answers to its questions before its first round; max_followups
+    then defaults to GATHER_MAX_FOLLOWUPS (default 1).
+    """
+
+    def __init__(self, workflow, project_name, description, ask, resume=False, rerun=(), echo=True,
+                 gather=None, max_followups=None):
+        self.workflow = workflow
+        self.project_name = project_name
+        self.description = description
+        self.ask = ask
+        self.gather = gather
+        if gather and max_followups is None:
+            max_followups = int(os.getenv("GATHER_MAX_FOLLOWUPS", DEFAULT_GATHER_MAX_FOLLOWUPS))
+        self.max_followups = max_followups
+        # Stage name -> answers to its questions from the gather phase
+        self.gathered = {}
+        self.resume = resume
+        self.rerun = set(rerun)
+        self.echo = echo
+        self.project_dir = os.path.join("outputs", project_name)
+        self.manifest = ProjectManifest(self.project_dir)
+        self.catalog = get_catalog()
+        self.store = ArtifactStore(self.project_dir)
+        self._legacy = resume and not self.manifest.exists
+        # Stage name -> (AgentResponse, artifact path)
+        self.results = {}
+        # Stage name -> hash of its content, part of its dependents' inputs hash
+        self.content_hashes = {}
+        # Stage name -> seconds from its inputs being ready to its artifact being recorded
+        self.stage_seconds = {}
+        self._tasks = {}
+
+    def _log(self, message):
+        if self.echo:
+            print(message)
+
+    def _save_description(self):
+        os.makedirs(self.project_dir, exist_ok=True)
+        with open(os.path.join(self.project_dir, "project_description.md"), "w") as f:
+            f.write(f"# {self.project_name}\n\n{self.description}")
+
+    def _stage_args(self, stage):
+        return [self.description if name == DESCRIPTION else self.results[name][0] for name in stage.inputs]
+
+    def _inputs_hash(self, stage, agent):
+        """Hash the first-round request of a stage together with its upstream content hashes."""
+        upstream = {name: self.content_hashes[name] for name in stage.upstream}
+        return stable_hash({"request": agent.request_hash(*self._stage_args(stage)), "upstream": upstream})
+
+    def _is_current(self, stage, inputs_hash):
+        """Whether the stage's recorded artifact can be reused as is."""
+        if not self.resume or stage.name in self.rerun:
+            return False
+        if self._legacy:
+            return self.current_artifact(stage.name) is not None
+        entry = self.manifest.stage(stage.name)
+        if entry is None or entry["inputs_hash"] != inputs_hash:
+            return False
+        return self.store.contains(entry["content_hash"]) or self.current_artifact(stage.name) is not None
+
+    def current_artifact(self, stage_name):
+        """Return the artifact the manifest records for a stage, or the newest one in the catalog.
+
+        Returns None if there is none or its file has been deleted.
+        """
+        entry = self.manifest.stage(stage_name)
+        row = None if entry else self.catalog.latest_artifact(self.project_name, stage_name)
+        filename = entry["file"] if entry else row["file"] if row else None
+        if filename is None:
+            return None
+        path = os.path.join(self.project_dir, filename)
+        return path if os.path.exists(path) else None
+
+    def _current_version(self, stage_name):
+        entry = self.manifest.stage(stage_name)
+        if entry and entry.get("version"):
+            return entry["version"]
+        row = self.catalog.latest_artifact(self.project_name, stage_name)
+        return row["version"] if row else None
+
+    def _add_answer(self, stage, answer):
+        self.description += f"\n\n{stage.answer_heading}:\n{answer}"
+
+    def _take_answer(self, stage, answer, answers, notes):
+        """Record an answer for the stage's next round and return its updated notes."""
+        answers.append(answer)
+        if stage.reads_description:
+            self._add_answer(stage, answer)
+            return notes
+        return notes + answer + "\n"
+
+    def _followup_cap(self):
+        """Return how many more follow-up rounds a stage may ask, or None for no limit."""
+        caps = [cap for cap in (get_ledger().followup_cap(self.project_name), self.max_followups) if cap is not None]
+        return min(caps) if caps else None
+
+    def _read_current(self, stage):
+        """Return (text, edited) for the stage's recorded version.
+
+        The markdown view is used when it holds text the store has never
+        seen, meaning the user edited it; otherwise the recorded version is
+        read from the store, as the view may show a later follow-up round.
+        """
+        entry = self.manifest.stage(stage.name)
+        path = self.current_artifact(stage.name)
+        text = None
+        if path:
+            with open(path, "r") as f:
+                text = f.read()
+        if entry and self.store.contains(entry["content_hash"]):
+            if text is not None and not self.store.contains(content_hash(text)):
+                return text, True
+            return self.store.get(entry["content_hash"]), False
+        # Artifacts written before the store existed are plain files
+        return text, False
+
+    def _reuse(self, stage):
+        """Load an up-to-date artifact and replay the answers that went into it."""
+        entry = self.manifest.stage(stage.name)
+        answers = entry.get("answers", []) if entry else []
+        if stage.reads_description:
+            for answer in answers:
+                self._add_answer(stage, answer)
+        text, edited = self._read_current(stage)
+        return artifact_response(text), answers, edited
+
+    def _sync_view(self, stage, text):
+        """Make the stage's markdown view show text (it may show a later follow-up round) and return its path."""
+        if not self.store.contains(content_hash(text)):
+            # Artifacts written before the store existed have no view
+            return self.current_artifact(stage.name)
+        path = artifact_view_path(stage.name, self.project_name)
+        current = None
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                current = f.read()
+        if current != text:
+            write_atomic(path, text)
+        return path
+
+    def _finish(self, stage, response, path, version, inputs_hash, answers):
+        self.content_hashes[stage.name] = content_hash(response.content)
+        self.results[stage.name] = (response, path)
+        with span("manifest", "io"):
+            self.manifest.record_stage(stage.name, os.path.basename(path), version, inputs_hash,
+                                       self.content_hashes[stage.name], answers)
+
+    async def _answer(self, stage, response):
+        with span("waiting for answers", "user", stage=stage.name):
+            if asyncio.iscoroutinefunction(self.ask):
+                return await self.ask(stage, response)
+            return self.ask(stage, response)
+
+    async def _generate(self, stage, agent, notes, inputs_hash):
+        """Run one round of a stage and index the artifact it wrote; returns (response, path, version)."""
+        args = self._stage_args(stage)
+        kwargs = {"additional_info": notes} if notes else {}
+        generate = partial(getattr(agent, f"{stage.method}_async"), *args, **kwargs)
+        response, filepath = await run_stage_async(generate, stage.name, self.project_name, echo=self.echo)
+        version = self.catalog.record_artifact(
+            self.project_name, stage.name, os.path.basename(filepath), inputs_hash,
+            self.store.head(stage.name), "questions" if response.needs_followup else "complete"
+        )
+        return response, filepath, version
+
+    async def _run_stage(self, stage):
+        await asyncio.gather(*(self._tasks[name] for name in stage.upstream))
+        started = time.monotonic()
+        # Each stage runs in its own task, so the calls it makes are attributed to it
+        with metrics_context(workflow=self.workflow.key, project=self.project_name, stage=stage.name), \
+                span(stage.title, "stage", stage=stage.name):
+            await self._produce(stage)
+        self.stage_seconds[stage.name] = time.monotonic() - started
+
+    async def _produce(self, stage):
+        """Reuse the stage's recorded artifact if it is up to date, otherwise generate it with follow-up rounds."""
+        agent = stage.agent(self.workflow.key)
+        inputs_hash = self._inputs_hash(stage, agent)
+        if self._is_current(stage, inputs_hash):
+            response, answers, edited = self._reuse(stage)
+            version = self._current_version(stage.name)
+            if edited:
+                # Keep the user's edit as a new version; its new hash invalidates the dependents
+                self.store.save(stage.name, response.content)
+                version = self.catalog.record_artifact(self.project_name, stage.name, f"{stage.name}.md", inputs_hash,
+                                                       self.store.head(stage.name), "edited")
+            self._finish(stage, response, self._sync_view(stage, response.content), version, inputs_hash, answers)
+            return
+
+        if stage.name in self.rerun:
+            agent.cache_policy = "refresh"
+        self._log(f"\n{stage.start_message}")
+        notes = ""
+        answers = []
+        if stage.name in self.gathered:
+            # Answers from the gather phase go in before the first round, like a follow-up answer
+            notes = self._take_answer(stage, self.gathered[stage.name], answers, notes)
+        rounds = 0
+        response, filepath, version = await self._generate(stage, agent, notes, inputs_hash)
+        self._log(f"\n{stage.title} saved to: {filepath}")
+
+        while response.needs_followup:
+            # After the gather phase, or once the budget runs low, a stage gets a few more rounds
+            # and then has to proceed on assumptions
+            cap = self._followup_cap()
+            capped = cap is not None and rounds >= cap
+            if capped:
+                self._log(f"\n{stage.title} has used its follow-up rounds and proceeds on stated assumptions.")
+                answer = ASSUME_ANSWER
+            else:
+                answer = await self._answer(stage, response)
+                rounds += 1
+            notes = self._take_answer(stage, answer, answers, notes)
+            response, filepath, version = await self._generate(stage, agent, notes, inputs_hash)
+            self._log(f"\nUpdated {stage.title} saved to: {filepath}")
+            if capped and response.needs_followup:
+                # Recording it would pass the questions downstream as if they were the artifact
+                raise NeedsInput(f"{stage.title} still had questions after proceeding on stated assumptions: "
+                                 + "; ".join(response.questions))
+
+        self._finish(stage, response, filepath, version, inputs_hash, answers)
+
+    def plan(self):
+        """Return {stage name: status} for a resume, without generating anything.
+
+        CURRENT stages would be loaded from disk, MISSING and CHANGED ones
+        generated, and STALE ones regenerated because an upstream stage will be.
+        """
+        description = self.description
+        statuses = {}
+        try:
+            for stage in self.workflow.stages:
+                if any(statuses[name] != CURRENT for name in stage.upstream):
+                    statuses[stage.name] = STALE
+                    continue
+                agent = stage.agent(self.workflow.key)
+                inputs_hash = self._inputs_hash(stage, agent)
+                if self._is_current(stage, inputs_hash):
+                    response, _, _ = self._reuse(stage)
+                    self.content_hashes[stage.name] = content_hash(response.content)
+                    self.results[stage.name] = (response, self.current_artifact(stage.name))
+                    statuses[stage.name] = CURRENT
+                elif self.current_artifact(stage.name):
+                    statuses[stage.name] = CHANGED
+                else:
+                    statuses[stage.name] = MISSING
+        finally:
+            self.description = description
+            self.results = {}
+            self.content_hashes = {}
+        return statuses
+
+    async def _gather_questions(self):
+        """Ask every agent that will generate for its questions at once and put them to the user in one form."""
+        statuses = self.plan() if self.resume else {}
+        stages = [stage for stage in self.workflow.stages if statuses.get(stage.name) != CURRENT]
+
+        async def questions_of(stage):
+            with metrics_context(workflow=self.workflow.key, project=self.project_name, stage=stage.name):
+                return await stage.agent(self.workflow.key).gather_questions_async(self.description)
+
+        with span("gather questions", "llm", stages=len(stages)):
+            asked = await asyncio.gather(*(questions_of(stage) for stage in stages))
+        asked = [(stage.name, question) for stage, questions in zip(stages, asked) for question in questions]
+        merged = dedupe_questions(asked)
+        if not merged:
+            return
+        self._log(f"\n{len(stages)} agents asked {len(asked)} questions, {len(merged)} after merging duplicates.")
+        with span("waiting for answers", "user", questions=len(merged)):
+            if asyncio.iscoroutinefunction(self.gather):
+                answers = await self.gather(merged)
+            else:
+                answers = self.gather(merged)
+        for stage in stages:
+            notes = format_answers((question, answer) for (question, asked_by), answer in zip(merged, answers)
+                                   if stage.name in asked_by)
+            if notes:
+                self.gathered[stage.name] = notes
+
+    def _set_status(self, status):
+        self.manifest.set_project(self.workflow.key, status)
+        self.catalog.record_project(self.project_name, self.workflow.key, status)
+
+    async def run_async(self):
+        """Run every stage and return {stage name: (response, artifact path)}."""
+        self._save_description()
+        self._set_status("in_progress")
+        # Tasks only start running at the first await, by which time all of them are registered
+        with trace_run(os.path.join(self.project_dir, "traces")), \
+                span(self.workflow.title, "workflow", project=self.project_name):
+            if self.gather:
+                await self._gather_questions()
+            self._tasks = {stage.name: asyncio.create_task(self._run_stage(stage), name=f"stage {stage.name}")
+                           for stage in self.workflow.stages}
+            try:
+                await asyncio.gather(*self._tasks.values())
+            except BaseException as e:
+                for task in self._tasks.values():
+                    task.cancel()
+                if isinstance(e, BudgetExceeded):
+                    self._set_status("over_budget")
+                elif isinstance(e, NeedsInput):
+                    self._set_status("needs_input")
+                else:
+                    self._set_status("interrupted")
+                raise
+        self._set_status("complete")
+        return self.results
+
+    def run(self):
+        """Run the workflow on a new event loop, closing that loop's connection pools afterwards."""
+        async def run_and_close():
+            try:
+                return await self.run_async()
+            finally:
+                await close_async_clients()
+        return asyncio.run(run_and_close())